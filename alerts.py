@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import fnmatch
+from bisect import bisect_left, insort
+from collections import deque
+
+# metric: a stats key, "core:<n>" / "core:*", or "process:<name pattern>:<field>"
+# kind: "value", "rate" (change per second over `window`) or "percentile" (over `window`)
+DEFAULT_RULES = [
+    {'name': 'High CPU Usage', 'metric': 'CPU Usage (%)', 'threshold': 90, 'clear': 80,
+     'sustain': 10, 'cooldown': 300, 'message': 'CPU usage is at {value:.2f}%'},
+    {'name': 'High RAM Usage', 'metric': 'RAM Usage (%)', 'threshold': 90, 'clear': 85,
+     'sustain': 10, 'cooldown': 300, 'message': 'RAM usage is at {value:.2f}%'},
+]
+
+
+def load_rules(path=None):
+    path = path or os.environ.get('SYSTEM_MONITOR_ALERTS', 'alerts.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return DEFAULT_RULES
+
+
+class AlertRule:
+    def __init__(self, name, metric, threshold, condition='above', kind='value', window=60, percentile=95,
+                 sustain=0, clear=None, cooldown=300, message=None):
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.condition = condition
+        self.kind = kind
+        self.window = window
+        self.percentile = percentile
+        self.sustain = sustain
+        # Once firing, the rule only resets after crossing `clear` (hysteresis)
+        self.clear = threshold if clear is None else clear
+        self.cooldown = cooldown
+        self.message = message or '{series} is at {value:.2f}'
+        self.scope = 'system'
+        self.target = metric
+        if metric.startswith('core:'):
+            self.scope = 'core'
+            self.target = metric[len('core:'):]
+        elif metric.startswith('process:'):
+            self.scope = 'process'
+            _, self.pattern, self.target = metric.split(':', 2)
+            self._name_matches = {}
+
+    def matches_process(self, name):
+        matched = self._name_matches.get(name)
+        if matched is None:
+            matched = self._name_matches[name] = fnmatch.fnmatchcase(name, self.pattern)
+        return matched
+
+    def breached(self, value):
+        return value > self.threshold if self.condition == 'above' else value < self.threshold
+
+    def cleared(self, value):
+        return value <= self.clear if self.condition == 'above' else value >= self.clear
+
+
+class SeriesState:
+    __slots__ = ('active', 'notified', 'since', 'last_fired', 'samples', 'ordered')
+
+    def __init__(self):
+        self.active = False
+        # Whether the firing alert of the current episode went out; the cooldown may have held it back
+        self.notified = False
+        self.since = None
+        self.last_fired = None
+        self.samples = deque()
+        self.ordered = []
+
+    def measure(self, rule, timestamp, value):
+        if rule.kind == 'rate':
+            samples = self.samples
+            samples.append((timestamp, value))
+            # Keep exactly one sample at or before the window start as the baseline
+            while len(samples) > 2 and samples[1][0] <= timestamp - rule.window:
+                samples.popleft()
+            first_time, first_value = samples[0]
+            return (value - first_value) / (timestamp - first_time) if timestamp > first_time else None
+        if rule.kind == 'percentile':
+            samples = self.samples
+            samples.append((timestamp, value))
+            insort(self.ordered, value)
+            while samples[0][0] <= timestamp - rule.window:
+                _, old = samples.popleft()
+                del self.ordered[bisect_left(self.ordered, old)]
+            return self.ordered[int(rule.percentile / 100 * (len(self.ordered) - 1))]
+        return value
+
+
+class Alert:
+    def __init__(self, rule, series, value, resolved=False):
+        self.rule = rule
+        self.series = series
+        self.value = value
+        self.resolved = resolved
+
+    @property
+    def title(self):
+        return f"{self.rule.name} resolved" if self.resolved else self.rule.name
+
+    @property
+    def message(self):
+        return self.rule.message.format(series=self.series, value=self.value)
+
+
+class AlertEngine:
+    # Every rule keeps O(1) state per series and is updated incrementally from each snapshot
+    def __init__(self, rules=None):
+        self.rules = [AlertRule(**rule) for rule in (DEFAULT_RULES if rules is None else rules)]
+        self.states = {rule: {} for rule in self.rules}
+
+    def evaluate(self, stats):
+        timestamp = stats.get('timestamp') or time.time()
+        processes_updated = 'processes' in stats.get('updated_probes', ('processes',))
+        alerts = []
+        for rule in self.rules:
+            states = self.states[rule]
+            if rule.scope == 'system':
+                value = stats.get(rule.target)
+                if value is not None:
+                    self._update(rule, states, rule.target, rule.target, timestamp, value, alerts)
+            elif rule.scope == 'core':
+                cores = stats.get('CPU Core Usage') or ()
+                indices = range(len(cores)) if rule.target == '*' else [int(rule.target)]
+                for core in indices:
+                    if core < len(cores):
+                        self._update(rule, states, core, f"Core {core}", timestamp, cores[core], alerts)
+            elif processes_updated and stats.get('processes') is not None:
+                self._evaluate_processes(rule, states, stats['processes'], timestamp, alerts)
+        return alerts
+
+    def _evaluate_processes(self, rule, states, processes, timestamp, alerts):
+        if hasattr(processes, 'column'):
+            if rule.target not in processes.FIELDS:
+                return
+            rows = zip(processes.pids, processes.names, processes.column(rule.target))
+        else:
+            rows = ((process['pid'], process['name'] or '', process.get(rule.target)) for process in processes)
+        seen = {}
+        for pid, name, value in rows:
+            if value is None or not rule.matches_process(name):
+                continue
+            state = states.get(pid)
+            if state is not None:
+                seen[pid] = state
+            self._update(rule, seen, pid, f"{name} ({pid})", timestamp, value, alerts)
+        # Exited processes drop their state
+        self.states[rule] = seen
+
+    def _update(self, rule, states, key, series, timestamp, value, alerts):
+        state = states.get(key)
+        if state is None:
+            state = states[key] = SeriesState()
+        measured = state.measure(rule, timestamp, value)
+        if measured is None:
+            return
+        if state.active:
+            if rule.cleared(measured):
+                state.active = False
+                state.since = None
+                if state.notified:
+                    state.notified = False
+                    alerts.append(Alert(rule, series, measured, resolved=True))
+            return
+        if not rule.breached(measured):
+            state.since = None
+            return
+        if state.since is None:
+            state.since = timestamp
+        if timestamp - state.since >= rule.sustain:
+            state.active = True
+            if state.last_fired is None or timestamp - state.last_fired >= rule.cooldown:
+                state.last_fired = timestamp
+                state.notified = True
+                alerts.append(Alert(rule, series, measured))
@@ -0,0 +1,204 @@
+import math
+import time
+import heapq
+from array import array
+from monitor import SCALAR_KEYS
+
+# Weight of each new sample in the moving statistics (about a 20-sample memory) and in the trend
+ALPHA = 0.05
+TREND_ALPHA = 0.02
+# Samples a series needs before it can be flagged
+WARMUP = 30
+# Robust z-score that raises a deviation, and the one it has to fall below to clear; the plain
+# z-score against the EWMA variance has to agree as well
+SCORE_ENTER = 5.0
+SCORE_EXIT = 2.5
+Z_ENTER = 3.0
+# A trend is a slope that would add TREND_FRACTION of the series' typical level within
+# TREND_HORIZON seconds, while at least TREND_RISING of the recent samples (about TREND_SAMPLES)
+# went up; a single step up leaves a slope behind but not a run of rising samples
+TREND_SAMPLES = 30
+TREND_HORIZON = 600.0
+TREND_FRACTION = 0.2
+TREND_RISING = 0.8
+TREND_CLEAR = 0.5
+# Processes followed per ranking (CPU and resident memory)
+TOP_PROCESSES = 10
+# Series that stop reporting (exited processes, unplugged devices) are dropped after this many ticks
+STALE_TICKS = 600
+# Smallest deviation that counts, by unit, so flat series do not flag on noise
+FLOORS = {'%': 2.0, 'MB/s': 0.1, 'MB': 16.0, 'GB': 0.1}
+# Running totals and fixed sizes, which only ever grow or never move
+SKIPPED_KEYS = ('RAM Total (GB)', 'Disk Total (GB)', 'Network Sent (MB)', 'Network Received (MB)')
+COLUMNS = ('mean', 'variance', 'median', 'mad', 'slope', 'rising', 'last', 'last_time', 'floor')
+
+
+class Anomaly:
+    __slots__ = ('series', 'kind', 'value', 'expected', 'score', 'since', 'resolved')
+
+    def __init__(self, series, kind, value, expected, score, since, resolved=False):
+        self.series = series
+        self.kind = kind
+        self.value = value
+        self.expected = expected
+        self.score = score
+        self.since = since
+        self.resolved = resolved
+
+    @property
+    def title(self):
+        label = {'spike': "Unusual rise", 'drop': "Unusual drop", 'trend': "Steady growth"}[self.kind]
+        return f"{label} resolved" if self.resolved else label
+
+    @property
+    def message(self):
+        if self.kind == 'trend':
+            return f"{self.series} keeps growing: {self.value:.2f} now, {self.score:+.3g} per second"
+        return f"{self.series} is at {self.value:.2f}, typically {self.expected:.2f} (score {self.score:.1f})"
+
+
+class AnomalyDetector:
+    # Streaming statistics for every series in the snapshots: system scalars, each core, each disk
+    # and network interface, and the heaviest processes. The state is one array per statistic with
+    # a slot per series, so a tick is a fixed handful of float operations per observed series:
+    # - EWMA mean and variance (z = deviation / standard deviation)
+    # - a streaming median with an EWMA of the absolute deviation from it; their ratio is the
+    #   robust z-score, which one outlier cannot inflate the way it inflates the variance
+    # - an EWMA of the per-second slope for slow trends such as leaks
+    # Each sample is scored against the statistics from before it, then folded in.
+    def __init__(self, top_processes=TOP_PROCESSES):
+        self.top_processes = top_processes
+        self.index = {}
+        self.names = []
+        for column in COLUMNS:
+            setattr(self, column, array('d'))
+        self.count = array('I')
+        self.seen = array('I')
+        self.active = {}
+        self.ticks = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def slot(self, name, unit):
+        slot = self.index.get(name)
+        if slot is None:
+            slot = self.index[name] = len(self.names)
+            self.names.append(name)
+            for column in COLUMNS:
+                getattr(self, column).append(0.0)
+            self.floor[slot] = FLOORS.get(unit, 0.0)
+            self.count.append(0)
+            self.seen.append(0)
+        return slot
+
+    def observations(self, stats):
+        # (series, unit, value) for everything worth following in one snapshot
+        for key in SCALAR_KEYS:
+            value = stats.get(key)
+            if value is not None and value == value and key not in SKIPPED_KEYS:
+                yield key, key[key.rfind('(') + 1:-1], value
+        for core, usage in enumerate(stats.get('CPU Core Usage') or ()):
+            yield f"Core {core} (%)", '%', usage
+        for key, label, directions in (('Disk Device Rates', 'Disk', ('read', 'write')),
+                                       ('Network Interface Rates', 'Network', ('sent', 'received'))):
+            for device, rates in (stats.get(key) or {}).items():
+                for direction, rate in zip(directions, rates):
+                    yield f"{label} {device} {direction} (MB/s)", 'MB/s', rate / 1024**2
+        processes = stats.get('processes')
+        if processes is not None and 'processes' in stats.get('updated_probes', ('processes',)):
+            yield from self.process_observations(processes)
+
+    def process_observations(self, processes):
+        if hasattr(processes, 'pids'):
+            pids, names, cpu, rss = processes.pids, processes.names, processes.cpu, processes.rss
+        else:
+            pids = [p['pid'] for p in processes]
+            names = [p['name'] or '' for p in processes]
+            cpu = [p['cpu_percent'] or 0.0 for p in processes]
+            rss = [p.get('rss') or 0 for p in processes]
+        rows = range(len(pids))
+        chosen = set(heapq.nlargest(self.top_processes, rows, key=cpu.__getitem__))
+        chosen.update(heapq.nlargest(self.top_processes, rows, key=rss.__getitem__))
+        for row in chosen:
+            series = f"{names[row]} ({pids[row]})"
+            yield f"{series} CPU (%)", '%', cpu[row]
+            yield f"{series} memory (MB)", 'MB', rss[row] / 1024**2
+
+    def update(self, stats):
+        timestamp = stats.get('timestamp') or time.time()
+        self.ticks += 1
+        tick = self.ticks
+        events = []
+        slot_of = self.slot
+        mean, variance, median, mad = self.mean, self.variance, self.median, self.mad
+        slope, last, last_time, floor = self.slope, self.last, self.last_time, self.floor
+        count, rising, seen = self.count, self.rising, self.seen
+        for name, unit, x in self.observations(stats):
+            i = slot_of(name, unit)
+            seen[i] = tick
+            n = count[i]
+            if not n:
+                mean[i] = median[i] = last[i] = x
+                last_time[i] = timestamp
+                count[i] = 1
+                continue
+
+            # Score against what was known before this sample
+            m = median[i]
+            scale = max(1.4826 * mad[i], 0.05 * abs(m), floor[i], 1e-9)
+            score = (x - m) / scale
+            dt = timestamp - last_time[i]
+            if dt > 0:
+                slope[i] += TREND_ALPHA * ((x - last[i]) / dt - slope[i])
+                rising[i] += ((1.0 if x > last[i] else 0.0) - rising[i]) / TREND_SAMPLES
+            if dt:
+                last[i] = x
+                last_time[i] = timestamp
+
+            d = x - mean[i]
+            z = d / math.sqrt(variance[i]) if variance[i] > 0 else 0.0
+            mean[i] += ALPHA * d
+            variance[i] = (1 - ALPHA) * (variance[i] + ALPHA * d * d)
+            # Streaming median: step towards the sample by a fraction of the typical deviation
+            median[i] = m + ALPHA * scale * (1.0 if x > m else -1.0 if x < m else 0.0)
+            mad[i] += ALPHA * (abs(x - m) - mad[i])
+            count[i] = n + 1
+            if n < WARMUP:
+                continue
+
+            growing = slope[i] * TREND_HORIZON > TREND_FRACTION * max(abs(m), floor[i])
+            self._flag(name, 'spike' if score > 0 else 'drop', abs(score) >= SCORE_ENTER and abs(z) >= Z_ENTER,
+                       abs(score) < SCORE_EXIT, x, m, score, timestamp, events)
+            self._flag(name, 'trend', growing and rising[i] >= TREND_RISING,
+                       slope[i] <= 0 or rising[i] < TREND_CLEAR, x, m, slope[i], timestamp, events)
+
+        if tick % STALE_TICKS == 0:
+            self.prune(tick - STALE_TICKS)
+        return events
+
+    def _flag(self, name, kind, entered, cleared, value, expected, score, timestamp, events):
+        key = (name, 'trend' if kind == 'trend' else 'deviation')
+        anomaly = self.active.get(key)
+        if anomaly is None:
+            if entered:
+                anomaly = self.active[key] = Anomaly(name, kind, value, expected, score, timestamp)
+                events.append(anomaly)
+        elif cleared:
+            del self.active[key]
+            events.append(Anomaly(name, anomaly.kind, value, expected, score, anomaly.since, resolved=True))
+        else:
+            anomaly.value = value
+            anomaly.score = score
+
+    def prune(self, before):
+        # Compacts the arrays, keeping series seen since tick `before`
+        keep = [i for i in range(len(self.names)) if self.seen[i] > before]
+        if len(keep) == len(self.names):
+            return
+        for column in COLUMNS + ('count', 'seen'):
+            values = getattr(self, column)
+            setattr(self, column, array(values.typecode, [values[i] for i in keep]))
+        self.names = [self.names[i] for i in keep]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.active = {key: anomaly for key, anomaly in self.active.items() if key[0] in self.index}
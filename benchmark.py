@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from array import array
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from monitor import SystemMonitor, SCALAR_KEYS, PROBE_SCHEDULE
+from proc_scanner import ProcessTable, ProcScanner
+from history import HistoryStore
+from rollup import Rollup
+from process_analytics import ProcessAnalytics
+from anomaly import AnomalyDetector
+from process_search import ProcessSearchIndex
+
+PROCESS_SIZES = (100, 1000, 3000, 10000)
+CORE_COUNTS = (4, 16, 64, 256)
+
+# Limits follow from what the monitor has to deliver, not from what it costs today, and do not
+# grow with the table. A GUI refresh fits in one frame at 60 Hz for desktop-sized tables of up to
+# 3000 processes, so the window never stutters; a server-sized table gets a tenth of the
+# one-second sample tick. A search answers within a frame at any size. Work the collector does on
+# every sample besides its probes (history, anomaly scoring) gets 1% of the tick, and the history,
+# being preallocated, does not grow once its first hour is written. Probe limits, including the
+# process scan over a synthetic /proc, are their cost budgets in PROBE_SCHEDULE. Milliseconds
+# unless the name says otherwise.
+FRAME_MS = 1000 / 60
+DESKTOP_PROCESSES = 3000
+SERVER_MS = 100
+SAMPLE_SHARE_MS = 10
+HISTORY_GROWTH_BYTES = 16 * 1024
+PROBE_BUDGETS = {name: budget * 1000 for name, _interval, budget in PROBE_SCHEDULE}
+
+
+def default_thresholds(process_sizes=PROCESS_SIZES, core_counts=CORE_COUNTS):
+    thresholds = {}
+    for size in process_sizes:
+        budget = FRAME_MS if size <= DESKTOP_PROCESSES else SERVER_MS
+        for name in ('gui.process_tree', 'gui.process_tree_view', 'gui.update_stats'):
+            thresholds[f'{name}.{size}.p95'] = budget
+        # The larger part of a tree refresh happens here, before any widget is touched
+        thresholds[f'analytics.{size}.p95'] = budget / 2
+        thresholds[f'search.{size}.p95'] = FRAME_MS
+        for name in ('collector.proc_scan', 'collector.proc_scan_io'):
+            thresholds[f'{name}.{size}.median'] = PROBE_BUDGETS['processes']
+    for core_count in core_counts:
+        thresholds[f'gui.cores.{core_count}.p95'] = FRAME_MS
+    for window in (60, 3600):
+        thresholds[f'gui.chart.{window}.p95'] = FRAME_MS
+    for core_count in (16, 256):
+        thresholds[f'anomaly.{core_count}.p95'] = SAMPLE_SHARE_MS
+    thresholds['history.append.256.p95'] = SAMPLE_SHARE_MS
+    thresholds['history.growth_after_first_hour_bytes'] = HISTORY_GROWTH_BYTES
+    for name, budget in PROBE_BUDGETS.items():
+        thresholds[f'collector.{name}.median'] = budget
+    return thresholds
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'median': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        'max': ordered[-1],
+        'mean': statistics.fmean(ordered),
+        'runs': len(ordered),
+    }
+
+
+def measure(func, repeat, warmup=2):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+class SyntheticSystem:
+    # Deterministic fake snapshots: a stable process population with some churn and CPU movement
+    def __init__(self, process_count, core_count, seed=1):
+        self.random = random.Random(seed)
+        self.core_count = core_count
+        self.next_pid = 1
+        self.processes = {}
+        self.timestamp = time.time()
+        for _ in range(process_count):
+            self.spawn()
+
+    def spawn(self, ppid=None):
+        pid = self.next_pid
+        self.next_pid += 1
+        if ppid is None:
+            # A tree about ten wide under pid 1
+            ppid = max(1, pid // 10)
+        self.processes[pid] = [ppid, f"worker-{pid % 500}", 0.0, self.random.random() * 2]
+
+    def process_table(self, churn=0.02):
+        rnd = self.random
+        # The short-lived processes are the leaves, and their parent starts the replacement the way a
+        # worker pool does, so the tree keeps its shape from one scan to the next
+        parents = {row[0] for row in self.processes.values()}
+        leaves = [pid for pid in self.processes if pid not in parents]
+        for pid in rnd.sample(leaves, min(len(leaves), int(len(self.processes) * churn))):
+            self.spawn(self.processes.pop(pid)[0])
+        table = ProcessTable()
+        for pid, row in self.processes.items():
+            if rnd.random() < 0.3:
+                row[2] = rnd.random() * 100 if rnd.random() < 0.05 else rnd.random() * 2
+            table.append(pid, row[0], row[1], row[2], row[3], int(row[3] * 1024**3 / 100), 1 + pid % 8)
+        return table
+
+    def stats(self, step=1.0, processes=True):
+        rnd = self.random
+        self.timestamp += step
+        stats = {key: rnd.random() * 100 for key in SCALAR_KEYS}
+        stats['CPU Core Usage'] = [rnd.random() * 100 for _ in range(self.core_count)]
+        stats['RAM Details'] = {'total': 16.0, 'available': 8.0, 'used': 8.0, 'free': 4.0,
+                                'percent': stats['RAM Usage (%)'], 'cached': 2.0, 'buffers': 0.5, 'shared': 0.1}
+        stats['timestamp'] = self.timestamp
+        stats['updated_probes'] = ('cpu', 'cores', 'memory', 'processes') if processes else ('cpu', 'cores', 'memory')
+        if processes:
+            stats['processes'] = self.process_table()
+        return stats
+
+
+def write_proc(root, count):
+    # /proc/[pid]/stat and io for `count` processes, in the kernel's layout; the fields after the
+    # command name start at the state, with utime and stime at 11 and 12
+    for pid in range(1, count + 1):
+        os.mkdir(f'{root}/{pid}')
+        fields = ['S', str(pid // 10)] + ['0'] * 9 + [str(pid * 3), str(pid)] + ['0'] * 4
+        fields += [str(1 + pid % 8), '0', str(1000 + pid), str(1 << 24), str(100 + pid % 5000)] + ['0'] * 30
+        with open(f'{root}/{pid}/stat', 'w') as f:
+            f.write(f"{pid} (worker-{pid}) {' '.join(fields)}\n")
+        with open(f'{root}/{pid}/io', 'w') as f:
+            f.write(f"rchar: 0\nwchar: 0\nsyscr: 0\nsyscw: 0\nread_bytes: {pid * 4096}\n"
+                    f"write_bytes: {pid * 512}\ncancelled_write_bytes: 0\n")
+
+
+def bench_collector(results, repeat, process_sizes):
+    for name, _, _ in PROBE_SCHEDULE:
+        probe = getattr(SystemMonitor, f'probe_{name}')
+        results[f'collector.{name}'] = measure(probe, repeat if name != 'processes' else max(repeat // 5, 3))
+    results['collector.get_system_stats'] = measure(SystemMonitor.get_system_stats, max(repeat // 5, 3))
+
+    # The host's own process count says little about large tables; the /proc scanner also runs
+    # over a synthetic /proc of each size, with and without the per-process I/O counters
+    for size in process_sizes:
+        with tempfile.TemporaryDirectory() as root:
+            write_proc(root, size)
+            for name, read_io in (('collector.proc_scan', False), ('collector.proc_scan_io', True)):
+                scanner = ProcScanner(proc_root=root, read_io=read_io)
+                results[f'{name}.{size}'] = measure(scanner.scan, max(repeat // 5, 3))
+
+
+def bench_history(results, hours, core_count=256, process_count=1000):
+    system = SyntheticSystem(process_count, core_count)
+    history = HistoryStore(SCALAR_KEYS, capacity=3600)
+    rollup = Rollup(history)
+    tables = [system.process_table() for _ in range(4)]
+    seconds = int(hours * 3600)
+    # Preallocated, so the timings themselves do not show up as growth
+    samples = array('d', bytes(8 * seconds))
+    memory = []
+    tracemalloc.start()
+    for second in range(seconds):
+        stats = system.stats(processes=False)
+        # A process scan every fifth sample, as scheduled in PROBE_SCHEDULE
+        if second % 5 == 0:
+            stats['processes'] = tables[second % len(tables)]
+            stats['updated_probes'] += ('processes',)
+        started = time.perf_counter()
+        rollup.append(stats)
+        samples[second] = (time.perf_counter() - started) * 1000
+        if (second + 1) % 3600 == 0:
+            memory.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    results[f'history.append.{core_count}'] = summarize(samples)
+    results['history.traced_bytes_per_hour'] = memory
+    results['history.nbytes'] = history.nbytes()
+    if len(memory) > 1:
+        results['history.growth_after_first_hour_bytes'] = memory[-1] - memory[0]
+
+
+def bench_analytics(results, repeat, process_sizes):
+    for size in process_sizes:
+        system = SyntheticSystem(size, 4)
+        analytics = ProcessAnalytics()
+        tables = [system.process_table() for _ in range(repeat + 2)]
+
+        def update():
+            analytics.update(tables.pop(), system.timestamp + len(tables))
+            analytics.service_trees('cpu')
+        results[f'analytics.{size}'] = measure(update, repeat)
+
+        # Index upkeep for a new scan plus one query that has to run (the cache was invalidated)
+        index = ProcessSearchIndex(read_cmdline=False)
+        tables = [system.process_table() for _ in range(repeat + 2)]
+
+        def search():
+            index.update(tables.pop())
+            index.search('name:~^worker-4 cpu>1 -pid:1')
+        results[f'search.{size}'] = measure(search, repeat)
+
+    # Every core plus the top processes go through the anomaly detector on each tick
+    for core_count in (16, 256):
+        system = SyntheticSystem(1000, core_count)
+        detector = AnomalyDetector()
+        snapshots = [system.stats() for _ in range(repeat + 2)]
+        results[f'anomaly.{core_count}'] = measure(lambda: detector.update(snapshots.pop()), repeat)
+
+
+def bench_gui(results, repeat, process_sizes, core_counts):
+    from PyQt5.QtWidgets import QApplication
+    import gui
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    def timed(update):
+        def run():
+            update()
+            app.processEvents()
+        return run
+
+    for size in process_sizes:
+        system = SyntheticSystem(size, 4)
+        widget = gui.ProcessTreeWidget()
+        widget.resize(800, 600)
+        widget.show()
+        tables = [system.process_table() for _ in range(repeat + 2)]
+        results[f'gui.process_tree.{size}'] = measure(timed(lambda: widget.update_processes(tables.pop())), repeat)
+        widget.tree_toggle.setChecked(True)
+        tables = [system.process_table() for _ in range(repeat + 2)]
+        results[f'gui.process_tree_view.{size}'] = measure(
+            timed(lambda: widget.update_processes(tables.pop())), repeat)
+        widget.close()
+
+    for window in (60, 3600):
+        chart = gui.ModernChartWidget("Benchmark", capacity=3600)
+        chart.resize(800, 300)
+        chart.show()
+        for _ in range(3600):
+            chart.push(random.random() * 100)
+        chart.set_window(window)
+        results[f'gui.chart.{window}'] = measure(timed(lambda: chart.update_chart(random.random() * 100)), repeat)
+        chart.close()
+
+    for core_count in core_counts:
+        system = SyntheticSystem(0, core_count)
+        if core_count > gui.HEATMAP_CORE_THRESHOLD:
+            widget = gui.CoreHeatmapWidget(core_count)
+        else:
+            widget = gui.CPUCoreWidget(core_count)
+        widget.resize(1200, 800)
+        widget.show()
+        results[f'gui.cores.{core_count}'] = measure(
+            timed(lambda: widget.update_cores(system.stats(processes=False)['CPU Core Usage'])), repeat)
+        widget.close()
+
+    # The sampling thread is not started, so only the snapshots fed here reach the window
+    gui.UpdateThread.start = lambda self: None
+    for size in process_sizes:
+        system = SyntheticSystem(size, len(SystemMonitor.probe_cores()['CPU Core Usage']))
+        window = gui.SystemMonitorGUI()
+        window.show()
+        runs = max(repeat // 4, 3)
+        for index in range(window.main_area.count()):
+            window.main_area.setCurrentIndex(index)
+            snapshots = [system.stats() for _ in range(runs + 1)]
+            results[f'gui.update_stats.{size}.tab{index}'] = measure(
+                timed(lambda: window.update_stats(snapshots.pop())), runs, warmup=1)
+        # The headline number is the most expensive tab
+        results[f'gui.update_stats.{size}'] = max(
+            (results[f'gui.update_stats.{size}.tab{index}'] for index in range(window.main_area.count())),
+            key=lambda summary: summary['p95'])
+        window.close()
+
+
+def check(results, thresholds):
+    failures = []
+    for name, limit in thresholds.items():
+        metric, _, field = name.rpartition('.')
+        if metric in results and isinstance(results[metric], dict):
+            value = results[metric].get(field)
+        else:
+            value = results.get(name)
+        if value is not None and value > limit:
+            failures.append({'metric': name, 'value': value, 'limit': limit})
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the monitor's own overhead")
+    parser.add_argument('--repeat', type=int, default=30, help="timed runs per measurement")
+    parser.add_argument('--hours', type=float, default=3, help="simulated hours of history")
+    parser.add_argument('--process-sizes', type=int, nargs='+', default=list(PROCESS_SIZES))
+    parser.add_argument('--core-counts', type=int, nargs='+', default=list(CORE_COUNTS))
+    parser.add_argument('--skip', nargs='*', default=[], choices=('collector', 'history', 'analytics', 'gui'))
+    parser.add_argument('--thresholds', help="JSON file of limits merged over the defaults")
+    parser.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'benchmark.json'),
+                        help="where to write the results")
+    args = parser.parse_args()
+
+    thresholds = default_thresholds(args.process_sizes, args.core_counts)
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds.update(json.load(f))
+
+    results = {}
+    if 'collector' not in args.skip:
+        bench_collector(results, args.repeat, args.process_sizes)
+    if 'history' not in args.skip:
+        bench_history(results, args.hours)
+    if 'analytics' not in args.skip:
+        bench_analytics(results, args.repeat, args.process_sizes)
+    if 'gui' not in args.skip:
+        bench_gui(results, args.repeat, args.process_sizes, args.core_counts)
+
+    failures = check(results, thresholds)
+    report = {'time': time.time(), 'python': sys.version.split()[0], 'results': results,
+              'thresholds': thresholds, 'failures': failures}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, summary in results.items():
+        if isinstance(summary, dict):
+            print(f"{name:40} median {summary['median']:9.3f} ms   p95 {summary['p95']:9.3f} ms")
+    for failure in failures:
+        print(f"FAIL {failure['metric']}: {failure['value']:.3f} > {failure['limit']}")
+    print(f"Results written to {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
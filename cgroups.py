@@ -0,0 +1,172 @@
+import os
+import time
+
+DEFAULT_ROOT = '/sys/fs/cgroup'
+# The cgroup tree is listed again this often; between listings only the known cgroups are read
+RESCAN_INTERVAL = 10.0
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+def find_root(root=None):
+    # The unified (v2) hierarchy: /sys/fs/cgroup itself, or /sys/fs/cgroup/unified on hybrid hosts
+    candidates = (root,) if root else (DEFAULT_ROOT, os.path.join(DEFAULT_ROOT, 'unified'))
+    for candidate in candidates:
+        if os.path.exists(os.path.join(candidate, 'cgroup.controllers')):
+            return candidate
+    return None
+
+
+def short_name(path):
+    # system.slice/docker-<64 hex digits>.scope -> docker-<12 hex digits>
+    name = path.rsplit('/', 1)[-1]
+    if name.endswith('.scope'):
+        name = name[:-len('.scope')]
+    prefix, _, ident = name.rpartition('-')
+    if len(ident) == 64 and HEX_DIGITS.issuperset(ident):
+        name = f'{prefix}-{ident[:12]}' if prefix else ident[:12]
+    return name
+
+
+def _read(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+def _pairs(data):
+    # "key value" lines (cpu.stat, memory.stat)
+    fields = data.split()
+    return dict(zip(fields[::2], fields[1::2]))
+
+
+def _io_totals(data):
+    # io.stat: "8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0" per device
+    read_bytes = write_bytes = 0
+    for field in data.split():
+        if field.startswith(b'rbytes='):
+            read_bytes += int(field[7:])
+        elif field.startswith(b'wbytes='):
+            write_bytes += int(field[7:])
+    return read_bytes, write_bytes
+
+
+class CgroupScanner:
+    # Per-cgroup CPU, memory and I/O from the cgroup v2 interface files. The directory tree is
+    # cached and listed again only every `rescan_interval` seconds or when a known cgroup is gone;
+    # rates come from the counters of the previous scan.
+    def __init__(self, root=None, rescan_interval=RESCAN_INTERVAL):
+        self.root = find_root(root)
+        self.rescan_interval = rescan_interval
+        self.paths = []
+        self.listed_at = None
+        self._previous = {}
+
+    def available(self):
+        return self.root is not None
+
+    def list_cgroups(self):
+        # Every cgroup below the root, parents before children; the root cgroup is the whole host
+        paths = []
+        pending = ['']
+        while pending:
+            relative = pending.pop()
+            try:
+                with os.scandir(os.path.join(self.root, relative)) as entries:
+                    children = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            for name in sorted(children, reverse=True):
+                child = f'{relative}/{name}' if relative else name
+                paths.append(child)
+                pending.append(child)
+        return paths
+
+    def scan(self):
+        now = time.monotonic()
+        if self.listed_at is None or now - self.listed_at >= self.rescan_interval:
+            self.paths = self.list_cgroups()
+            self.listed_at = now
+        previous = self._previous
+        current = {}
+        cgroups = {}
+        vanished = False
+        for path in self.paths:
+            directory = os.path.join(self.root, path)
+            try:
+                cpu = _pairs(_read(directory + '/cpu.stat'))
+                pids = [int(pid) for pid in _read(directory + '/cgroup.procs').split()]
+            except FileNotFoundError:
+                vanished = True
+                continue
+            except OSError:
+                continue
+            usage = int(cpu.get(b'usage_usec', 0))
+            # memory.* and io.stat exist only where the controller is enabled
+            try:
+                memory = int(_read(directory + '/memory.current'))
+                memory_stat = _pairs(_read(directory + '/memory.stat'))
+            except (OSError, ValueError):
+                memory = 0
+                memory_stat = {}
+            try:
+                read_bytes, write_bytes = _io_totals(_read(directory + '/io.stat'))
+            except OSError:
+                read_bytes = write_bytes = 0
+
+            current[path] = (now, usage, read_bytes, write_bytes)
+            cpu_percent = read_rate = write_rate = 0.0
+            before = previous.get(path)
+            if before is not None and now > before[0]:
+                elapsed = now - before[0]
+                # A counter that went backwards belongs to a cgroup recreated under the same name
+                cpu_percent = max(usage - before[1], 0) / elapsed / 1e4
+                read_rate = max(read_bytes - before[2], 0) / elapsed
+                write_rate = max(write_bytes - before[3], 0) / elapsed
+            # Bytes and bytes per second; cpu_percent is in percent of one CPU, like the process list
+            cgroups[path] = {
+                'cpu_percent': round(cpu_percent, 2),
+                'cpu_seconds': usage / 1e6,
+                'memory': memory,
+                'anon': int(memory_stat.get(b'anon', 0)),
+                'file': int(memory_stat.get(b'file', 0)),
+                'read_bytes': read_bytes,
+                'write_bytes': write_bytes,
+                'read_rate': round(read_rate, 1),
+                'write_rate': round(write_rate, 1),
+                'processes': len(pids),
+                'pids': pids,
+            }
+        self._previous = current
+        if vanished:
+            self.listed_at = None
+        return cgroups
+
+
+def render_metrics(lines, stats):
+    # MetricsExporter source for the per-cgroup series
+    cgroups = stats.get('Cgroups')
+    if not cgroups:
+        return
+    families = (
+        ('cgroup_cpu_seconds', 'counter', 'CPU time used by the cgroup', 'cpu_seconds', '_total'),
+        ('cgroup_memory_bytes', 'gauge', 'Memory charged to the cgroup', 'memory', ''),
+        ('cgroup_read_bytes', 'counter', 'Bytes read by the cgroup', 'read_bytes', '_total'),
+        ('cgroup_written_bytes', 'counter', 'Bytes written by the cgroup', 'write_bytes', '_total'),
+    )
+    labels = {path: path.replace('\\', '\\\\').replace('"', '\\"') for path in cgroups}
+    for name, metric_type, help_text, field, suffix in families:
+        lines.append(f'# TYPE xmonitor_{name} {metric_type}')
+        lines.append(f'# HELP xmonitor_{name} {help_text}')
+        lines.extend(f'xmonitor_{name}{suffix}{{cgroup="{labels[path]}"}} {cgroup[field]}'
+                     for path, cgroup in cgroups.items())
+    lines.append('# TYPE xmonitor_cgroup_processes gauge')
+    lines.append('# HELP xmonitor_cgroup_processes Processes directly in the cgroup')
+    lines.extend(f'xmonitor_cgroup_processes{{cgroup="{labels[path]}"}} {cgroup["processes"]}'
+                 for path, cgroup in cgroups.items())
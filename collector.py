@@ -0,0 +1,99 @@
+import time
+from debugger import debugger
+from instrumentation import instruments
+
+# Probes that come due within this many seconds of a tick run on that tick
+TICK_SLACK = 0.05
+# A probe over its cost budget is slowed down by at most this factor
+MAX_STRETCH = 8.0
+
+
+class Probe:
+    def __init__(self, name, func, interval=1.0, budget=None):
+        self.name = name
+        self.phase = f'probe.{name}'
+        self.func = func
+        self.interval = interval
+        self.budget = budget
+        self.cost = 0.0
+        self.runs = 0
+        self.last_run = None
+
+    def effective_interval(self):
+        if self.budget and self.cost > self.budget:
+            return self.interval * min(self.cost / self.budget, MAX_STRETCH)
+        return self.interval
+
+    def due(self, now):
+        if self.last_run is None:
+            return True
+        return now - self.last_run + TICK_SLACK >= self.effective_interval()
+
+    def record(self, elapsed, now):
+        # Moving average, so a single slow run does not stretch the interval
+        self.cost = elapsed if not self.runs else 0.8 * self.cost + 0.2 * elapsed
+        self.runs += 1
+        self.last_run = now
+
+
+class Collector:
+    def __init__(self):
+        self.probes = []
+        self.sinks = ()
+        self.snapshot = {}
+
+    def register(self, name, func, interval=1.0, budget=None):
+        probe = Probe(name, func, interval, budget)
+        self.probes.append(probe)
+        return probe
+
+    def add_sink(self, sink):
+        # Sinks run on the sampling thread with every merged snapshot; the tuple is replaced,
+        # never mutated, so other threads can add or remove sinks while sampling runs
+        self.sinks = self.sinks + (sink,)
+
+    def remove_sink(self, sink):
+        self.sinks = tuple(s for s in self.sinks if s != sink)
+
+    def probe(self, name):
+        for probe in self.probes:
+            if probe.name == name:
+                return probe
+        raise KeyError(name)
+
+    def sample(self, force=False):
+        now = time.monotonic()
+        updated = []
+        for probe in self.probes:
+            if not (force or probe.due(now)):
+                continue
+            started = time.perf_counter()
+            try:
+                result = probe.func()
+            except Exception as e:
+                debugger.log(f"Probe {probe.name} failed: {str(e)}", level='error')
+                continue
+            elapsed = time.perf_counter() - started
+            probe.record(elapsed, now)
+            if __debug__:
+                if instruments.enabled:
+                    instruments.record(probe.phase, elapsed)
+            self.snapshot.update(result)
+            updated.append(probe.name)
+
+        snapshot = dict(self.snapshot)
+        snapshot['timestamp'] = time.time()
+        snapshot['updated_probes'] = tuple(updated)
+        if __debug__:
+            if instruments.enabled:
+                instruments.record('collect', time.monotonic() - now)
+        self.publish(snapshot)
+        return snapshot
+
+    def publish(self, snapshot):
+        # Hands a snapshot to the sinks; sample() does this with every snapshot it takes
+        for sink in self.sinks:
+            try:
+                sink(snapshot)
+            except Exception as e:
+                debugger.log(f"Snapshot sink failed: {str(e)}", level='error')
@@ -0,0 +1,38 @@
+import time
+
+WRAP_32 = 2**32
+
+
+def counter_delta(old, new):
+    if new >= old:
+        return new - old
+    # Went backwards: a 32-bit counter in its upper half wrapped around; anything else is a
+    # device that was replaced or reset and counts from zero again
+    if WRAP_32 // 2 <= old < WRAP_32:
+        return new + WRAP_32 - old
+    return new
+
+
+class CounterRates:
+    # Per-second rates from the cumulative per-device counters of one psutil call. The previous
+    # counters are kept with the monotonic time they were read; a device seen for the first time
+    # (hot-plugged, or back after an absence) gets its first rate on the next call, and devices
+    # that disappear are forgotten.
+    def __init__(self):
+        self.previous = {}
+        self.timestamp = None
+
+    def update(self, counters, now=None):
+        # counters: {device: (counter, ...)} -> {device: (rate, ...)}
+        now = time.monotonic() if now is None else now
+        previous = self.previous
+        rates = {}
+        if self.timestamp is not None and now > self.timestamp:
+            elapsed = now - self.timestamp
+            for name, values in counters.items():
+                before = previous.get(name)
+                if before is not None:
+                    rates[name] = tuple(counter_delta(old, new) / elapsed for old, new in zip(before, values))
+        self.previous = counters
+        self.timestamp = now
+        return rates
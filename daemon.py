@@ -0,0 +1,92 @@
+import argparse
+import signal
+import socket
+import time
+import psutil
+from monitor import SystemMonitor, SCALAR_KEYS
+from tsdb import TimeSeriesWriter
+from openmetrics import MetricsExporter, MetricsServer
+from shmbus import SnapshotBus, extras_size, DEFAULT_NAME as DEFAULT_BUS
+from debugger import debugger
+from instrumentation import instruments
+from scheduler import TickScheduler
+from recording import Recorder
+import cgroups
+
+
+def run_daemon(data_dir, interval=1.0, segment_bytes=64 * 1024**2, max_bytes=1024**3, duration=None,
+               metrics_port=None, metrics_host='127.0.0.1', bus_name=None, record_path=None):
+    scheduler = TickScheduler(interval)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: scheduler.stop())
+
+    # The on-disk records hold scalars and per-core usage only, so the process and cgroup scans are
+    # skipped unless the metrics endpoint, the bus readers or a session recording need them
+    needs_processes = metrics_port or bus_name or record_path
+    collector = SystemMonitor.create_collector(exclude=() if needs_processes else ('processes', 'cgroups'))
+    writer = TimeSeriesWriter(data_dir, SCALAR_KEYS, psutil.cpu_count(), segment_bytes, max_bytes)
+    bus = None
+    first = None
+    if bus_name:
+        # The JSON area of each slot is sized from what this host actually reports. That sample goes
+        # out like any other once every sink is attached, so readers do not wait a full process
+        # interval for their first scan
+        first = collector.sample()
+        bus = SnapshotBus.create(bus_name, psutil.cpu_count(), extra_bytes=extras_size(first))
+        collector.add_sink(bus.publish)
+    recorder = None
+    if record_path:
+        recorder = Recorder(record_path, metadata={'host': socket.gethostname(), 'interval': interval})
+        collector.add_sink(recorder.record)
+    server = None
+    if metrics_port:
+        exporter = MetricsExporter()
+        exporter.add_source(instruments.render_metrics)
+        exporter.add_source(cgroups.render_metrics)
+        collector.add_sink(exporter.update)
+        server = MetricsServer(exporter, metrics_host, metrics_port).start()
+    debugger.log(f"Collector daemon writing to {data_dir} every {interval}s", level='info')
+
+    started = time.monotonic()
+    try:
+        if first is not None:
+            collector.publish(first)
+            writer.append(first)
+        while scheduler.wait():
+            if __debug__:
+                if instruments.enabled:
+                    instruments.tick()
+            writer.append(collector.sample())
+            if duration and time.monotonic() - started >= duration:
+                break
+    finally:
+        if server is not None:
+            server.stop()
+        if bus is not None:
+            bus.close()
+        if recorder is not None:
+            recorder.close()
+        writer.close()
+        debugger.log("Collector daemon stopped", level='info')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless system monitor collector")
+    parser.add_argument('--data-dir', default='data', help="directory for the time-series segments")
+    parser.add_argument('--interval', type=float, default=1.0, help="sampling interval in seconds")
+    parser.add_argument('--segment-mb', type=int, default=64, help="rotate segments at this size")
+    parser.add_argument('--max-mb', type=int, default=1024, help="delete the oldest segments above this total")
+    parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    parser.add_argument('--metrics-port', type=int, default=None, help="serve OpenMetrics on this port")
+    parser.add_argument('--metrics-host', default='127.0.0.1', help="address for the metrics endpoint")
+    parser.add_argument('--bus', nargs='?', const=DEFAULT_BUS, default=None, metavar='NAME',
+                        help="publish snapshots to a shared-memory bus for local readers")
+    parser.add_argument('--record', default=None, metavar='PATH',
+                        help="also record the full session, processes included, for replay in the GUI")
+    args = parser.parse_args()
+    run_daemon(args.data_dir, args.interval, args.segment_mb * 1024**2, args.max_mb * 1024**2, args.duration,
+               args.metrics_port, args.metrics_host, args.bus, args.record)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,71 @@
-import logging
-from datetime import datetime
+import os
+import atexit
+import threading
+
+# Same numbers as the logging module, which is only imported once something is actually logged
+LEVELS = {
+    'debug': 10,
+    'info': 20,
+    'warning': 30,
+    'error': 40,
+    'critical': 50,
+}
+
 
 class Debugger:
-    def __init__(self, log_file='system_monitor.log'):
-        self.logger = logging.getLogger('SystemMonitor')
-        self.logger.setLevel(logging.DEBUG)
-        
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.DEBUG)
-        
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        
-        self.logger.addHandler(file_handler)
-
-    def log(self, message, level='info'):
-        if level == 'debug':
-            self.logger.debug(message)
-        elif level == 'info':
-            self.logger.info(message)
-        elif level == 'warning':
-            self.logger.warning(message)
-        elif level == 'error':
-            self.logger.error(message)
-        elif level == 'critical':
-            self.logger.critical(message)
+    def __init__(self, log_file='system_monitor.log', level=None, max_bytes=10 * 1024**2, backup_count=5,
+                 rotate_seconds=24 * 3600, json_lines=None):
+        level = level or os.environ.get('SYSTEM_MONITOR_LOG_LEVEL', 'info')
+        if json_lines is None:
+            json_lines = os.environ.get('SYSTEM_MONITOR_LOG_JSON') == '1'
+        self.level = LEVELS[level.lower()]
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_seconds = rotate_seconds
+        self.json_lines = json_lines
+        self.logger = None
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # The logger, the file handler and the writer thread are set up by the first record that passes the level
+        with self._lock:
+            if self.logger is not None:
+                return self.logger
+            import queue
+            import logging
+            from logging.handlers import QueueListener
+            from log_handlers import (TextFormatter, JsonLinesFormatter, SizeAndTimeRotatingFileHandler,
+                                      DeferredQueueHandler)
+
+            logger = logging.getLogger('SystemMonitor')
+            logger.setLevel(self.level)
+            logger.propagate = False
+
+            file_handler = SizeAndTimeRotatingFileHandler(self.log_file, self.max_bytes, self.backup_count,
+                                                          self.rotate_seconds)
+            if self.json_lines:
+                file_handler.setFormatter(JsonLinesFormatter())
+            else:
+                file_handler.setFormatter(TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+            log_queue = queue.SimpleQueue()
+            logger.addHandler(DeferredQueueHandler(log_queue))
+            self.listener = QueueListener(log_queue, file_handler)
+            self.listener.start()
+            atexit.register(self.listener.stop)
+            self.logger = logger
+            return logger
+
+    def enabled(self, level='debug'):
+        return LEVELS[level] >= self.level
+
+    def log(self, message, *args, level='info', fields=None):
+        # `args` are %-formatted and `fields` serialized on the writer thread, and only if the level is enabled
+        level_number = LEVELS.get(level)
+        if level_number is not None and level_number >= self.level:
+            logger = self.logger or self._start()
+            logger.log(level_number, message, *args, extra={'fields': fields} if fields else None)
 
 debugger = Debugger()
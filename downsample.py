@@ -0,0 +1,33 @@
+def lttb(xs, ys, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the points that preserve the visual shape
+    length = len(ys)
+    if threshold >= length or threshold < 3:
+        return list(xs), list(ys)
+
+    out_x = [xs[0]]
+    out_y = [ys[0]]
+    bucket_size = (length - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        next_count = next_end - end
+        avg_x = sum(xs[j] for j in range(end, next_end)) / next_count
+        avg_y = sum(ys[j] for j in range(end, next_end)) / next_count
+
+        ax, ay = xs[selected], ys[selected]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        selected = best
+
+    out_x.append(xs[length - 1])
+    out_y.append(ys[length - 1])
+    return out_x, out_y
@@ -0,0 +1,147 @@
+import os
+import csv
+import json
+import zlib
+import struct
+from array import array
+
+COLUMNAR_MAGIC = b'XMCOL1'
+# footer length, magic
+COLUMNAR_TRAILER = struct.Struct('<Q6s')
+CHUNK_ROWS = 2000
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportData:
+    # Copies taken on the GUI thread, so a worker can stream them while sampling goes on
+    def __init__(self, columns, process_snapshots=(), process_names=()):
+        self.columns = columns
+        self.keys = tuple(columns)
+        self.process_snapshots = list(process_snapshots)
+        self.process_names = list(process_names)
+
+    @classmethod
+    def from_history(cls, rollup, span, points):
+        processes = rollup.history.processes
+        start = rollup.history.latest('timestamp')
+        start = (start or 0) - span
+        snapshots = [snapshot for snapshot in processes.snapshots() if snapshot[0] >= start]
+        return cls(rollup.columns(span, points), snapshots, processes.names)
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def process_rows(self):
+        return sum(len(snapshot[1]) for snapshot in self.process_snapshots)
+
+
+def _chunks(total, progress, cancelled):
+    for start in range(0, total, CHUNK_ROWS):
+        if cancelled is not None and cancelled():
+            raise ExportCancelled()
+        yield start, min(start + CHUNK_ROWS, total)
+        if progress is not None:
+            progress(min(start + CHUNK_ROWS, total), total)
+
+
+def _remove_on_cancel(write):
+    def wrapper(data, path, progress=None, cancelled=None):
+        try:
+            write(data, path, progress, cancelled)
+        except ExportCancelled:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+    return wrapper
+
+
+@_remove_on_cancel
+def write_csv(data, path, progress=None, cancelled=None):
+    columns = [data.columns[key] for key in data.keys]
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(data.keys)
+        for start, end in _chunks(len(data), progress, cancelled):
+            writer.writerows(zip(*(column[start:end] for column in columns)))
+
+
+@_remove_on_cancel
+def write_processes_csv(data, path, progress=None, cancelled=None):
+    # One row per process per scan, instead of a repr of the whole list in every sample
+    names = data.process_names
+    total = len(data.process_snapshots)
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(('timestamp', 'pid', 'name', 'cpu_percent', 'memory_percent'))
+        for index, (timestamp, pids, name_ids, cpu, memory) in enumerate(data.process_snapshots):
+            if cancelled is not None and cancelled():
+                raise ExportCancelled()
+            writer.writerows((timestamp, pid, names[name_id], f"{cpu_percent:.2f}", f"{memory_percent:.2f}")
+                             for pid, name_id, cpu_percent, memory_percent in zip(pids, name_ids, cpu, memory))
+            if progress is not None:
+                progress(index + 1, total)
+
+
+def _process_columns(data):
+    columns = {
+        'process.timestamp': array('d'),
+        'process.pid': array('i'),
+        'process.name_id': array('I'),
+        'process.cpu_percent': array('f'),
+        'process.memory_percent': array('f'),
+    }
+    for timestamp, pids, name_ids, cpu, memory in data.process_snapshots:
+        columns['process.timestamp'].extend([timestamp] * len(pids))
+        columns['process.pid'].extend(pids)
+        columns['process.name_id'].extend(name_ids)
+        columns['process.cpu_percent'].extend(cpu)
+        columns['process.memory_percent'].extend(memory)
+    return columns
+
+
+@_remove_on_cancel
+def write_columnar(data, path, progress=None, cancelled=None):
+    # Each column is a zlib stream of its raw array bytes; a JSON footer records the layout
+    columns = dict(data.columns)
+    columns.update(_process_columns(data))
+    total = sum(len(column) for column in columns.values())
+    written = 0
+    layout = []
+    with open(path, 'wb') as f:
+        for name, column in columns.items():
+            offset = f.tell()
+            compressor = zlib.compressobj(6)
+            for start, end in _chunks(len(column), None, cancelled):
+                f.write(compressor.compress(column[start:end].tobytes()))
+                written += end - start
+                if progress is not None:
+                    progress(written, total)
+            f.write(compressor.flush())
+            layout.append({'name': name, 'typecode': column.typecode, 'length': len(column),
+                           'offset': offset, 'size': f.tell() - offset})
+        footer = json.dumps({'columns': layout, 'process_names': data.process_names}).encode('utf-8')
+        f.write(footer)
+        f.write(COLUMNAR_TRAILER.pack(len(footer), COLUMNAR_MAGIC))
+
+
+def load_columnar(path, names=None):
+    # Returns ({column name: array}, process names); `names` limits which columns are decompressed
+    with open(path, 'rb') as f:
+        f.seek(-COLUMNAR_TRAILER.size, os.SEEK_END)
+        footer_size, magic = COLUMNAR_TRAILER.unpack(f.read(COLUMNAR_TRAILER.size))
+        if magic != COLUMNAR_MAGIC:
+            raise ValueError(f'{path} is not a columnar export')
+        f.seek(-COLUMNAR_TRAILER.size - footer_size, os.SEEK_END)
+        footer = json.loads(f.read(footer_size))
+        columns = {}
+        for entry in footer['columns']:
+            if names is not None and entry['name'] not in names:
+                continue
+            f.seek(entry['offset'])
+            column = array(entry['typecode'])
+            column.frombytes(zlib.decompress(f.read(entry['size'])))
+            columns[entry['name']] = column
+    return columns, footer['process_names']
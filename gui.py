@@ -1,26 +1,245 @@
+import os
 import sys
-import csv
+import time
+import operator
+import socket
+import threading
+import zlib
+from array import array
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QPushButton, QComboBox, QTabWidget, QProgressBar, 
-                             QStyleFactory, QSplitter, QFrame, QTreeWidget, QTreeWidgetItem,
+                             QStyleFactory, QSplitter, QFrame, QTreeWidget, QTreeWidgetItem, QTreeView,
                              QHeaderView, QMenu, QAction, QFileDialog, QMessageBox, QLineEdit,
                              QGridLayout, QDialog, QFormLayout, QShortcut, QSizePolicy, QScrollArea,
-                             QSystemTrayIcon)
-from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal, QSize, QPropertyAnimation, QEasingCurve
+                             QSystemTrayIcon, QTableView, QInputDialog, QProgressDialog, QStackedWidget,
+                             QCheckBox, QSlider)
+from PyQt5.QtCore import (QTimer, Qt, QThread, pyqtSignal, QSize, QPropertyAnimation, QEasingCurve,
+                          QAbstractTableModel, QAbstractItemModel, QModelIndex, QPointF, QEvent)
 from PyQt5.QtGui import QFont, QColor, QPalette, QKeySequence, QIcon, QPixmap, QPainter
-from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis, QSplineSeries, QPieSeries
-from monitor import SystemMonitor
+from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis, QPieSeries
+from monitor import SystemMonitor, SCALAR_KEYS, is_partition
+from history import HistoryStore
+from downsample import lttb
+from rollup import Rollup
+from tsdb import TimeSeriesReader
+from heatmap import CoreHeatmapWidget
+from alerts import AlertEngine, load_rules
+from export import ExportData, ExportCancelled, write_csv, write_processes_csv, write_columnar
+from openmetrics import MetricsExporter, MetricsServer, DEFAULT_PORT as METRICS_PORT
+from remote import RemoteViewer, parse_address
+from shmbus import attach_source
+from instrumentation import instruments
+from scheduler import TickScheduler
+from process_analytics import ProcessAnalytics
+from process_search import ProcessSearchIndex, parse_query
+from cgroups import short_name, render_metrics as render_cgroup_metrics
+from anomaly import AnomalyDetector
+from recording import Recorder, Recording
 from debugger import debugger
 import psutil
 
 class UpdateThread(QThread):
     update_signal = pyqtSignal(dict)
 
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # כשתהליך איסוף כבר מפרסם לזיכרון המשותף קוראים ממנו במקום לדגום שוב
+        self.collector = attach_source()
+        self.follows_bus = self.collector is not None
+        if self.collector is None:
+            self.collector = SystemMonitor.create_collector()
+        self.scheduler = TickScheduler(1.0)
+
+    def run(self):
+        last_tick = None
+        # בקצב של האוסף כשעוקבים אחרי הזיכרון המשותף, אחרת לפי המתזמן
+        while self.follows_bus or self.scheduler.wait():
+            if __debug__:
+                if instruments.enabled:
+                    tick = time.monotonic()
+                    if last_tick is not None:
+                        instruments.record('tick.period', tick - last_tick)
+                    last_tick = tick
+                    instruments.tick()
+            stats = self.collector.sample()
+            if stats is None:
+                # The collector on the bus stalled; nothing new to show
+                continue
+            self.scheduler.observe(stats)
+            if __debug__:
+                if instruments.enabled:
+                    instruments.mark_emitted()
+            self.update_signal.emit(stats)
+
+class RemoteViewerThread(QThread):
+    hosts_signal = pyqtSignal(list)
+    stats_signal = pyqtSignal(str, dict)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, address, parent=None):
+        super().__init__(parent)
+        self.address = address
+        self.viewer = None
+        self.hosts = ()
+        self.running = True
+
+    def subscribe(self, hosts):
+        self.hosts = tuple(hosts)
+        if self.viewer is not None:
+            self.viewer.subscribe(self.hosts)
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+    def run(self):
+        try:
+            self.viewer = RemoteViewer(self.address)
+            self.viewer.subscribe(self.hosts)
+            while self.running:
+                for event in self.viewer.events():
+                    if event[0] == 'hosts':
+                        self.hosts_signal.emit(event[1])
+                    else:
+                        self.stats_signal.emit(event[1], event[2])
+        except (OSError, ValueError, KeyError, TypeError, zlib.error) as e:
+            self.error_signal.emit(str(e))
+        finally:
+            if self.viewer is not None:
+                self.viewer.close()
+
+class ReplayThread(QThread):
+    update_signal = pyqtSignal(dict)
+    position_signal = pyqtSignal(int)
+    playing_signal = pyqtSignal(bool)
+
+    # Plays a recording on its own clock. Above REPLAY_MAX_FPS the frames in between are only
+    # decoded, not sent, and a new snapshot is read only once the views took the previous one,
+    # so the GUI never falls behind however high the speed.
+    def __init__(self, recording, parent=None):
+        super().__init__(parent)
+        self.recording = recording
+        self.condition = threading.Condition()
+        self.running = True
+        self.playing = False
+        self.speed = 1.0
+        self.seek_to = 0
+        self.in_flight = False
+
+    def play(self, playing=True):
+        with self.condition:
+            self.playing = playing
+            self.condition.notify()
+
+    def set_speed(self, speed):
+        with self.condition:
+            self.speed = speed
+            self.condition.notify()
+
+    def seek(self, frame):
+        with self.condition:
+            self.seek_to = frame
+            self.condition.notify()
+
+    def delivered(self):
+        with self.condition:
+            self.in_flight = False
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.wait()
+
     def run(self):
+        recording = self.recording
+        timestamps = recording.timestamps
+        last = len(recording) - 1
+        frame = 0
+        clock = timestamps[0]
+        wall = None
+        next_emit = 0.0
         while True:
-            stats = SystemMonitor.get_system_stats()
+            with self.condition:
+                while self.running and (self.in_flight or self.seek_to is None and not self.playing):
+                    if not self.playing:
+                        wall = None
+                    self.condition.wait()
+                if not self.running:
+                    break
+                target = self.seek_to
+                self.seek_to = None
+                playing = self.playing
+                speed = self.speed
+            now = time.monotonic()
+            if target is not None:
+                target = min(max(target, 0), last)
+                clock = timestamps[target]
+                wall = now
+            elif frame >= last:
+                with self.condition:
+                    self.playing = False
+                self.playing_signal.emit(False)
+                continue
+            else:
+                if wall is not None:
+                    clock += (now - wall) * speed
+                wall = now
+                following = timestamps[frame + 1]
+                if following - clock > REPLAY_MAX_GAP * speed:
+                    clock = following - REPLAY_MAX_GAP * speed
+                delay = max((following - clock) / speed, next_emit - now)
+                if delay > 0:
+                    with self.condition:
+                        if self.running and self.seek_to is None and self.playing and self.speed == speed:
+                            self.condition.wait(delay)
+                    continue
+                target = recording.frame_at(clock)
+            stats = recording.read(target)
+            frame = target
+            if playing:
+                next_emit = now + 1.0 / REPLAY_MAX_FPS
+            with self.condition:
+                self.in_flight = True
+            self.position_signal.emit(frame)
             self.update_signal.emit(stats)
-            self.msleep(1000)  # עדכון כל שנייה
+        recording.close()
+
+class ExportThread(QThread):
+    progress_signal = pyqtSignal(int)
+    finished_signal = pyqtSignal(str)
+
+    def __init__(self, data, file_name, columnar=False, parent=None):
+        super().__init__(parent)
+        self.data = data
+        self.file_name = file_name
+        self.columnar = columnar
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, done, total, base=0, share=100):
+        self.progress_signal.emit(base + int(share * done / max(total, 1)))
+
+    def run(self):
+        is_cancelled = lambda: self.cancelled
+        try:
+            if self.columnar:
+                write_columnar(self.data, self.file_name, self.report, is_cancelled)
+            else:
+                # Scalars and the normalized process table go to separate CSV files
+                write_csv(self.data, self.file_name, lambda done, total: self.report(done, total, 0, 50), is_cancelled)
+                root, extension = os.path.splitext(self.file_name)
+                write_processes_csv(self.data, f"{root}_processes{extension or '.csv'}",
+                                    lambda done, total: self.report(done, total, 50, 50), is_cancelled)
+        except ExportCancelled:
+            pass
+        except OSError as e:
+            self.finished_signal.emit(str(e))
+            return
+        self.finished_signal.emit("")
 
 class ModernProgressBar(QProgressBar):
     def __init__(self, parent=None):
@@ -79,80 +298,748 @@ class StatWidget(QFrame):
         animation.setEasingCurve(QEasingCurve.OutCubic)
         animation.start()
 
+CHART_WINDOWS = (("1 min", 60), ("1 h", 3600), ("24 h", 86400))
+# Above this many logical CPUs the CPU Cores tab shows one heatmap instead of a chart per core
+HEATMAP_CORE_THRESHOLD = int(os.environ.get('SYSTEM_MONITOR_HEATMAP_CORES', 16))
+# Exports use the coarsest rollup tier that still yields about this many rows
+EXPORT_POINTS = 3600
+# Replay speeds offered, the most snapshots a second the views are sent while replaying, and the
+# longest a gap in a recording (the recorder stopped, the machine slept) is played for, in seconds
+REPLAY_SPEEDS = (1, 2, 5, 10, 25, 50, 100)
+REPLAY_MAX_FPS = 20
+REPLAY_MAX_GAP = 2.0
+
 class ModernChartWidget(QChartView):
-    def __init__(self, title, parent=None):
+    def __init__(self, title, parent=None, capacity=60, auto_range=False):
         super().__init__(parent)
         self.chart = QChart()
         self.chart.setTitle(title)
         self.chart.setTitleFont(QFont("Arial", 14, QFont.Bold))
         self.chart.setTitleBrush(QColor("#2196F3"))
         self.setChart(self.chart)
-        self.series = QSplineSeries()
+        # Straight segments: the points are already LTTB-downsampled, and spline smoothing of a few
+        # hundred points costs about a hundred times more to paint
+        self.series = QLineSeries()
         self.chart.addSeries(self.series)
         self.chart.createDefaultAxes()
         self.chart.axes(Qt.Horizontal)[0].setRange(0, 60)
         self.chart.axes(Qt.Vertical)[0].setRange(0, 100)
         self.chart.setBackgroundBrush(QColor("#FFFFFF"))
-        self.chart.setAnimationOptions(QChart.SeriesAnimations)
-        self.data_points = []
+        # Animating every point on each refresh costs more than drawing it
+        self.chart.setAnimationOptions(QChart.NoAnimation)
+
+        # Percentages stay on 0-100; rates scale the vertical axis to what is shown
+        self.auto_range = auto_range
+        # Ring buffer of the last `capacity` samples
+        self.capacity = capacity
+        self.values = array('d', bytes(8 * capacity))
+        self.head = 0
+        self.size = 0
+        self.window = min(capacity, 60)
+        self.source = None
+        self.windows = [(label, seconds) for label, seconds in CHART_WINDOWS if seconds <= capacity]
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_window_menu)
+
+    def set_source(self, rollup, *keys):
+        # Windows longer than the ring buffer are read from the rollup tiers; values of several keys are summed
+        self.source = (rollup, keys)
+        self.windows = list(CHART_WINDOWS)
+
+    def push(self, value):
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+        self.render()
+
+    def recent(self, count):
+        count = min(count, self.size)
+        start = (self.head - count) % self.capacity
+        if start + count <= self.capacity:
+            return self.values[start:start + count]
+        return self.values[start:] + self.values[:self.head]
+
+    def render(self):
+        width = max(int(self.chart.plotArea().width()), 3)
+        if self.window > self.capacity and self.source is not None:
+            xs, values = self.query_source(width)
+        else:
+            values = self.recent(self.window)
+            xs = range(self.window - len(values), self.window)
+        if len(values) > width:
+            xs, values = lttb(xs, values, width)
+        self.series.replace([QPointF(x, y) for x, y in zip(xs, values)])
+        if self.auto_range:
+            self.chart.axes(Qt.Vertical)[0].setRange(0, max(max(values, default=0) * 1.1, 0.1))
+
+    def query_source(self, points):
+        rollup, keys = self.source
+        end = time.time()
+        values = None
+        for key in keys:
+            timestamps, column = rollup.query(key, self.window, points, end=end)
+            values = column if values is None else array('d', map(operator.add, values, column))
+        xs = [self.window - (end - timestamp) for timestamp in timestamps]
+        return xs, values
 
     def update_chart(self, value):
-        self.data_points.append(value)
-        if len(self.data_points) > 60:
-            self.data_points.pop(0)
-        self.series.clear()
-        for i, point in enumerate(self.data_points):
-            self.series.append(i, point)
+        self.push(value)
+        self.render()
+
+    def set_window(self, seconds):
+        self.window = seconds if self.source is not None else min(seconds, self.capacity)
+        self.chart.axes(Qt.Horizontal)[0].setRange(0, self.window)
+        self.render()
+
+    def show_window_menu(self, position):
+        if len(self.windows) < 2:
+            return
+        menu = QMenu()
+        for label, seconds in self.windows:
+            action = menu.addAction(f"Show last {label}")
+            action.setCheckable(True)
+            action.setChecked(seconds == self.window)
+            action.triggered.connect(lambda checked, seconds=seconds: self.set_window(seconds))
+        menu.exec_(self.mapToGlobal(position))
+
+class DeviceRatesWidget(QChartView):
+    # One line per disk or network interface; devices appear and disappear with hot-plug
+    def __init__(self, title, capacity=300, include=None, parent=None):
+        super().__init__(parent)
+        self.chart = QChart()
+        self.chart.setTitle(title)
+        self.chart.setTitleFont(QFont("Arial", 14, QFont.Bold))
+        self.chart.setTitleBrush(QColor("#2196F3"))
+        self.chart.setBackgroundBrush(QColor("#FFFFFF"))
+        self.chart.setAnimationOptions(QChart.NoAnimation)
+        self.setChart(self.chart)
+        self.axis_x = QValueAxis()
+        self.axis_x.setRange(0, capacity)
+        self.axis_y = QValueAxis()
+        self.axis_y.setTitleText("MB/s")
+        self.chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.capacity = capacity
+        self.include = include
+        # Ring buffers that share one head, so every device's samples line up
+        self.head = 0
+        self.size = 0
+        self.values = {}
+        self.series = {}
+
+    def push(self, rates):
+        # rates: {device: (bytes per second, bytes per second)}; the chart shows their sum in MB/s
+        rates = {name: rate for name, rate in (rates or {}).items() if self.include is None or self.include(name)}
+        for name in [name for name in self.values if name not in rates]:
+            del self.values[name]
+            self.chart.removeSeries(self.series.pop(name))
+        for name, rate in rates.items():
+            values = self.values.get(name)
+            if values is None:
+                values = self.values[name] = array('d', bytes(8 * self.capacity))
+                series = self.series[name] = QLineSeries()
+                series.setName(name)
+                self.chart.addSeries(series)
+                series.attachAxis(self.axis_x)
+                series.attachAxis(self.axis_y)
+            values[self.head] = sum(rate) / 1024**2
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def clear(self):
+        self.push({})
+        self.head = 0
+        self.size = 0
+
+    def render(self):
+        count = self.size
+        start = (self.head - count) % self.capacity
+        xs = range(self.capacity - count, self.capacity)
+        highest = 0.0
+        for name, values in self.values.items():
+            if start + count <= self.capacity:
+                recent = values[start:start + count]
+            else:
+                recent = values[start:] + values[:self.head]
+            highest = max(highest, max(recent, default=0))
+            self.series[name].replace([QPointF(x, y) for x, y in zip(xs, recent)])
+        self.axis_y.setRange(0, max(highest * 1.1, 0.1))
+
+    def update_rates(self, rates):
+        self.push(rates)
+        self.render()
+
+def contiguous_runs(rows):
+    # (first, last) pairs for each run of consecutive row numbers in a sorted list
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] == row - 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs
+
+class ProcessTableModel(QAbstractTableModel):
+    HEADERS = ["PID", "Name", "CPU %", "Memory %"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pids = []
+        self.names = []
+        self.cpu = []
+        self.memory = []
+        self.rows = {}
+        self.sort_column = 2
+        self.sort_order = Qt.DescendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.pids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        row, column = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return str(self.pids[row])
+            if column == 1:
+                return self.names[row]
+            if column == 2:
+                return f"{self.cpu[row]:.2f}"
+            return f"{self.memory[row]:.2f}"
+        if role == Qt.UserRole:
+            return (self.pids, self.names, self.cpu, self.memory)[column][row]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.reorder()
+
+    def reorder(self):
+        # Sorted here with one Python sort over the columns; a sort proxy calls data() for every
+        # comparison, which costs hundreds of milliseconds at a few thousand rows
+        column = (self.pids, self.names, self.cpu, self.memory)[self.sort_column]
+        key = (lambda row: column[row].lower()) if self.sort_column == 1 else column.__getitem__
+        order = sorted(range(len(self.pids)), key=key, reverse=self.sort_order == Qt.DescendingOrder)
+        if all(row == position for position, row in enumerate(order)):
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_pids = [self.pids[index.row()] for index in persistent]
+        for values in (self.pids, self.names, self.cpu, self.memory):
+            values[:] = [values[row] for row in order]
+        self.rows = {pid: row for row, pid in enumerate(self.pids)}
+        self.changePersistentIndexList(persistent, [self.index(self.rows[pid], index.column())
+                                                    for pid, index in zip(persistent_pids, persistent)])
+        self.layoutChanged.emit()
+
+    def update_processes(self, processes, rows=None):
+        # rows: only these rows of the table are shown
+        if hasattr(processes, 'pids'):
+            pids, names, cpu, memory = processes.pids, processes.names, processes.cpu, processes.memory
+        else:
+            pids = [p['pid'] for p in processes]
+            names = [p['name'] for p in processes]
+            cpu = [p['cpu_percent'] or 0.0 for p in processes]
+            memory = [p['memory_percent'] or 0.0 for p in processes]
+        if rows is not None:
+            pids = [pids[row] for row in rows]
+            names = [names[row] for row in rows]
+            cpu = [cpu[row] for row in rows]
+            memory = [memory[row] for row in rows]
+        incoming = {pid: i for i, pid in enumerate(pids)}
+
+        removed = [row for row, pid in enumerate(self.pids) if pid not in incoming]
+        for first, last in reversed(contiguous_runs(removed)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for column in (self.pids, self.names, self.cpu, self.memory):
+                del column[first:last + 1]
+            self.endRemoveRows()
+
+        order = [incoming[pid] for pid in self.pids]
+        new_names = [names[i] for i in order]
+        new_cpu = [cpu[i] for i in order]
+        new_memory = [memory[i] for i in order]
+        if new_cpu != self.cpu or new_memory != self.memory or new_names != self.names:
+            self.names, self.cpu, self.memory = new_names, new_cpu, new_memory
+            # One range for the whole table; without a proxy the view only repaints what is on screen
+            self.dataChanged.emit(self.index(0, 1), self.index(len(self.pids) - 1, len(self.HEADERS) - 1))
+
+        self.rows = {pid: row for row, pid in enumerate(self.pids)}
+        added = [i for i, pid in enumerate(pids) if pid not in self.rows]
+        if added:
+            first = len(self.pids)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for i in added:
+                self.rows[pids[i]] = len(self.pids)
+                self.pids.append(pids[i])
+                self.names.append(names[i])
+                self.cpu.append(cpu[i])
+                self.memory.append(memory[i])
+            self.endInsertRows()
+
+class ProcessTreeModel(QAbstractItemModel):
+    # The parent/child tree straight from ProcessAnalytics. data() reads the analytics columns for
+    # the rows on screen only, and a parent's children are sorted in Python once the view asks for
+    # them, which it does for the expanded rows alone. A refresh moves the persistent indexes
+    # (expanded and selected rows) along with their pids. An index carries its pid as the internal id.
+    HEADERS = ["Name", "PID", "CPU %", "Memory %", "I/O KB/s", "Tree CPU %", "Tree Memory %", "Processes"]
+    FORMATS = (None, None, "{:.1f}", "{:.2f}", "{:.1f}", "{:.1f}", "{:.2f}", "{:.0f}")
+    IO_COLUMN = 4
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Column values by table row, as of the last refresh
+        self.values = ((),) * len(self.HEADERS)
+        self.rows = {}
+        # pid -> parent pid (0 for the roots), parent pid -> shown children
+        self.parents = {}
+        self.children = {}
+        # parent pid -> its children in sort order, pid -> row under its parent; filled as asked for
+        self.sorted = {}
+        self.positions = {}
+        self.sort_key = None
+        self.source = None
+        self.sort_column = 5
+        self.sort_order = Qt.DescendingOrder
+
+    # The view asks for these once per laid-out row, so they stay short. An invalid index has
+    # column -1 and internal id 0, which is where the roots are kept.
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.children.get(parent.internalId(), ()))
+
+    def hasChildren(self, parent=QModelIndex()):
+        return parent.column() <= 0 and parent.internalId() in self.children
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def index(self, row, column, parent=QModelIndex()):
+        siblings = self.sorted.get(parent.internalId()) or self.siblings(parent.internalId())
+        if 0 <= row < len(siblings) and 0 <= column < len(self.HEADERS):
+            return self.createIndex(row, column, siblings[row])
+        return QModelIndex()
+
+    def parent(self, index=None):
+        if index is None:
+            # QObject.parent()
+            return super().parent()
+        if not index.isValid():
+            return QModelIndex()
+        ppid = self.parents.get(index.internalId(), 0)
+        if not ppid:
+            return QModelIndex()
+        return self.createIndex(self.position(ppid), 0, ppid)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            column = index.column()
+            value = self.values[column][self.rows[index.internalId()]]
+            if column == 0:
+                return value
+            if column == 1:
+                return str(value)
+            if column == self.IO_COLUMN:
+                value /= 1024
+            return self.FORMATS[column].format(value)
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def pid(self, index):
+        return index.internalId() if index.isValid() else None
+
+    def siblings(self, ppid):
+        kids = self.sorted.get(ppid)
+        if kids is None:
+            kids = self.sorted[ppid] = sorted(self.children.get(ppid, ()), key=self.sort_key,
+                                              reverse=self.sort_order == Qt.DescendingOrder)
+            positions = self.positions
+            for row, pid in enumerate(kids):
+                positions[pid] = row
+        return kids
+
+    def position(self, pid):
+        # None for a pid that is gone or filtered out
+        if pid not in self.positions and pid in self.parents:
+            self.siblings(self.parents[pid])
+        return self.positions.get(pid)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        if self.source is not None:
+            self.refresh(*self.source)
+
+    def refresh(self, analytics, visible=None):
+        # visible: the pids to show, None for all of them
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_pids = [index.internalId() for index in persistent]
+        table = analytics.table
+        self.values = (table.names, table.pids, table.cpu, table.memory, analytics.io_rate,
+                       analytics.rollup('cpu'), analytics.rollup('memory'), analytics.rollup('count'))
+        self.rows = rows = analytics.index
+        self.source = (analytics, visible)
+        # Copied, as the analytics keep changing theirs in place on the next scan
+        self.parents = parents = dict(analytics.parent)
+        if visible is None:
+            self.children = {pid: list(kids) for pid, kids in analytics.children.items() if kids}
+        else:
+            children = {}
+            for pid in visible:
+                children.setdefault(parents.get(pid, 0), []).append(pid)
+            self.children = children
+        column = self.values[self.sort_column]
+        if self.sort_column == 0:
+            self.sort_key = lambda pid: column[rows[pid]].lower()
+        else:
+            self.sort_key = lambda pid: column[rows[pid]]
+        self.sorted = {}
+        self.positions = {}
+        new_indexes = []
+        for pid, index in zip(persistent_pids, persistent):
+            row = self.position(pid)
+            new_indexes.append(QModelIndex() if row is None else self.createIndex(row, index.column(), pid))
+        self.changePersistentIndexList(persistent, new_indexes)
+        self.layoutChanged.emit()
 
 class ProcessTreeWidget(QWidget):
+    # The search runs once typing pauses for this many milliseconds
+    SEARCH_DELAY = 200
+    SEARCH_HELP = ("Words match the name or command line. Fields: name: cmd: user: (add ~ for a regular "
+                   "expression, = for an exact match), pid: ppid: uid: cpu mem rss(MB) threads with > >= < <= = !=. "
+                   "A leading - negates a term.")
+
     def __init__(self, parent=None):
         super().__init__(parent)
         layout = QVBoxLayout(self)
         
         # Add search input
+        controls = QHBoxLayout()
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Search processes...")
-        self.search_input.textChanged.connect(self.filter_processes)
-        layout.addWidget(self.search_input)
+        self.search_input.setPlaceholderText("Search processes, e.g. name:~^java cpu>20 user:www pid:1234")
+        self.search_input.setToolTip(self.SEARCH_HELP)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.filter_processes)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.filter_processes)
+        controls.addWidget(self.search_input)
+        self.tree_toggle = QCheckBox("Tree view")
+        self.tree_toggle.toggled.connect(self.set_tree_view)
+        controls.addWidget(self.tree_toggle)
+        self.summary_toggle = QCheckBox("Summary")
+        self.summary_toggle.toggled.connect(self.set_summary_visible)
+        controls.addWidget(self.summary_toggle)
+        layout.addLayout(controls)
+
+        # תהליכים כבדים ועצי השירותים הכבדים, מחושבים בערימה ולא במיון מלא; רק כשהסיכום מוצג
+        self.summary = QLabel()
+        self.summary.setWordWrap(True)
+        self.summary.hide()
+        layout.addWidget(self.summary)
         
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["PID", "Name", "CPU %", "Memory %"])
-        self.tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.model = ProcessTableModel(self)
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSortingEnabled(True)
+        self.view.sortByColumn(2, Qt.DescendingOrder)
+        self.view.setSelectionBehavior(QTableView.SelectRows)
+        self.view.verticalHeader().hide()
+        self.view.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.view.customContextMenuRequested.connect(self.show_context_menu)
+
+        # עץ הורה/ילד מתוך הניתוח; רק השורות שעל המסך נקראות, והמיון נעשה בפייתון פעם אחת לכל סריקה
+        self.tree_model = ProcessTreeModel(self)
+        self.tree = QTreeView()
+        self.tree.setModel(self.tree_model)
+        # Every row has the same height, so the view lays rows out without measuring each one
+        self.tree.setUniformRowHeights(True)
+        # Shown once a scan turns out to carry per-process I/O counters
+        self.tree.setColumnHidden(ProcessTreeModel.IO_COLUMN, True)
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.tree.header().setStretchLastSection(False)
+        self.tree.setSortingEnabled(True)
+        self.tree.sortByColumn(5, Qt.DescendingOrder)
         self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree.customContextMenuRequested.connect(self.show_context_menu)
-        layout.addWidget(self.tree)
+        self.tree.customContextMenuRequested.connect(self.show_tree_context_menu)
 
-    def update_processes(self, processes):
-        self.tree.clear()
-        for process in processes:
-            item = QTreeWidgetItem(self.tree)
-            item.setText(0, str(process['pid']))
-            item.setText(1, process['name'])
-            cpu_percent = process['cpu_percent']
-            item.setText(2, f"{cpu_percent:.2f}" if cpu_percent is not None else "N/A")
-            memory_percent = process['memory_percent']
-            item.setText(3, f"{memory_percent:.2f}" if memory_percent is not None else "N/A")
-        self.filter_processes()
+        self.views = QStackedWidget()
+        self.views.addWidget(self.view)
+        self.views.addWidget(self.tree)
+        layout.addWidget(self.views)
+        # The tree and the summary need the analytics; the flat table does not, so a scan is only
+        # analysed while one of them is shown
+        self.analytics = ProcessAnalytics()
+        self.analyzed_processes = None
+        self.io_available = False
+        # אינדקס החיפוש מתעדכן רק כשיש שאילתה, ורק לתהליכים חדשים; התוצאה נשמרת עד שהסריקה או השאילתה משתנות
+        self.search_index = ProcessSearchIndex()
+        self.indexed_processes = None
+        self.query = ''
+        self.shown_processes = None
+        self.shown_timestamp = None
+
+    def update_processes(self, processes, timestamp=None):
+        # The collector hands back the same table object until the next process scan
+        if processes is self.shown_processes:
+            return
+        self.shown_processes = processes
+        self.shown_timestamp = timestamp if timestamp is not None else time.time()
+        if self.summary_toggle.isChecked():
+            self.update_summary()
+        if self.tree_toggle.isChecked():
+            self.update_tree()
+        else:
+            self.update_table(processes)
+
+    def refresh_analytics(self):
+        if self.analyzed_processes is not self.shown_processes:
+            self.analytics.update(self.shown_processes, self.shown_timestamp)
+            self.analyzed_processes = self.shown_processes
+            # Scanners that do not read per-process I/O leave the column at 0
+            io_available = any(self.analytics.table.io)
+            if io_available != self.io_available:
+                self.io_available = io_available
+                self.tree.setColumnHidden(ProcessTreeModel.IO_COLUMN, not io_available)
+
+    def update_table(self, processes):
+        self.model.update_processes(processes, self.matching_rows())
+        # Once per refresh, after all inserts, removals and changes
+        self.model.reorder()
+
+    def update_summary(self):
+        self.refresh_analytics()
+        analytics = self.analytics
+        parts = []
+        for metric, label, fmt in (('cpu', "CPU", "{:.1f}%"), ('memory', "Memory", "{:.1f}%"),
+                                   ('io_rate', "I/O", "{:.0f} KB/s"), ('threads', "Threads", "{:.0f}")):
+            if metric == 'io_rate' and not self.io_available:
+                continue
+            top = analytics.top_processes(metric, 3)
+            if metric == 'io_rate':
+                top = [(pid, name, value / 1024) for pid, name, value in top]
+            parts.append(f"Top {label}: " + ", ".join(f"{name} ({pid}) {fmt.format(value)}"
+                                                        for pid, name, value in top))
+        trees = analytics.service_trees('cpu', 3)
+        parts.append("Heaviest trees: " + ", ".join(f"{name} ({pid}) {value:.1f}% CPU in {count} processes"
+                                                   for pid, name, value, count in trees))
+        self.summary.setText("\n".join(parts))
+
+    def set_tree_view(self, enabled):
+        self.views.setCurrentIndex(1 if enabled else 0)
+        if self.shown_processes is None:
+            return
+        # התצוגה שהוסתרה לא עודכנה; מסנכרנים אותה עכשיו
+        if enabled:
+            self.update_tree()
+        else:
+            self.update_table(self.shown_processes)
+
+    def set_summary_visible(self, enabled):
+        self.summary.setVisible(enabled)
+        if enabled and self.shown_processes is not None:
+            self.update_summary()
+
+    def update_tree(self):
+        self.refresh_analytics()
+        first_build = self.tree_model.source is None
+        self.tree_model.refresh(self.analytics, self.visible_pids())
+        if first_build:
+            self.tree.expandToDepth(0)
 
     def filter_processes(self):
-        search_text = self.search_input.text().lower()
-        for i in range(self.tree.topLevelItemCount()):
-            item = self.tree.topLevelItem(i)
-            item.setHidden(search_text not in item.text(1).lower())
+        self.search_timer.stop()
+        text = self.search_input.text().strip()
+        try:
+            parse_query(text)
+        except ValueError as e:
+            # The last valid query stays applied while the text is being fixed
+            self.search_input.setStyleSheet("border: 1px solid #F44336;")
+            self.search_input.setToolTip(str(e))
+            return
+        self.search_input.setStyleSheet("")
+        self.search_input.setToolTip(self.SEARCH_HELP)
+        if text == self.query:
+            return
+        self.query = text
+        if self.shown_processes is None:
+            return
+        if self.tree_toggle.isChecked():
+            self.update_tree()
+        else:
+            self.update_table(self.shown_processes)
+
+    def refresh_index(self):
+        # Without a query the index would only be kept up to date for nothing
+        if self.indexed_processes is not self.shown_processes:
+            self.search_index.update(self.shown_processes)
+            self.indexed_processes = self.shown_processes
+
+    def matching_rows(self):
+        if not self.query:
+            return None
+        self.refresh_index()
+        return self.search_index.search(self.query)
+
+    def visible_pids(self):
+        # Matches stay visible together with their ancestors
+        if not self.query:
+            return None
+        parent = self.analytics.parent
+        visible = set()
+        self.refresh_index()
+        for pid in self.search_index.search_pids(self.query):
+            while pid and pid not in visible:
+                visible.add(pid)
+                pid = parent.get(pid, 0)
+        return visible
+
+    def set_live(self, live):
+        # Command lines can only be read for processes of this machine
+        self.search_index.read_cmdline = live
+        self.search_index.clear()
 
     def show_context_menu(self, position):
-        item = self.tree.itemAt(position)
-        if item is not None:
-            menu = QMenu()
-            kill_action = QAction("Kill Process", self)
-            kill_action.triggered.connect(lambda: self.kill_process(item.text(0)))
-            menu.addAction(kill_action)
-            menu.exec_(self.tree.viewport().mapToGlobal(position))
+        index = self.view.indexAt(position)
+        if index.isValid():
+            pid = self.model.pids[index.row()]
+            self.show_kill_menu(pid, self.view.viewport().mapToGlobal(position))
+
+    def show_tree_context_menu(self, position):
+        pid = self.tree_model.pid(self.tree.indexAt(position))
+        if pid is not None:
+            self.show_kill_menu(pid, self.tree.viewport().mapToGlobal(position))
+
+    def show_kill_menu(self, pid, position):
+        menu = QMenu()
+        kill_action = QAction("Kill Process", self)
+        kill_action.triggered.connect(lambda: self.kill_process(str(pid)))
+        menu.addAction(kill_action)
+        menu.exec_(position)
 
     def kill_process(self, pid):
         # Implement process killing logic here
         print(f"Killing process with PID: {pid}")
 
+class ContainersWidget(QWidget):
+    HEADERS = ["Cgroup", "CPU %", "Memory MB", "Read KB/s", "Write KB/s", "Processes"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        self.status = QLabel("No cgroup v2 hierarchy found")
+        layout.addWidget(self.status)
+
+        # עץ ה-cgroups לפי הנתיב, עם סכומים מקבצי cgroup v2 עצמם
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(self.HEADERS)
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.tree.header().setStretchLastSection(False)
+        self.tree.setSortingEnabled(True)
+        self.tree.sortByColumn(1, Qt.DescendingOrder)
+        self.tree.itemSelectionChanged.connect(self.show_members)
+
+        # התהליכים של ה-cgroup הנבחר
+        self.members = QTreeWidget()
+        self.members.setHeaderLabels(["PID", "Name", "CPU %", "Memory %"])
+        self.members.header().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.members.setSortingEnabled(True)
+        self.members.sortByColumn(2, Qt.DescendingOrder)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.tree)
+        splitter.addWidget(self.members)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+        layout.addWidget(splitter)
+        self.items = {}
+        self.values = {}
+        self.cgroups = {}
+        self.processes = None
+
+    def update_cgroups(self, cgroups, processes=None):
+        self.status.setVisible(not cgroups)
+        self.cgroups = cgroups or {}
+        self.processes = processes
+        items = self.items
+        # Sorting after every setData would re-sort the whole tree; it is done once at the end
+        self.tree.setSortingEnabled(False)
+        for path in [path for path in items if path not in self.cgroups]:
+            item = items.pop(path)
+            self.values.pop(path)
+            owner = item.parent()
+            if owner is not None:
+                owner.removeChild(item)
+            elif item.treeWidget() is not None:
+                self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+        # Parents come before their children
+        for path, cgroup in self.cgroups.items():
+            item = items.get(path)
+            if item is None:
+                item = items[path] = QTreeWidgetItem()
+                item.setText(0, short_name(path))
+                item.setToolTip(0, path)
+                item.setData(0, Qt.UserRole, path)
+                for column in range(1, len(self.HEADERS)):
+                    item.setTextAlignment(column, Qt.AlignRight | Qt.AlignVCenter)
+                parent_item = items.get(path.rpartition('/')[0])
+                if parent_item is None:
+                    self.tree.addTopLevelItem(item)
+                else:
+                    parent_item.addChild(item)
+            shown = (round(cgroup['cpu_percent'], 1), round(cgroup['memory'] / 1024**2, 1),
+                     round(cgroup['read_rate'] / 1024, 1), round(cgroup['write_rate'] / 1024, 1),
+                     cgroup['processes'])
+            if shown != self.values.get(path):
+                self.values[path] = shown
+                for column, value in enumerate(shown, 1):
+                    item.setData(column, Qt.DisplayRole, value)
+        self.tree.setSortingEnabled(True)
+        self.show_members()
+
+    def show_members(self):
+        self.members.clear()
+        selected = self.tree.selectedItems()
+        processes = self.processes
+        if not selected or processes is None:
+            return
+        pids = self.cgroups.get(selected[0].data(0, Qt.UserRole), {}).get('pids', ())
+        if not pids:
+            return
+        wanted = set(pids)
+        self.members.setSortingEnabled(False)
+        for process in processes:
+            if process['pid'] in wanted:
+                item = QTreeWidgetItem(self.members)
+                item.setData(0, Qt.DisplayRole, process['pid'])
+                item.setText(1, process['name'])
+                item.setData(2, Qt.DisplayRole, round(process['cpu_percent'] or 0.0, 1))
+                item.setData(3, Qt.DisplayRole, round(process['memory_percent'] or 0.0, 2))
+        self.members.setSortingEnabled(True)
+
 class CPUCoreWidget(QWidget):
     def __init__(self, core_count, parent=None):
         super().__init__(parent)
@@ -163,9 +1050,17 @@ class CPUCoreWidget(QWidget):
             self.core_charts.append(chart)
             layout.addWidget(chart, i // 2, i % 2)
 
+    def push_cores(self, core_usages):
+        for chart, usage in zip(self.core_charts, core_usages):
+            chart.push(usage)
+
+    def render(self):
+        for chart in self.core_charts:
+            chart.render()
+
     def update_cores(self, core_usages):
-        for i, usage in enumerate(core_usages):
-            self.core_charts[i].update_chart(usage)
+        self.push_cores(core_usages)
+        self.render()
 
 class RAMWidget(QWidget):
     def __init__(self, parent=None):
@@ -193,8 +1088,18 @@ class RAMWidget(QWidget):
         layout.addWidget(self.ram_details)
 
     def update_ram(self, ram_info):
-        self.ram_chart.update_chart(ram_info['percent'])
-        
+        self.push_ram(ram_info)
+        self.refresh(ram_info)
+
+    def push_ram(self, ram_info):
+        if ram_info:
+            self.ram_chart.push(ram_info['percent'])
+
+    def refresh(self, ram_info):
+        self.ram_chart.render()
+        if not ram_info:
+            return
+
         # Update pie chart
         self.pie_series.clear()
         self.pie_series.append("Used", ram_info['used'])
@@ -213,7 +1118,7 @@ class RAMWidget(QWidget):
                 item.setText(1, str(value))
 
 class SettingsDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, follows_bus=False):
         super().__init__(parent)
         self.setWindowTitle("Settings")
         layout = QFormLayout(self)
@@ -222,6 +1127,17 @@ class SettingsDialog(QDialog):
         self.update_interval.addItems(["1 second", "5 seconds", "10 seconds", "30 seconds"])
         layout.addRow("Update Interval:", self.update_interval)
         
+        self.adaptive = QCheckBox("Sample faster during spikes, slower when idle or hidden")
+        layout.addRow("Adaptive Interval:", self.adaptive)
+        if follows_bus:
+            # The collector daemon samples; this window only shows what it publishes
+            self.update_interval.setEnabled(False)
+            self.adaptive.setEnabled(False)
+            note = QLabel("Snapshots come from the collector daemon over the shared-memory bus.\n"
+                          "Set its rate with daemon.py --interval.")
+            note.setStyleSheet("color: #757575;")
+            layout.addRow(note)
+
         self.theme = QComboBox()
         self.theme.addItems(["Dark", "Light"])
         layout.addRow("Theme:", self.theme)
@@ -273,13 +1189,277 @@ class DashboardWidget(QWidget):
         layout.addWidget(self.network_sent_widget, 2, 0)
         layout.addWidget(self.network_received_widget, 2, 1)
 
+        self.cpu_stat = self.cpu_widget.findChild(StatWidget)
+        self.ram_stat = self.ram_widget.findChild(StatWidget)
+        self.disk_stat = self.disk_widget.findChild(StatWidget)
+        self.cpu_temp_stat = self.cpu_temp_widget.findChild(StatWidget)
+        self.network_sent_stat = self.network_sent_widget.findChild(StatWidget)
+        self.network_received_stat = self.network_received_widget.findChild(StatWidget)
+
     def update_stats(self, stats):
-        self.cpu_widget.findChild(StatWidget).update_value(stats['CPU Usage (%)'])
-        self.ram_widget.findChild(StatWidget).update_value(stats['RAM Usage (%)'])
-        self.disk_widget.findChild(StatWidget).update_value(stats['Disk Usage (%)'])
-        self.cpu_temp_widget.findChild(StatWidget).update_value(stats.get('CPU Temperature (°C)', 'N/A'))
-        self.network_sent_widget.findChild(StatWidget).update_value(stats['Network Sent (MB)'])
-        self.network_received_widget.findChild(StatWidget).update_value(stats['Network Received (MB)'])
+        self.cpu_stat.update_value(stats['CPU Usage (%)'])
+        self.ram_stat.update_value(stats['RAM Usage (%)'])
+        self.cpu_temp_stat.update_value(stats.get('CPU Temperature (°C)', 'N/A'))
+        self.network_sent_stat.update_value(stats['Network Sent (MB)'])
+        self.network_received_stat.update_value(stats['Network Received (MB)'])
+
+    def update_disk(self, stats):
+        # The disk section is shown on the Disk tab
+        self.disk_stat.update_value(stats['Disk Usage (%)'])
+
+class HostDashboard(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        self.dashboard = DashboardWidget()
+        self.cpu_chart = ModernChartWidget("CPU Usage Over Time", capacity=3600)
+        self.ram_chart = ModernChartWidget("RAM Usage Over Time", capacity=3600)
+        self.process_tree = ProcessTreeWidget()
+        charts = QHBoxLayout()
+        charts.addWidget(self.cpu_chart)
+        charts.addWidget(self.ram_chart)
+        layout.addWidget(self.dashboard)
+        layout.addLayout(charts)
+        layout.addWidget(self.process_tree)
+
+    def update_stats(self, stats):
+        self.dashboard.update_stats(stats)
+        self.dashboard.update_disk(stats)
+        self.cpu_chart.update_chart(stats['CPU Usage (%)'])
+        self.ram_chart.update_chart(stats['RAM Usage (%)'])
+        self.process_tree.update_processes(stats['processes'], stats.get('timestamp'))
+
+class HostsWidget(QWidget):
+    # Host list from the aggregator's summaries; only the selected host streams full snapshots
+    host_selected = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        splitter = QSplitter(Qt.Horizontal)
+        self.host_list = QTreeWidget()
+        self.host_list.setHeaderLabels(["Host", "Address", "Cores", "CPU %", "RAM %", "Status"])
+        self.host_list.setRootIsDecorated(False)
+        self.host_list.setSortingEnabled(True)
+        self.host_list.currentItemChanged.connect(self.select_host)
+        self.dashboards = QStackedWidget()
+        self.placeholder = QLabel("Connect to an aggregator from the File menu, then pick a host")
+        self.placeholder.setAlignment(Qt.AlignCenter)
+        self.dashboards.addWidget(self.placeholder)
+        splitter.addWidget(self.host_list)
+        splitter.addWidget(self.dashboards)
+        splitter.setStretchFactor(1, 3)
+        layout.addWidget(splitter)
+        self.items = {}
+        self.host_dashboards = {}
+        self.selected_host = None
+
+    def update_hosts(self, hosts):
+        for host in hosts:
+            item = self.items.get(host['host'])
+            if item is None:
+                item = self.items[host['host']] = QTreeWidgetItem(self.host_list)
+                item.setText(0, host['host'])
+            item.setText(1, host['address'])
+            item.setText(2, str(host['cores'] or ''))
+            item.setText(3, f"{host['cpu']:.1f}" if host['cpu'] is not None else '')
+            item.setText(4, f"{host['ram']:.1f}" if host['ram'] is not None else '')
+            item.setText(5, "Online" if host['connected'] else "Offline")
+
+    def select_host(self, item, previous=None):
+        if item is None:
+            return
+        self.selected_host = item.text(0)
+        dashboard = self.host_dashboards.get(self.selected_host)
+        if dashboard is None:
+            dashboard = self.host_dashboards[self.selected_host] = HostDashboard()
+            self.dashboards.addWidget(dashboard)
+        self.dashboards.setCurrentWidget(dashboard)
+        self.host_selected.emit(self.selected_host)
+
+    def update_host_stats(self, host, stats):
+        dashboard = self.host_dashboards.get(host)
+        if dashboard is not None:
+            dashboard.update_stats(stats)
+
+class OverheadWidget(QWidget):
+    # The monitor's own cost: smoothed, last and worst time per phase, plus its RSS and CPU
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        self.summary = QLabel()
+        self.summary.setFont(QFont("Arial", 12))
+        layout.addWidget(self.summary)
+        self.phase_list = QTreeWidget()
+        self.phase_list.setHeaderLabels(["Phase", "Average (ms)", "Last (ms)", "Max (ms)", "Runs", "Total (s)"])
+        self.phase_list.setRootIsDecorated(False)
+        self.phase_list.setSortingEnabled(True)
+        self.phase_list.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.phase_list)
+        self.items = {}
+
+    def refresh(self):
+        # Under python -O the timers are compiled out, so there is nothing to show either
+        if not __debug__ or not instruments.enabled:
+            self.summary.setText("Instrumentation is disabled (SYSTEM_MONITOR_INSTRUMENT=0 or python -O)")
+            return
+        counters = ", ".join(f"{name.replace('_', ' ')}: {value}" for name, value in list(instruments.counters.items()))
+        self.summary.setText(f"Monitor CPU: {instruments.cpu_percent:.1f}%   RSS: {instruments.rss / 1024**2:.1f} MB"
+                             + (f"   {counters}" if counters else ""))
+        for phase, stats in list(instruments.phases.items()):
+            item = self.items.get(phase)
+            if item is None:
+                item = self.items[phase] = QTreeWidgetItem(self.phase_list)
+                item.setText(0, phase)
+            item.setText(1, f"{stats.average * 1000:.3f}")
+            item.setText(2, f"{stats.last * 1000:.3f}")
+            item.setText(3, f"{stats.maximum * 1000:.3f}")
+            item.setText(4, str(stats.count))
+            item.setText(5, f"{stats.total:.2f}")
+
+class AnomaliesWidget(QWidget):
+    # Series the anomaly detector currently flags, and the latest raised and resolved events
+    MAX_EVENTS = 200
+
+    def __init__(self, detector, parent=None):
+        super().__init__(parent)
+        self.detector = detector
+        layout = QVBoxLayout(self)
+        self.summary = QLabel()
+        self.summary.setFont(QFont("Arial", 12))
+        layout.addWidget(self.summary)
+        self.active_list = QTreeWidget()
+        self.active_list.setHeaderLabels(["Series", "Kind", "Value", "Typical", "Score / slope", "Since"])
+        self.active_list.setRootIsDecorated(False)
+        self.active_list.setSortingEnabled(True)
+        self.active_list.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.active_list)
+        layout.addWidget(QLabel("Recent events"))
+        self.event_list = QTreeWidget()
+        self.event_list.setHeaderLabels(["Time", "Event", "Details"])
+        self.event_list.setRootIsDecorated(False)
+        self.event_list.header().setSectionResizeMode(2, QHeaderView.Stretch)
+        layout.addWidget(self.event_list)
+        self.events = []
+
+    def record(self, events):
+        # Called every tick, also while the tab is hidden; newest first, at most MAX_EVENTS kept
+        for anomaly in events:
+            self.events.insert(0, (time.strftime('%H:%M:%S'), anomaly.title, anomaly.message))
+        del self.events[self.MAX_EVENTS:]
+
+    def refresh(self):
+        active = list(self.detector.active.values())
+        self.summary.setText(f"Following {len(self.detector)} series, {len(active)} flagged")
+        self.active_list.setSortingEnabled(False)
+        self.active_list.clear()
+        for anomaly in active:
+            item = QTreeWidgetItem(self.active_list)
+            item.setText(0, anomaly.series)
+            item.setText(1, anomaly.kind)
+            item.setData(2, Qt.DisplayRole, round(anomaly.value, 2))
+            item.setData(3, Qt.DisplayRole, round(anomaly.expected, 2))
+            item.setData(4, Qt.DisplayRole, round(anomaly.score, 3))
+            item.setText(5, time.strftime('%H:%M:%S', time.localtime(anomaly.since)))
+        self.active_list.setSortingEnabled(True)
+        if self.event_list.topLevelItemCount() != len(self.events) or self.events and \
+                self.event_list.topLevelItem(0).text(2) != self.events[0][2]:
+            self.event_list.clear()
+            for event in self.events:
+                QTreeWidgetItem(self.event_list, list(event))
+
+class ReplayControls(QFrame):
+    # Transport bar shown above the tabs while a recording is replayed
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setStyleSheet("QFrame { background-color: #E3F2FD; border-radius: 5px; }")
+        layout = QHBoxLayout(self)
+        self.file_label = QLabel()
+        self.file_label.setStyleSheet("color: #2196F3; font-weight: bold;")
+        layout.addWidget(self.file_label)
+        self.play_button = QPushButton("▶ Play")
+        self.play_button.setCheckable(True)
+        layout.addWidget(self.play_button)
+        self.slider = QSlider(Qt.Horizontal)
+        layout.addWidget(self.slider, 1)
+        self.time_label = QLabel()
+        layout.addWidget(self.time_label)
+        self.speed = QComboBox()
+        self.speed.addItems([f"{speed}x" for speed in REPLAY_SPEEDS])
+        layout.addWidget(self.speed)
+        self.live_button = QPushButton("Back to Live")
+        layout.addWidget(self.live_button)
+        self.recording = None
+
+    def set_recording(self, recording):
+        self.recording = recording
+        host = recording.metadata.get('host')
+        name = os.path.basename(recording.path)
+        self.file_label.setText(f"⏺ {name} ({host})" if host else f"⏺ {name}")
+        self.slider.blockSignals(True)
+        self.slider.setRange(0, len(recording) - 1)
+        self.slider.setValue(0)
+        self.slider.blockSignals(False)
+        self.show_playing(False)
+        self.speed.setCurrentIndex(0)
+
+    def show_position(self, frame):
+        # Moved by the replay, not by the user, so no seek is sent back
+        self.slider.blockSignals(True)
+        self.slider.setValue(frame)
+        self.slider.blockSignals(False)
+        recording = self.recording
+        elapsed = recording.timestamps[frame] - recording.start
+        self.time_label.setText(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording.timestamps[frame]))} "
+            f"(+{int(elapsed // 60)}:{int(elapsed % 60):02d}, {frame + 1}/{len(recording)})")
+
+    def show_playing(self, playing):
+        self.play_button.blockSignals(True)
+        self.play_button.setChecked(playing)
+        self.play_button.setText("⏸ Pause" if playing else "▶ Play")
+        self.play_button.blockSignals(False)
+
+class UpdateDispatcher:
+    # Routes each snapshot only to widgets that are on screen. Hidden targets get the cheap
+    # `buffer` call instead and catch up once, with the latest snapshot, when they are shown.
+    def __init__(self, window):
+        self.window = window
+        self.targets = []
+
+    def register(self, widget, update, buffer=None, catch_up=None, name=None):
+        self.targets.append({'widget': widget, 'update': update, 'buffer': buffer,
+                             'catch_up': catch_up or update, 'pending': None,
+                             'phase': f"widget.{name or type(widget).__name__}"})
+
+    def paused(self):
+        return self.window.isMinimized() or not self.window.isVisible()
+
+    def dispatch(self, stats):
+        paused = self.paused()
+        for target in self.targets:
+            if not paused and target['widget'].isVisible():
+                if __debug__:
+                    if instruments.enabled:
+                        started = time.perf_counter()
+                        target['update'](stats)
+                        instruments.record(target['phase'], time.perf_counter() - started)
+                        target['pending'] = None
+                        continue
+                target['update'](stats)
+                target['pending'] = None
+            else:
+                if target['buffer'] is not None:
+                    target['buffer'](stats)
+                target['pending'] = stats
+
+    def flush(self):
+        if self.paused():
+            return
+        for target in self.targets:
+            if target['pending'] is not None and target['widget'].isVisible():
+                target['catch_up'](target['pending'])
+                target['pending'] = None
 
 class SystemMonitorGUI(QMainWindow):
     def __init__(self):
@@ -288,6 +1468,23 @@ class SystemMonitorGUI(QMainWindow):
         self.setGeometry(100, 100, 1400, 900)
         self.setup_modern_theme()
 
+        # היסטוריה של שעה במערכים בגודל קבוע, ושכבות מסוכמות לטווחים ארוכים
+        self.history = HistoryStore(SCALAR_KEYS, capacity=3600)
+        self.rollup = Rollup(self.history)
+        # קובץ היסטוריה של daemon.py, אם נפתח
+        self.history_file = None
+        # כללי התראה מ-alerts.json, או ברירת המחדל
+        self.alert_engine = AlertEngine(load_rules())
+        # זיהוי חריגות סטטיסטי לכל הסדרות, בנוסף לספים הקבועים
+        self.anomaly_detector = AnomalyDetector()
+        self.metrics_exporter = MetricsExporter()
+        self.metrics_exporter.add_source(instruments.render_metrics)
+        self.metrics_exporter.add_source(render_cgroup_metrics)
+        self.metrics_server = None
+        # הקלטת המפגש הנוכחי, והשמעה של הקלטה במקום הנתונים החיים
+        self.recorder = None
+        self.replay = None
+
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
@@ -314,6 +1511,14 @@ class SystemMonitorGUI(QMainWindow):
                 color: white;
             }
         """)
+        self.replay_controls = ReplayControls()
+        self.replay_controls.hide()
+        self.replay_controls.play_button.toggled.connect(self.play_replay)
+        self.replay_controls.slider.valueChanged.connect(self.seek_replay)
+        self.replay_controls.speed.currentIndexChanged.connect(
+            lambda index: self.replay is not None and self.replay.set_speed(REPLAY_SPEEDS[index]))
+        self.replay_controls.live_button.clicked.connect(self.stop_replay)
+        main_layout.addWidget(self.replay_controls)
         main_layout.addWidget(self.main_area)
 
         # יצירת לשוניות באזור התצוגה הראשי
@@ -332,12 +1537,15 @@ class SystemMonitorGUI(QMainWindow):
         self.tray_icon = QSystemTrayIcon(self)
         self.tray_icon.setIcon(QIcon("icon.png"))  # Replace with your icon
         self.tray_icon.setVisible(True)
+        self.tray_icon.activated.connect(self.toggle_from_tray)
 
         self.update_thread = UpdateThread()
         self.update_thread.update_signal.connect(self.update_stats)
         self.update_thread.start()
 
-        self.stats_history = []
+        self.remote_thread = None
+        if os.environ.get('SYSTEM_MONITOR_AGGREGATOR'):
+            self.connect_aggregator(os.environ['SYSTEM_MONITOR_AGGREGATOR'])
 
         debugger.log("GUI initialized", level='info')
 
@@ -375,10 +1583,15 @@ class SystemMonitorGUI(QMainWindow):
         # לשונית גרפים
         charts_tab = QWidget()
         charts_layout = QVBoxLayout(charts_tab)
-        self.cpu_chart = ModernChartWidget("CPU Usage Over Time")
-        self.ram_chart = ModernChartWidget("RAM Usage Over Time")
-        self.network_chart = ModernChartWidget("Network Usage Over Time")
-        self.disk_io_chart = ModernChartWidget("Disk I/O Over Time")
+        # שעה של דגימות בגרף עצמו, טווחים ארוכים יותר מהשכבות המסוכמות; קליק ימני לבחירת חלון הזמן
+        self.cpu_chart = ModernChartWidget("CPU Usage Over Time", capacity=3600)
+        self.ram_chart = ModernChartWidget("RAM Usage Over Time", capacity=3600)
+        self.network_chart = ModernChartWidget("Network Usage Over Time (MB/s)", capacity=3600, auto_range=True)
+        self.disk_io_chart = ModernChartWidget("Disk I/O Over Time (MB/s)", capacity=3600, auto_range=True)
+        self.cpu_chart.set_source(self.rollup, 'CPU Usage (%)')
+        self.ram_chart.set_source(self.rollup, 'RAM Usage (%)')
+        self.network_chart.set_source(self.rollup, 'Network Sent (MB/s)', 'Network Received (MB/s)')
+        self.disk_io_chart.set_source(self.rollup, 'Disk Read (MB/s)', 'Disk Write (MB/s)')
         charts_layout.addWidget(self.cpu_chart)
         charts_layout.addWidget(self.ram_chart)
         charts_layout.addWidget(self.network_chart)
@@ -389,19 +1602,87 @@ class SystemMonitorGUI(QMainWindow):
         self.process_tree = ProcessTreeWidget()
         self.main_area.addTab(self.process_tree, "🔍 Processes")
 
-        # לשונית ליבות מעבד
-        cpu_cores_tab = CPUCoreWidget(psutil.cpu_count())
-        self.main_area.addTab(cpu_cores_tab, "💻 CPU Cores")
+        # לשונית קונטיינרים ו-cgroups
+        self.containers_tab = ContainersWidget()
+        self.main_area.addTab(self.containers_tab, "📦 Containers")
+
+        # לשונית ליבות מעבד; במחשבים עם הרבה ליבות מפת חום אחת במקום גרף לכל ליבה
+        core_count = psutil.cpu_count()
+        if core_count > HEATMAP_CORE_THRESHOLD:
+            self.cpu_cores_tab = CoreHeatmapWidget(core_count)
+        else:
+            self.cpu_cores_tab = CPUCoreWidget(core_count)
+        self.main_area.addTab(self.cpu_cores_tab, "💻 CPU Cores")
 
         # לשונית פרטי זיכרון RAM
-        ram_tab = RAMWidget()
-        self.main_area.addTab(ram_tab, "🧠 RAM Details")
+        self.ram_tab = RAMWidget()
+        self.main_area.addTab(self.ram_tab, "🧠 RAM Details")
 
         # לשונית דיסק
-        disk_tab = QWidget()
-        disk_layout = QVBoxLayout(disk_tab)
+        self.disk_tab = QWidget()
+        disk_layout = QVBoxLayout(self.disk_tab)
         disk_layout.addWidget(self.dashboard.disk_widget)
-        self.main_area.addTab(disk_tab, "💾 Disk")
+        # קצב לכל דיסק בנפרד, בלי מחיצות שכבר נספרות בדיסק שלהן ובלי התקני loop
+        self.disk_devices_chart = DeviceRatesWidget(
+            "Disk I/O per Device", include=lambda name: not is_partition(name) and not name.startswith(('loop', 'ram')))
+        disk_layout.addWidget(self.disk_devices_chart)
+        self.main_area.addTab(self.disk_tab, "💾 Disk")
+
+        # לשונית רשת: קצב לכל ממשק
+        self.network_tab = DeviceRatesWidget("Network Traffic per Interface")
+        self.main_area.addTab(self.network_tab, "📡 Network")
+
+        # לשונית שרתים מרוחקים דרך האגרגטור
+        self.hosts_tab = HostsWidget()
+        self.main_area.addTab(self.hosts_tab, "🌐 Hosts")
+        self.hosts_tab.host_selected.connect(self.subscribe_host)
+
+        # לשונית העלות של המנטר עצמו
+        self.overhead_tab = OverheadWidget()
+        self.main_area.addTab(self.overhead_tab, "⏱ Monitor Overhead")
+
+        # לשונית חריגות
+        self.anomalies_tab = AnomaliesWidget(self.anomaly_detector)
+        self.main_area.addTab(self.anomalies_tab, "⚠ Anomalies")
+
+        self.register_updates()
+        self.main_area.currentChanged.connect(self.dispatcher.flush)
+
+    def register_updates(self):
+        # עדכון רק של לשוניות גלויות; גרפים מוסתרים רק צוברים נתונים
+        self.dispatcher = UpdateDispatcher(self)
+        self.dispatcher.register(self.dashboard, self.dashboard.update_stats)
+        self.dispatcher.register(self.disk_tab, self.dashboard.update_disk)
+        for chart, key in ((self.disk_devices_chart, 'Disk Device Rates'), (self.network_tab, 'Network Interface Rates')):
+            self.dispatcher.register(chart,
+                                     lambda stats, chart=chart, key=key: chart.update_rates(stats.get(key)),
+                                     buffer=lambda stats, chart=chart, key=key: chart.push(stats.get(key)),
+                                     catch_up=lambda stats, chart=chart: chart.render(),
+                                     name=chart.chart.title())
+        chart_values = (
+            (self.cpu_chart, lambda stats: stats['CPU Usage (%)']),
+            (self.ram_chart, lambda stats: stats['RAM Usage (%)']),
+            (self.network_chart, lambda stats: stats['Network Sent (MB/s)'] + stats['Network Received (MB/s)']),
+            (self.disk_io_chart, lambda stats: stats['Disk Read (MB/s)'] + stats['Disk Write (MB/s)']),
+        )
+        for chart, value in chart_values:
+            self.dispatcher.register(chart,
+                                     lambda stats, chart=chart, value=value: chart.update_chart(value(stats)),
+                                     buffer=lambda stats, chart=chart, value=value: chart.push(value(stats)),
+                                     catch_up=lambda stats, chart=chart: chart.render(),
+                                     name=chart.chart.title())
+        self.dispatcher.register(self.process_tree,
+                                 lambda stats: self.process_tree.update_processes(stats['processes'], stats.get('timestamp')))
+        self.dispatcher.register(self.containers_tab,
+                                 lambda stats: self.containers_tab.update_cgroups(stats.get('Cgroups'), stats.get('processes')))
+        self.dispatcher.register(self.cpu_cores_tab, lambda stats: self.cpu_cores_tab.update_cores(stats['CPU Core Usage']),
+                                 buffer=lambda stats: self.cpu_cores_tab.push_cores(stats['CPU Core Usage']),
+                                 catch_up=lambda stats: self.cpu_cores_tab.render())
+        self.dispatcher.register(self.ram_tab, lambda stats: self.ram_tab.update_ram(stats.get('RAM Details')),
+                                 buffer=lambda stats: self.ram_tab.push_ram(stats.get('RAM Details')),
+                                 catch_up=lambda stats: self.ram_tab.refresh(stats.get('RAM Details')))
+        self.dispatcher.register(self.overhead_tab, lambda stats: self.overhead_tab.refresh())
+        self.dispatcher.register(self.anomalies_tab, lambda stats: self.anomalies_tab.refresh())
 
     def create_menu(self):
         menubar = self.menuBar()
@@ -411,6 +1692,18 @@ class SystemMonitorGUI(QMainWindow):
         export_action = QAction('Export Data', self)
         export_action.triggered.connect(self.export_data)
         file_menu.addAction(export_action)
+        open_history_action = QAction('Open History File...', self)
+        open_history_action.triggered.connect(self.open_history_file)
+        file_menu.addAction(open_history_action)
+        self.record_action = QAction('Start Recording...', self)
+        self.record_action.triggered.connect(self.toggle_recording)
+        file_menu.addAction(self.record_action)
+        open_recording_action = QAction('Open Recording...', self)
+        open_recording_action.triggered.connect(self.open_recording)
+        file_menu.addAction(open_recording_action)
+        connect_action = QAction('Connect to Aggregator...', self)
+        connect_action.triggered.connect(self.connect_aggregator)
+        file_menu.addAction(connect_action)
         
         # View Menu
         view_menu = menubar.addMenu('View')
@@ -425,30 +1718,108 @@ class SystemMonitorGUI(QMainWindow):
         settings_action = QAction('Open Settings', self)
         settings_action.triggered.connect(self.open_settings)
         settings_menu.addAction(settings_action)
+        self.metrics_action = QAction('Serve Metrics Endpoint', self, checkable=True)
+        self.metrics_action.toggled.connect(self.toggle_metrics_endpoint)
+        settings_menu.addAction(self.metrics_action)
+
+    def toggle_metrics_endpoint(self, enabled):
+        collector = self.update_thread.collector
+        if not enabled:
+            if self.metrics_server is not None:
+                collector.remove_sink(self.metrics_exporter.update)
+                self.metrics_server.stop()
+                self.metrics_server = None
+                self.statusBar().showMessage("Metrics endpoint stopped")
+            return
+        port = int(os.environ.get('SYSTEM_MONITOR_METRICS_PORT', METRICS_PORT))
+        try:
+            self.metrics_server = MetricsServer(self.metrics_exporter, port=port).start()
+        except OSError as e:
+            QMessageBox.warning(self, "Metrics Endpoint", f"Could not listen on port {port}: {str(e)}")
+            self.metrics_action.setChecked(False)
+            return
+        collector.add_sink(self.metrics_exporter.update)
+        self.statusBar().showMessage(f"Serving metrics on http://127.0.0.1:{self.metrics_server.port}/metrics")
+
+    def connect_aggregator(self, address=None):
+        if not address:
+            address, ok = QInputDialog.getText(self, "Connect to Aggregator", "Aggregator (host:port):",
+                                               text="127.0.0.1:9185")
+            if not ok or not address:
+                return
+        if self.remote_thread is not None:
+            self.remote_thread.stop()
+        self.remote_thread = RemoteViewerThread(parse_address(address), self)
+        self.remote_thread.hosts_signal.connect(self.hosts_tab.update_hosts)
+        self.remote_thread.stats_signal.connect(self.hosts_tab.update_host_stats)
+        self.remote_thread.error_signal.connect(
+            lambda error: self.statusBar().showMessage(f"Aggregator connection failed: {error}"))
+        if self.hosts_tab.selected_host is not None:
+            self.remote_thread.subscribe([self.hosts_tab.selected_host])
+        self.remote_thread.start()
+        self.main_area.setCurrentWidget(self.hosts_tab)
+
+    def subscribe_host(self, host):
+        if self.remote_thread is not None:
+            self.remote_thread.subscribe([host])
 
     def open_settings(self):
-        settings_dialog = SettingsDialog(self)
+        settings_dialog = SettingsDialog(self, follows_bus=self.update_thread.follows_bus)
+        scheduler = self.update_thread.scheduler
+        settings_dialog.update_interval.setCurrentText(
+            {1: "1 second", 5: "5 seconds", 10: "10 seconds", 30: "30 seconds"}.get(scheduler.interval, "1 second"))
+        settings_dialog.adaptive.setChecked(scheduler.adaptive)
         if settings_dialog.exec_():
             # Handle settings changes here
             update_interval = settings_dialog.update_interval.currentText()
             theme = settings_dialog.theme.currentText()
             # Apply the new settings
-            self.apply_settings(update_interval, theme)
+            self.apply_settings(update_interval, theme, settings_dialog.adaptive.isChecked())
 
-    def apply_settings(self, update_interval, theme):
-        # Apply update interval
-        interval_map = {"1 second": 1000, "5 seconds": 5000, "10 seconds": 10000, "30 seconds": 30000}
-        self.update_thread.msleep(interval_map[update_interval])
+    def apply_settings(self, update_interval, theme, adaptive=False):
+        # Apply update interval; the sampling thread picks it up at its next tick. When following the
+        # bus the collector daemon sets the rate and the scheduler is not used.
+        if not self.update_thread.follows_bus:
+            interval_map = {"1 second": 1, "5 seconds": 5, "10 seconds": 10, "30 seconds": 30}
+            self.update_thread.scheduler.set_interval(interval_map[update_interval])
+            self.update_thread.scheduler.set_adaptive(adaptive)
         
-        # Apply theme
+        # Apply theme; the interval above is already in effect whatever happens here
         if theme == "Dark":
             self.setup_dark_theme()
         else:
             self.setup_light_theme()
 
+    def setup_dark_theme(self):
+        self.setStyleSheet("""
+            QMainWindow, QWidget {
+                background-color: #212121;
+                color: #EEEEEE;
+            }
+            QLabel {
+                color: #EEEEEE;
+            }
+            QPushButton {
+                background-color: #1976D2;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-size: 14px;
+            }
+            QPushButton:hover {
+                background-color: #2196F3;
+            }
+            QLineEdit {
+                background-color: #303030;
+                border: 1px solid #616161;
+                border-radius: 4px;
+                padding: 4px;
+            }
+        """)
+
     def setup_light_theme(self):
-        # Implement light theme here
-        pass
+        self.setup_modern_theme()
 
     def create_shortcuts(self):
         for i in range(1, 5):  # Create shortcuts for the first 4 tabs
@@ -457,51 +1828,218 @@ class SystemMonitorGUI(QMainWindow):
     def update_stats(self, stats=None):
         if stats is None:
             stats = SystemMonitor.get_system_stats()
-        
-        self.dashboard.update_stats(stats)
+        if __debug__:
+            if instruments.enabled:
+                instruments.record_delivery()
+                started = time.perf_counter()
 
-        self.cpu_chart.update_chart(stats['CPU Usage (%)'])
-        self.ram_chart.update_chart(stats['RAM Usage (%)'])
-        self.network_chart.update_chart(stats['Network Sent (MB)'] + stats['Network Received (MB)'])
-        self.disk_io_chart.update_chart(stats['Disk Read (MB/s)'] + stats['Disk Write (MB/s)'])
+        # לפני העדכון של הלשוניות, כדי שלשונית החריגות תראה את האירועים של הדגימה הזאת
+        self.check_anomalies(stats)
+        # בזמן השמעה הדגימות החיות ממשיכות להיאסף, להתראות ולהיסטוריה, אבל לא מוצגות
+        if self.replay is None:
+            self.dispatcher.dispatch(stats)
 
-        self.process_tree.update_processes(stats['processes'])
+        self.rollup.append(stats)
+        if self.history_file is not None:
+            self.history_file.refresh()
 
-        cpu_cores_tab = self.main_area.widget(self.main_area.indexOf(self.main_area.findChild(CPUCoreWidget)))
-        if cpu_cores_tab:
-            cpu_cores_tab.update_cores(stats['CPU Core Usage'])
+        self.check_alerts(stats)
 
-        ram_tab = self.main_area.widget(self.main_area.indexOf(self.main_area.findChild(RAMWidget)))
-        if ram_tab:
-            ram_tab.update_ram(stats['RAM Details'])
+        status = f"Last update: {SystemMonitor.get_current_time()}"
+        if __debug__:
+            if instruments.enabled:
+                instruments.record('gui.update_stats', time.perf_counter() - started)
+                status += f" | Monitor CPU {instruments.cpu_percent:.1f}% RSS {instruments.rss / 1024**2:.0f} MB"
+        self.statusBar().showMessage(status)
+        debugger.log("Stats updated in GUI", level='debug')
 
-        self.stats_history.append(stats)
-        if len(self.stats_history) > 3600:  # שמירת היסטוריה של שעה
-            self.stats_history.pop(0)
+    def toggle_from_tray(self, reason):
+        if reason == QSystemTrayIcon.Trigger:
+            if self.isVisible() and not self.isMinimized():
+                self.hide()
+            else:
+                self.showNormal()
+                self.activateWindow()
 
-        self.check_alerts(stats)
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_thread.scheduler.set_hidden(self.dispatcher.paused())
+            self.dispatcher.flush()
 
-        self.statusBar().showMessage(f"Last update: {SystemMonitor.get_current_time()}")
-        debugger.log("Stats updated in GUI", level='debug')
+    def showEvent(self, event):
+        super().showEvent(event)
+        if hasattr(self, 'update_thread'):
+            self.update_thread.scheduler.set_hidden(False)
+        self.dispatcher.flush()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_thread.scheduler.set_hidden(True)
 
     def check_alerts(self, stats):
-        if stats['CPU Usage (%)'] > 90:
-            self.show_alert("High CPU Usage", f"CPU usage is at {stats['CPU Usage (%)']:.2f}%")
-        if stats['RAM Usage (%)'] > 90:
-            self.show_alert("High RAM Usage", f"RAM usage is at {stats['RAM Usage (%)']:.2f}%")
+        for alert in self.alert_engine.evaluate(stats):
+            if alert.resolved:
+                debugger.log("%s: %s", alert.title, alert.message, level='info')
+            else:
+                debugger.log("%s: %s", alert.title, alert.message, level='warning')
+                self.show_alert(alert.title, alert.message)
+
+    def check_anomalies(self, stats):
+        if __debug__:
+            if instruments.enabled:
+                started = time.perf_counter()
+        events = self.anomaly_detector.update(stats)
+        if __debug__:
+            if instruments.enabled:
+                instruments.record('anomaly.update', time.perf_counter() - started)
+        if not events:
+            return
+        for anomaly in events:
+            debugger.log("%s: %s", anomaly.title, anomaly.message, level='info' if anomaly.resolved else 'warning',
+                         fields={'series': anomaly.series, 'kind': anomaly.kind, 'value': anomaly.value,
+                                 'expected': anomaly.expected, 'score': anomaly.score})
+        self.anomalies_tab.record(events)
+        active = len(self.anomaly_detector.active)
+        index = self.main_area.indexOf(self.anomalies_tab)
+        self.main_area.setTabText(index, f"⚠ Anomalies ({active})" if active else "⚠ Anomalies")
 
     def show_alert(self, title, message):
         self.tray_icon.showMessage(title, message, QSystemTrayIcon.Warning)
 
+    def open_history_file(self):
+        file_name, _ = QFileDialog.getOpenFileName(self, "Open History File", "", "Time-series files (*.tsdb)")
+        if not file_name:
+            return
+        try:
+            reader = TimeSeriesReader(os.path.dirname(file_name))
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Open History File", f"Could not open {file_name}: {str(e)}")
+            return
+        if self.history_file is not None:
+            self.history_file.close()
+        self.history_file = reader
+        # Long chart windows now read straight from the memory-mapped segments
+        for chart in (self.cpu_chart, self.ram_chart, self.network_chart, self.disk_io_chart):
+            chart.set_source(reader, *chart.source[1])
+            chart.render()
+        self.statusBar().showMessage(f"History loaded: {len(reader)} samples from {os.path.dirname(file_name)}")
+
+    def toggle_recording(self):
+        collector = self.update_thread.collector
+        if self.recorder is not None:
+            collector.remove_sink(self.recorder.record)
+            self.recorder.close()
+            self.statusBar().showMessage(f"Recording saved to {self.recorder.path}")
+            self.recorder = None
+            self.record_action.setText('Start Recording...')
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Start Recording", "", "Recordings (*.xmrec)")
+        if not file_name:
+            return
+        try:
+            self.recorder = Recorder(file_name, metadata={'host': socket.gethostname()})
+        except OSError as e:
+            QMessageBox.warning(self, "Start Recording", f"Could not create {file_name}: {str(e)}")
+            return
+        collector.add_sink(self.recorder.record)
+        self.record_action.setText('Stop Recording')
+        self.statusBar().showMessage(f"Recording to {file_name}")
+
+    def open_recording(self, file_name=None):
+        if not file_name:
+            file_name, _ = QFileDialog.getOpenFileName(self, "Open Recording", "", "Recordings (*.xmrec)")
+            if not file_name:
+                return
+        try:
+            recording = Recording(file_name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Open Recording", f"Could not open {file_name}: {str(e)}")
+            return
+        if self.replay is not None:
+            self.replay.stop()
+        self.replay = ReplayThread(recording, self)
+        self.replay.update_signal.connect(self.show_replay_stats)
+        self.replay.position_signal.connect(self.replay_controls.show_position)
+        self.replay.playing_signal.connect(self.replay_controls.show_playing)
+        self.replay_controls.set_recording(recording)
+        self.replay_controls.show()
+        self.process_tree.set_live(False)
+        self.clear_charts()
+        self.replay.start()
+        self.statusBar().showMessage(f"Replaying {file_name}: {len(recording)} snapshots")
+
+    def show_replay_stats(self, stats):
+        if self.sender() is not self.replay:
+            return
+        self.dispatcher.dispatch(stats)
+        self.replay.delivered()
+
+    def play_replay(self, playing):
+        if self.replay is not None:
+            self.replay_controls.show_playing(playing)
+            slider = self.replay_controls.slider
+            if playing and slider.value() == slider.maximum():
+                slider.setValue(0)
+            self.replay.play(playing)
+
+    def seek_replay(self, frame):
+        if self.replay is not None:
+            # The charts would otherwise join the old and the new position into one line
+            self.clear_charts()
+            self.replay.seek(frame)
+
+    def stop_replay(self):
+        if self.replay is None:
+            return
+        self.replay.stop()
+        self.replay = None
+        self.replay_controls.hide()
+        self.process_tree.set_live(True)
+        self.clear_charts()
+        self.statusBar().showMessage("Back to live data")
+
+    def clear_charts(self):
+        for chart in (self.cpu_chart, self.ram_chart, self.network_chart, self.disk_io_chart,
+                      self.ram_tab.ram_chart, self.disk_devices_chart, self.network_tab):
+            chart.clear()
+
+    def closeEvent(self, event):
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.replay is not None:
+            self.replay.stop()
+        super().closeEvent(event)
+
     def export_data(self):
-        file_name, _ = QFileDialog.getSaveFileName(self, "Export Data", "", "CSV Files (*.csv)")
-        if file_name:
-            with open(file_name, 'w', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=self.stats_history[0].keys())
-                writer.writeheader()
-                for stats in self.stats_history:
-                    writer.writerow(stats)
-            QMessageBox.information(self, "Export Successful", f"Data exported to {file_name}")
+        if not len(self.history):
+            QMessageBox.information(self, "Export Data", "There is no data to export yet.")
+            return
+        ranges = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 604800, "Last 30 days": 2592000}
+        label, ok = QInputDialog.getItem(self, "Export Data", "Time range:", list(ranges), 0, False)
+        if not ok:
+            return
+        file_name, file_filter = QFileDialog.getSaveFileName(
+            self, "Export Data", "", "CSV Files (*.csv);;Columnar Files (*.xmc)")
+        if not file_name:
+            return
+
+        # העתקת הנתונים כאן, הכתיבה לקובץ ברקע
+        data = ExportData.from_history(self.rollup, ranges[label], EXPORT_POINTS)
+        self.export_thread = ExportThread(data, file_name, columnar=file_filter.startswith("Columnar"))
+        self.export_progress = QProgressDialog("Exporting data...", "Cancel", 0, 100, self)
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.canceled.connect(self.export_thread.cancel)
+        self.export_thread.progress_signal.connect(self.export_progress.setValue)
+        self.export_thread.finished_signal.connect(self.export_finished)
+        self.export_thread.start()
+
+    def export_finished(self, error):
+        self.export_progress.reset()
+        if error:
+            QMessageBox.warning(self, "Export Failed", error)
+        elif not self.export_thread.cancelled:
+            QMessageBox.information(self, "Export Successful", f"Data exported to {self.export_thread.file_name}")
 
 def run_gui():
     app = QApplication(sys.argv)
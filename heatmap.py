@@ -0,0 +1,117 @@
+from PyQt5.QtWidgets import QWidget, QToolTip
+from PyQt5.QtCore import Qt, QRect, QRectF, QPointF
+from PyQt5.QtGui import QImage, QPainter, QColor, QFont, QPen, QPolygonF
+
+SPARKLINE_HEIGHT = 80
+
+
+class CoreHeatmapWidget(QWidget):
+    # Time x core heatmap. Usage is kept as one byte per cell in a (core, sample) ring,
+    # so a tick writes one column and a repaint is a single indexed-image blit.
+    def __init__(self, core_count, window=300, parent=None):
+        super().__init__(parent)
+        self.core_count = core_count
+        self.window = window
+        self.stride = (window + 3) & ~3
+        self.pixels = bytearray(self.stride * core_count)
+        self.head = 0
+        self.size = 0
+        self.selected_core = None
+        self.color_table = [QColor.fromHsv(int(240 - 2.4 * value), 255, 230).rgb() for value in range(101)]
+        self.setMouseTracking(True)
+        self.setMinimumHeight(200)
+
+    def push_cores(self, core_usages):
+        column = self.head
+        stride = self.stride
+        pixels = self.pixels
+        for core, usage in enumerate(core_usages[:self.core_count]):
+            pixels[core * stride + column] = 0 if usage != usage else min(100, max(0, int(usage)))
+        self.head = (column + 1) % self.window
+        self.size = min(self.size + 1, self.window)
+
+    def render(self):
+        self.update()
+
+    def update_cores(self, core_usages):
+        self.push_cores(core_usages)
+        self.render()
+
+    def heatmap_rect(self):
+        rect = self.rect().adjusted(40, 5, -5, -5)
+        if self.selected_core is not None:
+            rect.setBottom(rect.bottom() - SPARKLINE_HEIGHT)
+        return rect
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#FFFFFF"))
+        rect = self.heatmap_rect()
+        if self.size and self.core_count:
+            image = QImage(self.pixels, self.window, self.core_count, self.stride, QImage.Format_Indexed8)
+            image.setColorTable(self.color_table)
+            # The ring wraps at `head`: blit the older part, then the newer part to its right
+            start = (self.head - self.size) % self.window
+            column_width = rect.width() / self.window
+            x = rect.left() + (self.window - self.size) * column_width
+            parts = [(start, min(self.size, self.window - start))]
+            if parts[0][1] < self.size:
+                parts.append((0, self.head))
+            for first, count in parts:
+                target = QRectF(x, rect.top(), count * column_width, rect.height())
+                painter.drawImage(target, image, QRectF(first, 0, count, self.core_count))
+                x += count * column_width
+
+        painter.setPen(QColor("#212121"))
+        painter.setFont(QFont("Arial", 8))
+        row_height = rect.height() / max(self.core_count, 1)
+        label_every = max(1, int(12 / row_height) + 1) if row_height else 1
+        for core in range(0, self.core_count, label_every):
+            y = int(rect.top() + core * row_height)
+            painter.drawText(QRect(0, y, 36, max(int(row_height), 12)), Qt.AlignRight | Qt.AlignVCenter, str(core))
+
+        if self.selected_core is not None:
+            self.paint_sparkline(painter, QRect(rect.left(), rect.bottom() + 10, rect.width(), SPARKLINE_HEIGHT - 15))
+
+    def core_values(self, core):
+        start = (self.head - self.size) % self.window
+        row = core * self.stride
+        return [self.pixels[row + (start + offset) % self.window] for offset in range(self.size)]
+
+    def paint_sparkline(self, painter, rect):
+        painter.setPen(QColor("#2196F3"))
+        painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, f"Core {self.selected_core}")
+        values = self.core_values(self.selected_core)
+        if len(values) < 2:
+            return
+        step = rect.width() / (self.window - 1)
+        offset = self.window - len(values)
+        points = QPolygonF([QPointF(rect.left() + (offset + i) * step, rect.bottom() - value / 100 * rect.height())
+                            for i, value in enumerate(values)])
+        painter.setPen(QPen(QColor("#2196F3"), 1.5))
+        painter.drawPolyline(points)
+
+    def cell_at(self, position):
+        rect = self.heatmap_rect()
+        if not rect.contains(position) or not self.core_count:
+            return None
+        core = int((position.y() - rect.top()) * self.core_count / rect.height())
+        column = int((position.x() - rect.left()) * self.window / rect.width())
+        age = self.window - 1 - column
+        if age >= self.size:
+            return core, None, None
+        return core, age, self.pixels[core * self.stride + (self.head - 1 - age) % self.window]
+
+    def mouseMoveEvent(self, event):
+        cell = self.cell_at(event.pos())
+        if cell is None or cell[1] is None:
+            QToolTip.hideText()
+            return
+        core, age, value = cell
+        QToolTip.showText(event.globalPos(), f"Core {core}: {value}% ({age} samples ago)", self)
+
+    def mousePressEvent(self, event):
+        cell = self.cell_at(event.pos())
+        core = cell[0] if cell is not None else None
+        self.selected_core = None if core == self.selected_core else core
+        self.update()
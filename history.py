@@ -0,0 +1,184 @@
+import time
+from array import array
+
+NAN = float('nan')
+
+
+def zeros(typecode, length):
+    return array(typecode, bytes(array(typecode).itemsize * length))
+
+
+class ProcessSnapshotStore:
+    # Each snapshot is stored as array columns; process names are interned once, and a name no
+    # retained snapshot uses any more gives its id back for the next new name
+    def __init__(self, capacity=300):
+        self.capacity = capacity
+        self.timestamps = zeros('d', capacity)
+        self._pids = [None] * capacity
+        self._cpu = [None] * capacity
+        self._memory = [None] * capacity
+        self._name_ids = [None] * capacity
+        self._name_index = {}
+        self.names = []
+        # Per name id, how many retained snapshots use it
+        self._name_refs = []
+        self._free_ids = []
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _intern(self, name):
+        name_id = self._name_index.get(name)
+        if name_id is None:
+            if self._free_ids:
+                name_id = self._free_ids.pop()
+                self.names[name_id] = name
+            else:
+                name_id = len(self.names)
+                self.names.append(name)
+                self._name_refs.append(0)
+            self._name_index[name] = name_id
+        return name_id
+
+    def append(self, timestamp, processes):
+        intern = self._intern
+        if hasattr(processes, 'pids'):
+            # ProcessTable from the scanner: copy the columns as they are
+            pids = array('i', processes.pids)
+            cpu = array('f', processes.cpu)
+            memory = array('f', processes.memory)
+            name_ids = array('I', [intern(name) for name in processes.names])
+        else:
+            pids = array('i')
+            cpu = array('f')
+            memory = array('f')
+            name_ids = array('I')
+            for process in processes:
+                pids.append(process['pid'])
+                cpu.append(process['cpu_percent'] or 0.0)
+                memory.append(process['memory_percent'] or 0.0)
+                name_ids.append(intern(process['name'] or ''))
+
+        slot = self._head
+        evicted = self._name_ids[slot] if self._size == self.capacity else None
+        self.timestamps[slot] = timestamp
+        self._pids[slot] = pids
+        self._cpu[slot] = cpu
+        self._memory[slot] = memory
+        self._name_ids[slot] = name_ids
+        self._head = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+        # Counted once per snapshot rather than per row; the new snapshot is counted before the
+        # overwritten one is let go, so a name both use stays
+        refs = self._name_refs
+        for name_id in set(name_ids):
+            refs[name_id] += 1
+        if evicted is not None:
+            names = self.names
+            for name_id in set(evicted):
+                refs[name_id] -= 1
+                if not refs[name_id]:
+                    del self._name_index[names[name_id]]
+                    names[name_id] = None
+                    self._free_ids.append(name_id)
+
+    def _slot(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('process snapshot index out of range')
+        return (self._head - self._size + index) % self.capacity
+
+    def columns(self, index=-1):
+        slot = self._slot(index)
+        return (self.timestamps[slot], self._pids[slot], self._name_ids[slot],
+                self._cpu[slot], self._memory[slot])
+
+    def snapshots(self):
+        # Stored arrays are never modified in place, so the returned references stay valid
+        return [self.columns(index) for index in range(self._size)]
+
+    def nbytes(self):
+        total = self.timestamps.itemsize * self.capacity
+        for slot in range(self.capacity):
+            if self._pids[slot] is not None:
+                total += sum(column.itemsize * len(column) for column in
+                             (self._pids[slot], self._cpu[slot], self._memory[slot], self._name_ids[slot]))
+        return total
+
+
+class HistoryStore:
+    # Fixed-size history: one preallocated column per metric. Per-core usage is not kept here; the
+    # core charts and the heatmap hold their own rings.
+    def __init__(self, keys, capacity=3600, process_capacity=300):
+        self.keys = tuple(keys)
+        self.capacity = capacity
+        self.timestamps = zeros('d', capacity)
+        self.columns = {key: zeros('d', capacity) for key in self.keys}
+        self.processes = ProcessSnapshotStore(process_capacity)
+        self._column_items = tuple(self.columns.items())
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, stats):
+        slot = self._head
+        timestamp = stats.get('timestamp') or time.time()
+        self.timestamps[slot] = timestamp
+        for key, column in self._column_items:
+            value = stats.get(key)
+            column[slot] = NAN if value is None else value
+
+        # Process tables are only stored when the collector actually rescanned them
+        processes = stats.get('processes')
+        if 'processes' not in stats.get('updated_probes', ('processes',)):
+            processes = None
+        if processes is not None and self.processes.capacity:
+            self.processes.append(timestamp, processes)
+
+        self._head = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+        self.processes = ProcessSnapshotStore(self.processes.capacity)
+
+    def view(self, key, count=None):
+        # Up to two zero-copy memoryview segments, oldest first
+        column = self.timestamps if key == 'timestamp' else self.columns[key]
+        count = self._size if count is None else min(count, self._size)
+        start = (self._head - count) % self.capacity
+        view = memoryview(column)
+        if start + count <= self.capacity:
+            return [view[start:start + count]]
+        return [view[start:], view[:self._head]]
+
+    def tail(self, key, count=None):
+        values = array('d')
+        for segment in self.view(key, count):
+            values.frombytes(segment.cast('B'))
+        return values
+
+    def latest(self, key):
+        if not self._size:
+            return None
+        slot = (self._head - 1) % self.capacity
+        column = self.timestamps if key == 'timestamp' else self.columns[key]
+        return column[slot]
+
+    def oldest(self, key):
+        if not self._size:
+            return None
+        slot = (self._head - self._size) % self.capacity
+        column = self.timestamps if key == 'timestamp' else self.columns[key]
+        return column[slot]
+
+    def nbytes(self):
+        scalars = self.timestamps.itemsize * self.capacity * (len(self.keys) + 1)
+        return scalars + self.processes.nbytes()
@@ -0,0 +1,99 @@
+import os
+import time
+import psutil
+from debugger import debugger
+
+# Timers cost two perf_counter calls and a few float operations. They are skipped at runtime
+# with SYSTEM_MONITOR_INSTRUMENT=0, and the `if __debug__:` guards at the call sites compile
+# them out entirely under `python -O`.
+ENABLED = os.environ.get('SYSTEM_MONITOR_INSTRUMENT', '1') != '0'
+# The overhead summary goes to the log once per this many ticks
+LOG_EVERY = 60
+
+
+class PhaseStats:
+    __slots__ = ('last', 'average', 'maximum', 'total', 'count')
+
+    def __init__(self):
+        self.last = 0.0
+        self.average = 0.0
+        self.maximum = 0.0
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, seconds):
+        self.last = seconds
+        self.average = seconds if not self.count else 0.9 * self.average + 0.1 * seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        self.total += seconds
+        self.count += 1
+
+
+class Instruments:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self.phases = {}
+        self.counters = {}
+        self.emitted_at = None
+        self.process = psutil.Process(os.getpid())
+        self.rss = 0
+        self.cpu_percent = 0.0
+        self.ticks = 0
+
+    def record(self, phase, seconds):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.add(seconds)
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def mark_emitted(self):
+        self.emitted_at = time.perf_counter()
+
+    def record_delivery(self):
+        # Time from the sampling thread's emit until the GUI thread picked the snapshot up
+        if self.emitted_at is not None:
+            self.record('signal.delivery', time.perf_counter() - self.emitted_at)
+            self.emitted_at = None
+
+    def sample_process(self):
+        with self.process.oneshot():
+            self.rss = self.process.memory_info().rss
+            self.cpu_percent = self.process.cpu_percent(interval=None)
+
+    def tick(self):
+        # Once per sampling tick: refresh the process's own RSS and CPU and log a summary now and then
+        self.sample_process()
+        self.ticks += 1
+        if self.ticks % LOG_EVERY == 0:
+            debugger.log("Monitor overhead", level='info', fields=self.fields())
+
+    def fields(self):
+        # Flat scalars for the structured log
+        fields = {f"{phase}_ms": stats.average * 1000 for phase, stats in list(self.phases.items())}
+        fields.update(list(self.counters.items()))
+        fields['rss_mb'] = self.rss / 1024**2
+        fields['cpu_percent'] = self.cpu_percent
+        return fields
+
+    def render_metrics(self, lines, stats):
+        # MetricsExporter source: the monitor's own cost next to the system metrics
+        phases = list(self.phases.items())
+        if phases:
+            lines.append('# TYPE xmonitor_self_phase_seconds gauge')
+            lines.append('# HELP xmonitor_self_phase_seconds Smoothed duration of each monitor phase')
+            lines.extend(f'xmonitor_self_phase_seconds{{phase="{phase}"}} {phase_stats.average}'
+                         for phase, phase_stats in phases)
+        for counter, value in list(self.counters.items()):
+            lines.append(f'# TYPE xmonitor_self_{counter} counter')
+            lines.append(f'xmonitor_self_{counter}_total {value}')
+        lines.append('# TYPE xmonitor_self_rss_bytes gauge')
+        lines.append(f'xmonitor_self_rss_bytes {self.rss}')
+        lines.append('# TYPE xmonitor_self_cpu_percent gauge')
+        lines.append(f'xmonitor_self_cpu_percent {self.cpu_percent}')
+
+
+instruments = Instruments()
@@ -0,0 +1,57 @@
+import json
+import time
+import logging
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+
+def _scalar_fields(record):
+    # Only plain values are logged; process tables and nested dicts are left out
+    fields = getattr(record, 'fields', None) or {}
+    return {key: value for key, value in fields.items() if isinstance(value, (int, float, str, bool))}
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = _scalar_fields(record)
+        if fields:
+            line += ' ' + ' '.join(
+                f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                for key, value in fields.items()
+            )
+        return line
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        entry.update(_scalar_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'))
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, filename, max_bytes, backup_count, rotate_seconds):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.rotate_seconds
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The writer thread formats the record, not the sampling thread
+        return record
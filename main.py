@@ -1,7 +1,12 @@
-from gui import run_gui
+import sys
 from debugger import debugger
 
 def main():
+    # ממשק טקסט ללא PyQt5: python main.py --tui
+    if '--tui' in sys.argv[1:]:
+        from tui import main as run_tui
+        return run_tui([arg for arg in sys.argv[1:] if arg != '--tui'])
+    from gui import run_gui
     try:
         debugger.log("Starting system monitoring GUI v0.9.2", level='info')
         run_gui()
@@ -10,4 +15,4 @@ def main():
         debugger.log(f"An error occurred: {str(e)}", level='error')
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,29 +1,65 @@
 import psutil
 import time
 import os
+import functools
 from datetime import datetime
 from debugger import debugger
+from collector import Collector
+from proc_scanner import create_scanner
+from cgroups import CgroupScanner
+from counters import CounterRates
+from instrumentation import instruments
+from scheduler import TickScheduler
+
+SCALAR_KEYS = (
+    'CPU Usage (%)',
+    'RAM Usage (%)',
+    'RAM Used (GB)',
+    'RAM Total (GB)',
+    'Disk Usage (%)',
+    'Disk Used (GB)',
+    'Disk Total (GB)',
+    'Network Sent (MB)',
+    'Network Received (MB)',
+    'Disk Read (MB/s)',
+    'Disk Write (MB/s)',
+    'Network Sent (MB/s)',
+    'Network Received (MB/s)',
+)
+
+# (probe, interval in seconds, cost budget in seconds)
+PROBE_SCHEDULE = (
+    ('cpu', 1, 0.005),
+    ('cores', 1, 0.005),
+    ('memory', 1, 0.005),
+    ('disk_io', 1, 0.005),
+    ('network', 1, 0.005),
+    ('processes', 5, 0.25),
+    ('cgroups', 2, 0.02),
+    ('disk_usage', 30, 0.01),
+)
+
+@functools.lru_cache(maxsize=None)
+def is_partition(disk):
+    return os.path.exists(f'/sys/class/block/{disk}/partition')
 
 class SystemMonitor:
+    process_scanner = None
+    cgroup_scanner = None
+    disk_rates = CounterRates()
+    network_rates = CounterRates()
+
     @staticmethod
-    def get_system_stats():
-        cpu_usage = psutil.cpu_percent(interval=None)
-        cpu_core_usage = psutil.cpu_percent(interval=None, percpu=True)
+    def probe_cpu():
+        return {'CPU Usage (%)': psutil.cpu_percent(interval=None)}
+
+    @staticmethod
+    def probe_cores():
+        return {'CPU Core Usage': psutil.cpu_percent(interval=None, percpu=True)}
+
+    @staticmethod
+    def probe_memory():
         ram = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        net_io = psutil.net_io_counters()
-        disk_io = psutil.disk_io_counters()
-        
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                pinfo = proc.as_dict(attrs=['pid', 'name', 'cpu_percent', 'memory_percent'])
-                pinfo['cpu_percent'] = pinfo['cpu_percent'] if pinfo['cpu_percent'] is not None else 0.0
-                pinfo['memory_percent'] = pinfo['memory_percent'] if pinfo['memory_percent'] is not None else 0.0
-                processes.append(pinfo)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-        
         ram_details = {
             'total': ram.total / (1024**3),
             'available': ram.available / (1024**3),
@@ -34,24 +70,87 @@ class SystemMonitor:
             'buffers': getattr(ram, 'buffers', 0) / (1024**3),
             'shared': getattr(ram, 'shared', 0) / (1024**3),
         }
-        
         return {
-            'CPU Usage (%)': cpu_usage,
-            'CPU Core Usage': cpu_core_usage,
             'RAM Usage (%)': ram.percent,
             'RAM Used (GB)': ram.used / (1024**3),
             'RAM Total (GB)': ram.total / (1024**3),
+            'RAM Details': ram_details
+        }
+
+    @staticmethod
+    def probe_disk_usage():
+        disk = psutil.disk_usage('/')
+        return {
             'Disk Usage (%)': disk.percent,
             'Disk Used (GB)': disk.used / (1024**3),
             'Disk Total (GB)': disk.total / (1024**3),
-            'Network Sent (MB)': net_io.bytes_sent / (1024**2),
-            'Network Received (MB)': net_io.bytes_recv / (1024**2),
-            'Disk Read (MB/s)': disk_io.read_bytes / (1024**2),
-            'Disk Write (MB/s)': disk_io.write_bytes / (1024**2),
-            'processes': processes,
-            'RAM Details': ram_details
         }
 
+    @staticmethod
+    def probe_disk_io():
+        # One per-disk call; partitions are left out of the totals, as psutil does
+        disks = {name: (io.read_bytes, io.write_bytes)
+                 for name, io in (psutil.disk_io_counters(perdisk=True) or {}).items()}
+        rates = {name: (round(read, 1), round(write, 1))
+                 for name, (read, write) in SystemMonitor.disk_rates.update(disks).items()}
+        whole_disks = [rate for name, rate in rates.items() if not is_partition(name)]
+        return {
+            'Disk Read (MB/s)': sum(read for read, _ in whole_disks) / (1024**2),
+            'Disk Write (MB/s)': sum(write for _, write in whole_disks) / (1024**2),
+            # Running byte counters and bytes per second, per device
+            'Disk Devices': disks,
+            'Disk Device Rates': rates,
+        }
+
+    @staticmethod
+    def probe_network():
+        interfaces = {name: (io.bytes_sent, io.bytes_recv)
+                      for name, io in psutil.net_io_counters(pernic=True).items()}
+        rates = {name: (round(sent, 1), round(received, 1))
+                 for name, (sent, received) in SystemMonitor.network_rates.update(interfaces).items()}
+        return {
+            'Network Sent (MB)': sum(sent for sent, _ in interfaces.values()) / (1024**2),
+            'Network Received (MB)': sum(received for _, received in interfaces.values()) / (1024**2),
+            'Network Sent (MB/s)': sum(sent for sent, _ in rates.values()) / (1024**2),
+            'Network Received (MB/s)': sum(received for _, received in rates.values()) / (1024**2),
+            'Network Interfaces': interfaces,
+            'Network Interface Rates': rates,
+        }
+
+    @staticmethod
+    def probe_processes():
+        if SystemMonitor.process_scanner is None:
+            SystemMonitor.process_scanner = create_scanner()
+        return {'processes': SystemMonitor.process_scanner.scan()}
+
+    @staticmethod
+    def probe_cgroups():
+        if SystemMonitor.cgroup_scanner is None:
+            SystemMonitor.cgroup_scanner = CgroupScanner()
+        if not SystemMonitor.cgroup_scanner.available():
+            return {}
+        return {'Cgroups': SystemMonitor.cgroup_scanner.scan()}
+
+    @staticmethod
+    def create_collector(exclude=()):
+        collector = Collector()
+        for name, interval, budget in PROBE_SCHEDULE:
+            if name in exclude:
+                continue
+            collector.register(name, getattr(SystemMonitor, f'probe_{name}'), interval, budget)
+        return collector
+
+    @staticmethod
+    def get_system_stats():
+        stats = {}
+        for name, _, _ in PROBE_SCHEDULE:
+            started = time.perf_counter()
+            stats.update(getattr(SystemMonitor, f'probe_{name}')())
+            if __debug__:
+                if instruments.enabled:
+                    instruments.record(f'probe.{name}', time.perf_counter() - started)
+        return stats
+
     @staticmethod
     def get_services():
         services = []
@@ -72,25 +171,35 @@ class SystemMonitor:
 
     @staticmethod
     def clear_screen():
-        # פונקציה לניקוי המסך בהתאם למערכת ההפעלה
-        os.system('cls' if os.name == 'nt' else 'clear')
+        # פונקציה לניקוי המסך בהתאם למערכת ההפעלה; רצף ANSI במקום להריץ shell בכל דגימה
+        if os.name == 'nt':
+            os.system('cls')
+        else:
+            print('\033[H\033[2J', end='', flush=True)
 
     @staticmethod
     def monitor(interval=1, duration=None):
+        from shmbus import attach_source
         start_time = time.time()
-        while True:
-            SystemMonitor.clear_screen()  # ניקוי המסך לפני כל הדפסה
-            stats = SystemMonitor.get_system_stats()
-            print(f"System Stats at {SystemMonitor.get_current_time()}:")
-            for key, value in stats.items():
-                if key != 'processes':
-                    print(f"{key}: {value:.2f}")
-            print("-" * 40)
-            
-            # הוספת לוג לכל איטרציה
-            debugger.log(f"System stats recorded: {stats}", level='debug')
+        scheduler = TickScheduler(interval)
+        # Follow a running collector's shared-memory bus if there is one, otherwise sample here
+        collector = attach_source()
+        follows_bus = collector is not None
+        if collector is None:
+            collector = SystemMonitor.create_collector()
+        else:
+            debugger.log("Following the collector bus; the daemon's --interval sets the update rate", level='info')
+        while follows_bus or scheduler.wait():
+            stats = collector.sample()
+            if stats is not None:
+                SystemMonitor.clear_screen()  # ניקוי המסך לפני כל הדפסה
+                print(f"System Stats at {SystemMonitor.get_current_time()}:")
+                for key in SCALAR_KEYS:
+                    print(f"{key}: {stats[key]:.2f}")
+                print("-" * 40)
+
+                # הוספת לוג לכל איטרציה
+                debugger.log("System stats recorded", level='debug', fields=stats)
             
             if duration and (time.time() - start_time) >= duration:
                 break
-            
-            time.sleep(interval)
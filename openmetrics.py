@@ -0,0 +1,142 @@
+import gzip
+import heapq
+import operator
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from debugger import debugger
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+DEFAULT_PORT = 9184
+PREFIX = 'xmonitor'
+
+# stats key, metric name, type, help, multiplier to base units
+SYSTEM_METRICS = (
+    ('CPU Usage (%)', 'cpu_usage_percent', 'gauge', 'Total CPU usage', 1),
+    ('RAM Usage (%)', 'memory_usage_percent', 'gauge', 'Used share of physical memory', 1),
+    ('RAM Used (GB)', 'memory_used_bytes', 'gauge', 'Used physical memory', 1024**3),
+    ('RAM Total (GB)', 'memory_total_bytes', 'gauge', 'Total physical memory', 1024**3),
+    ('Disk Usage (%)', 'filesystem_usage_percent', 'gauge', 'Used share of the root filesystem', 1),
+    ('Disk Used (GB)', 'filesystem_used_bytes', 'gauge', 'Used space on the root filesystem', 1024**3),
+    ('Disk Total (GB)', 'filesystem_size_bytes', 'gauge', 'Size of the root filesystem', 1024**3),
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _family(lines, name, metric_type, help_text):
+    lines.append(f'# TYPE {PREFIX}_{name} {metric_type}')
+    lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+
+
+class MetricsExporter:
+    # The payload is rendered once per snapshot; scrapes only hand out the cached bytes
+    def __init__(self, top_processes=10):
+        self.top_processes = top_processes
+        self.payload = b'# EOF\n'
+        self._compressed = None
+        self._extra_sources = []
+
+    def add_source(self, render):
+        # Other subsystems can append their own metric families: render(lines, stats)
+        self._extra_sources.append(render)
+
+    def update(self, stats):
+        lines = []
+        for key, name, metric_type, help_text, scale in SYSTEM_METRICS:
+            value = stats.get(key)
+            if value is not None:
+                _family(lines, name, metric_type, help_text)
+                lines.append(f'{PREFIX}_{name} {value * scale}')
+
+        cores = stats.get('CPU Core Usage')
+        if cores:
+            _family(lines, 'cpu_core_usage_percent', 'gauge', 'Usage of each logical CPU')
+            lines.extend(f'{PREFIX}_cpu_core_usage_percent{{core="{core}"}} {usage}' for core, usage in enumerate(cores))
+
+        interfaces = stats.get('Network Interfaces')
+        if interfaces:
+            for index, direction in enumerate(('sent', 'received')):
+                _family(lines, f'network_{direction}_bytes', 'counter', f'Bytes {direction} per interface')
+                lines.extend(f'{PREFIX}_network_{direction}_bytes_total{{interface="{_escape(name)}"}} {counters[index]}'
+                             for name, counters in interfaces.items())
+
+        disks = stats.get('Disk Devices')
+        if disks:
+            for index, direction in enumerate(('read', 'written')):
+                _family(lines, f'disk_{direction}_bytes', 'counter', f'Bytes {direction} per disk')
+                lines.extend(f'{PREFIX}_disk_{direction}_bytes_total{{device="{_escape(name)}"}} {counters[index]}'
+                             for name, counters in disks.items())
+
+        processes = stats.get('processes')
+        if processes is not None and self.top_processes:
+            self._render_processes(lines, processes)
+
+        for render in self._extra_sources:
+            render(lines, stats)
+
+        lines.append('# EOF')
+        self.payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        self._compressed = None
+
+    def _render_processes(self, lines, processes):
+        if hasattr(processes, 'column'):
+            rows = list(zip(processes.pids, processes.names, processes.cpu, processes.memory))
+        else:
+            rows = [(p['pid'], p['name'], p['cpu_percent'] or 0.0, p['memory_percent'] or 0.0) for p in processes]
+        # Each family has its own top N; the heaviest memory users are rarely the busiest processes
+        for index, name, label in ((2, 'process_cpu_percent', 'CPU'), (3, 'process_memory_percent', 'memory')):
+            top = heapq.nlargest(self.top_processes, rows, key=operator.itemgetter(index))
+            _family(lines, name, 'gauge', f'Top {self.top_processes} processes by {label}')
+            lines.extend(f'{PREFIX}_{name}{{pid="{row[0]}",name="{_escape(row[1])}"}} {row[index]}' for row in top)
+
+    def compressed(self):
+        payload, compressed = self.payload, self._compressed
+        if compressed is None or compressed[0] is not payload:
+            compressed = self._compressed = (payload, gzip.compress(payload, 5))
+        return compressed[1]
+
+
+class MetricsServer:
+    def __init__(self, exporter, host='127.0.0.1', port=DEFAULT_PORT):
+        exporter_ref = exporter
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = exporter_ref.compressed()
+                    encoding = 'gzip'
+                else:
+                    body = exporter_ref.payload
+                    encoding = None
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                if encoding:
+                    self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                debugger.log("Metrics scrape: " + format, *args, level='debug')
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        debugger.log(f"Serving OpenMetrics on port {self.port}", level='info')
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
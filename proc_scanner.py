@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+from array import array
+import psutil
+
+# (uid_t)-1: the owner is unknown, as in tables from sources that do not report it
+NO_UID = 2**32 - 1
+# Per-process I/O counters cost a second open and read per process, about doubling a scan, so
+# they are only read when asked for; without them the io column stays 0
+READ_IO = os.environ.get('SYSTEM_MONITOR_PROCESS_IO') == '1'
+
+
+class ProcessTable:
+    # Column-oriented scan result; iterating yields the per-process dicts the GUI expects
+    FIELDS = {
+        'pid': 'pids',
+        'ppid': 'ppids',
+        'name': 'names',
+        'cpu_percent': 'cpu',
+        'memory_percent': 'memory',
+        'rss': 'rss',
+        'num_threads': 'threads',
+        'io_bytes': 'io',
+        'uid': 'uids',
+    }
+
+    def __init__(self):
+        self.pids = array('i')
+        self.ppids = array('i')
+        self.names = []
+        self.cpu = array('f')
+        self.memory = array('f')
+        self.rss = array('Q')
+        self.threads = array('I')
+        # Bytes read from and written to storage since the process started
+        self.io = array('Q')
+        # Effective user id of the owner
+        self.uids = array('I')
+
+    def __len__(self):
+        return len(self.pids)
+
+    def append(self, pid, ppid, name, cpu_percent, memory_percent, rss, threads, io=0, uid=NO_UID):
+        self.pids.append(pid)
+        self.ppids.append(ppid)
+        self.names.append(name)
+        self.cpu.append(cpu_percent)
+        self.memory.append(memory_percent)
+        self.rss.append(rss)
+        self.threads.append(threads)
+        self.io.append(io)
+        self.uids.append(uid)
+
+    def column(self, field):
+        return getattr(self, self.FIELDS[field])
+
+    def __getitem__(self, index):
+        return {
+            'pid': self.pids[index],
+            'ppid': self.ppids[index],
+            'name': self.names[index],
+            'cpu_percent': self.cpu[index],
+            'memory_percent': self.memory[index],
+            'rss': self.rss[index],
+            'num_threads': self.threads[index],
+            'io_bytes': self.io[index],
+            'uid': self.uids[index],
+        }
+
+    def __iter__(self):
+        for index in range(len(self.pids)):
+            yield self[index]
+
+
+class ProcScanner:
+    name = 'proc'
+
+    def __init__(self, proc_root='/proc', read_io=READ_IO):
+        self.proc_root = proc_root
+        self.read_io = read_io
+        # /proc/[pid]/io of other users' processes is unreadable without privileges; not retried
+        self._io_denied = set()
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.total_memory = os.sysconf('SC_PHYS_PAGES') * self.page_size
+        self._buffer = bytearray(4096)
+        self._names = {}
+        # pid -> (start time, utime + stime) from the previous scan
+        self._previous = {}
+        self._last_scan = None
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and os.path.exists('/proc/self/stat')
+
+    def scan(self):
+        now = time.monotonic()
+        elapsed = now - self._last_scan if self._last_scan is not None else 0.0
+        tick_scale = 100.0 / (self.clock_ticks * elapsed) if elapsed > 0 else 0.0
+        memory_scale = 100.0 * self.page_size / self.total_memory
+        buffer = self._buffer
+        names = self._names
+        previous = self._previous
+        current = {}
+        table = ProcessTable()
+        root = self.proc_root
+
+        for entry in os.listdir(root):
+            if not entry.isdigit():
+                continue
+            try:
+                fd = os.open(f'{root}/{entry}/stat', os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                length = os.readv(fd, [buffer])
+                # /proc/[pid] belongs to the process's effective user
+                uid = os.fstat(fd).st_uid
+            except OSError:
+                continue
+            finally:
+                os.close(fd)
+
+            # The command name may itself contain spaces or parentheses
+            open_paren = buffer.find(b'(', 0, length)
+            close_paren = buffer.rfind(b')', 0, length)
+            if open_paren < 0 or close_paren < 0:
+                continue
+            raw_name = bytes(buffer[open_paren + 1:close_paren])
+            name = names.get(raw_name)
+            if name is None:
+                name = names[raw_name] = raw_name.decode('utf-8', 'replace')
+            fields = buffer[close_paren + 2:length].split(None, 22)
+
+            pid = int(entry)
+            ticks = int(fields[11]) + int(fields[12])
+            start_time = int(fields[19])
+            rss_pages = int(fields[21])
+            last = previous.get(pid)
+            if last is not None and last[0] == start_time:
+                cpu_percent = (ticks - last[1]) * tick_scale
+            else:
+                cpu_percent = 0.0
+            current[pid] = (start_time, ticks)
+            io = self._read_io(entry, pid) if self.read_io else 0
+            table.append(pid, int(fields[1]), name, cpu_percent, rss_pages * memory_scale,
+                         rss_pages * self.page_size, int(fields[17]), io, uid)
+
+        if self._io_denied:
+            self._io_denied.intersection_update(current)
+        self._previous = current
+        self._last_scan = now
+        return table
+
+
+    def _read_io(self, entry, pid):
+        if pid in self._io_denied:
+            return 0
+        try:
+            fd = os.open(f'{self.proc_root}/{entry}/io', os.O_RDONLY)
+        except PermissionError:
+            self._io_denied.add(pid)
+            return 0
+        except OSError:
+            return 0
+        try:
+            length = os.readv(fd, [self._buffer])
+        except OSError:
+            self._io_denied.add(pid)
+            return 0
+        finally:
+            os.close(fd)
+        # rchar, wchar, syscr, syscw, read_bytes, write_bytes, cancelled_write_bytes
+        fields = self._buffer[:length].split()
+        try:
+            return int(fields[9]) + int(fields[11])
+        except (IndexError, ValueError):
+            return 0
+
+
+class PsutilScanner:
+    name = 'psutil'
+    attrs = ['pid', 'ppid', 'name', 'cpu_percent', 'memory_percent', 'memory_info', 'num_threads', 'uids']
+
+    def __init__(self, read_io=READ_IO):
+        self.attrs = self.attrs + ['io_counters'] if read_io else self.attrs
+
+    @staticmethod
+    def available():
+        return True
+
+    def scan(self):
+        table = ProcessTable()
+        # process_iter already fetches the attributes once per process and skips vanished PIDs
+        for proc in psutil.process_iter(self.attrs):
+            info = proc.info
+            memory_info = info['memory_info']
+            io_counters = info.get('io_counters')
+            table.append(info['pid'], info['ppid'] or 0, info['name'] or '',
+                         info['cpu_percent'] or 0.0, info['memory_percent'] or 0.0,
+                         memory_info.rss if memory_info is not None else 0,
+                         info['num_threads'] or 0,
+                         io_counters.read_bytes + io_counters.write_bytes if io_counters is not None else 0,
+                         info['uids'].effective if info['uids'] is not None else NO_UID)
+        return table
+
+
+SCANNERS = {
+    ProcScanner.name: ProcScanner,
+    PsutilScanner.name: PsutilScanner,
+}
+
+
+def create_scanner(backend=None):
+    backend = backend or os.environ.get('SYSTEM_MONITOR_PROCESS_BACKEND')
+    if backend:
+        return SCANNERS[backend]()
+    for scanner_class in SCANNERS.values():
+        if scanner_class.available():
+            return scanner_class()
@@ -0,0 +1,175 @@
+import heapq
+from array import array
+from proc_scanner import ProcessTable, NO_UID
+
+# Metrics kept as top-N lists: name -> label
+TOP_METRICS = {
+    'cpu': 'CPU %',
+    'memory': 'Memory %',
+    'io_rate': 'I/O (B/s)',
+    'threads': 'Threads',
+}
+# Per-process values summed over every subtree
+ROLLUP_METRICS = ('cpu', 'memory', 'rss', 'threads', 'io_rate', 'count')
+
+
+def as_table(processes):
+    # Older snapshots carry a list of psutil-style dicts instead of a ProcessTable
+    if hasattr(processes, 'pids'):
+        return processes
+    table = ProcessTable()
+    for p in processes:
+        table.append(p['pid'], p.get('ppid') or 0, p['name'] or '', p['cpu_percent'] or 0.0,
+                     p['memory_percent'] or 0.0, p.get('rss') or 0, p.get('num_threads') or 0,
+                     p.get('io_bytes') or 0, p.get('uid', NO_UID))
+    return table
+
+
+class ProcessAnalytics:
+    # Heavy hitters and the parent/child tree of one process scan after another. Top-N lists come
+    # from bounded heaps (O(n log k)), never from sorting the whole table. The tree is kept across
+    # scans and only the processes that appeared, exited or were reparented move in it; a subtree
+    # total is then one pass over the tree, children ahead of their parents. Both are worked out
+    # only for the metrics asked for.
+    def __init__(self, top=10):
+        self.top = top
+        self.table = ProcessTable()
+        self.timestamp = None
+        # pid -> row in the current table
+        self.index = {}
+        # pid -> parent pid, 0 for processes whose parent is not in the table
+        self.parent = {}
+        # pid -> set of child pids; 0 holds the roots
+        self.children = {0: set()}
+        self.io_rate = array('d')
+        self.totals = {}
+        self.tops = {}
+        self.order = []
+        self._links = []
+        self.added = set()
+        self.removed = set()
+        self.moved = set()
+        self._io = {}
+
+    def update(self, processes, timestamp):
+        table = as_table(processes)
+        pids = table.pids
+        index = {pid: i for i, pid in enumerate(pids)}
+        self.update_io_rates(table, timestamp)
+        self.update_tree(table, index)
+        self.table = table
+        self.index = index
+        self.timestamp = timestamp
+        self.update_order()
+        self.tops = {}
+
+    def update_io_rates(self, table, timestamp):
+        previous = self._io
+        elapsed = timestamp - self.timestamp if self.timestamp is not None else 0
+        if not previous and not any(table.io):
+            # The scanner is not reading I/O counters
+            self.io_rate = array('d', bytes(8 * len(table)))
+            return
+        current = dict(zip(table.pids, table.io))
+        if elapsed > 0:
+            # A new process, or a reused pid whose counter went backwards, has no rate yet
+            self.io_rate = array('d', (max(io - previous.get(pid, io), 0) / elapsed
+                                       for pid, io in current.items()))
+        else:
+            self.io_rate = array('d', bytes(8 * len(current)))
+        self._io = current
+
+    def update_tree(self, table, index):
+        parent = self.parent
+        children = self.children
+        self.removed = {pid for pid in parent if pid not in index}
+        self.added = set()
+        self.moved = set()
+        for pid in self.removed:
+            children[parent.pop(pid)].discard(pid)
+            # The kernel reparents orphans; until the scan shows the new parent they hang off the root
+            for child in children.pop(pid, ()):
+                parent[child] = 0
+                children[0].add(child)
+                self.moved.add(child)
+        for pid, ppid in zip(table.pids, table.ppids):
+            if ppid == pid or ppid not in index:
+                ppid = 0
+            old = parent.get(pid)
+            if old == ppid:
+                continue
+            if old is None:
+                self.added.add(pid)
+            else:
+                children[old].discard(pid)
+                self.moved.add(pid)
+            parent[pid] = ppid
+            siblings = children.get(ppid)
+            if siblings is None:
+                siblings = children[ppid] = set()
+            siblings.add(pid)
+        self.moved -= self.added
+
+    def update_order(self):
+        children = self.children
+        parent = self.parent
+        index = self.index
+        # Walked a level at a time; parents come before their children
+        order = []
+        links = []
+        level = list(children[0])
+        while level:
+            order.extend(level)
+            level = [kid for pid in level if pid in children for kid in children[pid]]
+            links.append([(index[kid], index[parent[kid]]) for kid in level])
+        self.order = order
+        # (row, parent row), the deepest level first so every child is ahead of its parent
+        links.reverse()
+        self._links = [link for level_links in links for link in level_links]
+        self.totals = {}
+
+    def rollup(self, metric):
+        # Subtree totals of one metric by table row, computed on first use after each update
+        column = self.totals.get(metric)
+        if column is None:
+            if metric == 'count':
+                column = array('d', [1.0]) * len(self.table)
+            elif metric == 'io_rate':
+                column = array('d', self.io_rate)
+            else:
+                column = array('d', getattr(self.table, metric))
+            for row, parent_row in self._links:
+                column[parent_row] += column[row]
+            self.totals[metric] = column
+        return column
+
+    def top_processes(self, metric, count=None):
+        # [(pid, name, value)], largest first
+        table = self.table
+        column = self.io_rate if metric == 'io_rate' else getattr(table, metric)
+        rows = self.tops.get(metric)
+        if rows is None:
+            rows = self.tops[metric] = heapq.nlargest(self.top, range(len(table)), key=column.__getitem__)
+        if count is not None:
+            rows = rows[:count]
+        return [(table.pids[row], table.names[row], column[row]) for row in rows]
+
+    def subtree(self, pid):
+        row = self.index.get(pid)
+        if row is None:
+            return None
+        return {metric: self.rollup(metric)[row] for metric in ROLLUP_METRICS}
+
+    def service_trees(self, metric='cpu', count=None):
+        # The children of the root processes (init, a container's entry point) are the services;
+        # a root without children stands for itself. [(pid, name, subtree value, processes)]
+        children = self.children
+        candidates = []
+        for root in children[0]:
+            candidates.extend(children.get(root) or (root,))
+        column = self.rollup(metric)
+        index = self.index
+        heaviest = heapq.nlargest(count or self.top, candidates, key=lambda pid: column[index[pid]])
+        names = self.table.names
+        processes = self.rollup('count')
+        return [(pid, names[index[pid]], column[index[pid]], int(processes[index[pid]])) for pid in heaviest]
@@ -0,0 +1,187 @@
+import re
+import pwd
+import operator
+from proc_scanner import NO_UID
+from process_analytics import as_table
+
+# Numeric fields: query name -> (ProcessTable column, unit the query value is given in)
+NUMERIC_FIELDS = {
+    'pid': ('pids', 1),
+    'ppid': ('ppids', 1),
+    'cpu': ('cpu', 1),
+    'mem': ('memory', 1),
+    'rss': ('rss', 1024**2),
+    'threads': ('threads', 1),
+    'uid': ('uids', 1),
+}
+# Text fields, matched lowercased: substring by default, `field:~regex` for a regular expression
+TEXT_FIELDS = ('name', 'cmd', 'user')
+ALIASES = {'memory': 'mem', 'cmdline': 'cmd', 'command': 'cmd', 'owner': 'user'}
+COMPARISONS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+               '=': operator.eq, ':': operator.eq, '!=': operator.ne}
+# Words, or words with "quoted parts" so values can hold spaces
+TOKEN = re.compile(r'(?:[^\s"]+|"[^"]*")+')
+TERM = re.compile(r'(\w+)(>=|<=|!=|>|<|=|:)(.*)')
+# Bytes of /proc/[pid]/cmdline kept in the index
+CMDLINE_LIMIT = 4096
+
+
+def parse_query(text):
+    # "name:~^java cpu>20 user:www -pid:1" -> [(field, operation, value, negated)]; every term has
+    # to match. Bare words match the name or the command line. Raises ValueError for a bad term.
+    terms = []
+    for token in TOKEN.findall(text):
+        negated = token.startswith('-') and len(token) > 1
+        if negated:
+            token = token[1:]
+        match = TERM.fullmatch(token)
+        field = match.group(1).lower() if match else None
+        field = ALIASES.get(field, field)
+        if field not in NUMERIC_FIELDS and field not in TEXT_FIELDS:
+            terms.append(('text', 'contains', token.replace('"', '').lower(), negated))
+            continue
+        operation, value = match.group(2), match.group(3).replace('"', '')
+        if field in NUMERIC_FIELDS:
+            try:
+                value = float(value) * NUMERIC_FIELDS[field][1]
+            except ValueError:
+                raise ValueError(f"{field} needs a number, not '{value}'") from None
+        elif operation not in (':', '='):
+            raise ValueError(f"{field} takes ':' or '=', not '{operation}'")
+        elif value.startswith('~'):
+            try:
+                value = re.compile(value[1:], re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"bad pattern for {field}: {e}") from None
+            operation = 'regex'
+        else:
+            operation = 'equals' if operation == '=' else 'contains'
+            value = value.lower()
+        terms.append((field, operation, value, negated))
+    return terms
+
+
+def make_test(operation, value):
+    if operation == 'contains':
+        return lambda text: value in text
+    if operation == 'equals':
+        return value.__eq__
+    if operation == 'regex':
+        return value.search
+    compare = COMPARISONS[operation]
+    return lambda number: compare(number, value)
+
+
+def read_cmdline(pid, proc_root='/proc'):
+    try:
+        with open(f'{proc_root}/{pid}/cmdline', 'rb') as f:
+            data = f.read(CMDLINE_LIMIT)
+    except OSError:
+        return ''
+    return data.replace(b'\0', b' ').strip().decode('utf-8', 'replace').lower()
+
+
+class ProcessSearchIndex:
+    # Lowercased name, command line and user per process, kept across scans: only processes that
+    # are new (or exec'd, so their name changed) are lowercased and looked up again. Command lines
+    # are read from /proc on the first search that needs them, so `read_cmdline` is turned off for
+    # tables that come from another host. Results are cached until the query or the scan changes.
+    def __init__(self, read_cmdline=True, proc_root='/proc'):
+        self.read_cmdline = read_cmdline
+        self.proc_root = proc_root
+        self.table = as_table(())
+        self.index = {}
+        # pid -> (name, uid, lowercased name, user)
+        self.entries = {}
+        self._cmdlines = {}
+        self.names = []
+        self.cmdlines = None
+        self.users = []
+        self._users = {}
+        self.generation = 0
+        self._cache = (None, None, None)
+
+    def clear(self):
+        self.entries = {}
+        self._cmdlines = {}
+        self.update(self.table)
+
+    def user(self, uid):
+        name = self._users.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name.lower()
+            except KeyError:
+                name = '' if uid == NO_UID else str(uid)
+            self._users[uid] = name
+        return name
+
+    def update(self, processes):
+        table = as_table(processes)
+        entries = self.entries
+        cmdlines = self._cmdlines
+        fresh = {}
+        for pid, name, uid in zip(table.pids, table.names, table.uids):
+            entry = entries.get(pid)
+            if entry is None or entry[0] != name or entry[1] != uid:
+                entry = (name, uid, name.lower(), self.user(uid))
+                cmdlines.pop(pid, None)
+            fresh[pid] = entry
+        self.entries = fresh
+        if len(cmdlines) > len(fresh):
+            self._cmdlines = {pid: cmdline for pid, cmdline in cmdlines.items() if pid in fresh}
+        rows = list(fresh.values())
+        self.names = [entry[2] for entry in rows]
+        self.users = [entry[3] for entry in rows]
+        self.cmdlines = None
+        self.index = {pid: row for row, pid in enumerate(table.pids)}
+        self.table = table
+        self.generation += 1
+
+    def column(self, field):
+        if field == 'name':
+            return self.names
+        if field == 'cmd':
+            return self.command_lines()
+        if field == 'user':
+            return self.users
+        return getattr(self.table, NUMERIC_FIELDS[field][0])
+
+    def command_lines(self):
+        if self.cmdlines is None:
+            known = self._cmdlines
+            for pid in self.table.pids:
+                if pid not in known:
+                    known[pid] = read_cmdline(pid, self.proc_root) if self.read_cmdline else ''
+            self.cmdlines = [known[pid] for pid in self.table.pids]
+        return self.cmdlines
+
+    def search(self, text):
+        # Rows of the current table that match `text`, in table order
+        query, generation, rows = self._cache
+        if query == text and generation == self.generation:
+            return rows
+        terms = parse_query(text)
+        rows = range(len(self.table))
+        for field, operation, value, negated in terms:
+            test = make_test(operation, value)
+            if field == 'pid' and operation in ('=', ':') and not negated:
+                # A PID is a lookup, not a scan
+                row = self.index.get(int(value))
+                rows = [row] if row is not None and row in rows else []
+            elif field == 'text':
+                names, cmdlines = self.names, self.command_lines()
+                rows = [row for row in rows if (test(names[row]) or test(cmdlines[row])) != negated]
+            elif negated:
+                column = self.column(field)
+                rows = [row for row in rows if not test(column[row])]
+            else:
+                column = self.column(field)
+                rows = [row for row in rows if test(column[row])]
+        rows = list(rows)
+        self._cache = (text, self.generation, rows)
+        return rows
+
+    def search_pids(self, text):
+        pids = self.table.pids
+        return {pids[row] for row in self.search(text)}
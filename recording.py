@@ -0,0 +1,156 @@
+import os
+import json
+import mmap
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from remote import DeltaEncoder, DeltaDecoder, pack_payload, unpack_body, KEYFRAME_INTERVAL
+from debugger import debugger
+
+MAGIC = b'XMRC'
+INDEX_MAGIC = b'XMRI'
+VERSION = 1
+# magic, version, metadata JSON length
+HEADER = struct.Struct('<4sII')
+# compressed frame length, timestamp, keyframe flag
+RECORD = struct.Struct('<IdB3x')
+# index offset, frame count, magic; the last bytes of a cleanly closed recording
+TRAILER = struct.Struct('<QQ4s')
+
+
+class Recorder:
+    # Collector sink that appends every snapshot, process table included, as a delta frame from
+    # remote.DeltaEncoder with a full keyframe every `keyframe_interval` frames. The frame index
+    # (timestamp, offset, keyframe flag) is written at the end on close; a recording cut short
+    # by a crash is still readable, the reader then rebuilds the index from the frame headers.
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL, metadata=None):
+        self.path = path
+        self.encoder = DeltaEncoder(keyframe_interval)
+        self.timestamps = array('d')
+        self.offsets = array('Q')
+        self.keyframes = array('B')
+        self.lock = threading.Lock()
+        self.file = open(path, 'wb')
+        meta = json.dumps(dict(metadata or {}, keyframe_interval=keyframe_interval)).encode()
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(meta)) + meta)
+        self.offset = self.file.tell()
+        debugger.log(f"Recording to {path}", level='info')
+
+    def record(self, stats):
+        with self.lock:
+            if self.file is None:
+                return
+            frame = self.encoder.encode(stats)
+            body = pack_payload(frame)
+            keyframe = bool(frame.get('keyframe'))
+            self.file.write(RECORD.pack(len(body), frame['t'], keyframe) + body)
+            # Flushed per frame, so the file is readable up to the last sample while recording
+            self.file.flush()
+            self.timestamps.append(frame['t'])
+            self.offsets.append(self.offset)
+            self.keyframes.append(keyframe)
+            self.offset += RECORD.size + len(body)
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            index_offset = self.offset
+            self.file.write(self.timestamps.tobytes() + self.offsets.tobytes() + self.keyframes.tobytes())
+            self.file.write(TRAILER.pack(index_offset, len(self.timestamps), INDEX_MAGIC))
+            self.file.close()
+            self.file = None
+            debugger.log(f"Recording {self.path} closed after {len(self.timestamps)} frames", level='info')
+
+
+class Recording:
+    # Random access to a recording: the frame index is loaded (or rebuilt) once, and a frame is
+    # decoded from the nearest keyframe at or before it, so seeking costs at most one keyframe
+    # interval of deltas however long the recording is. Playing forward applies one delta per frame.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a recording")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a recording")
+        self.metadata = json.loads(self.map[HEADER.size:HEADER.size + meta_length])
+        self.data_offset = HEADER.size + meta_length
+        if not self._load_index(size):
+            self._scan(size)
+        self.keyframe_frames = array('I', (frame for frame, keyframe in enumerate(self.keyframes) if keyframe))
+        if not self.keyframe_frames:
+            self.close()
+            raise ValueError(f"{path} holds no frames")
+        self.decoder = DeltaDecoder()
+        self.position = None
+
+    def _load_index(self, size):
+        if size < self.data_offset + TRAILER.size:
+            return False
+        index_offset, count, magic = TRAILER.unpack_from(self.map, size - TRAILER.size)
+        if magic != INDEX_MAGIC or index_offset + count * 17 + TRAILER.size != size:
+            return False
+        self.timestamps = array('d', self.map[index_offset:index_offset + 8 * count])
+        self.offsets = array('Q', self.map[index_offset + 8 * count:index_offset + 16 * count])
+        self.keyframes = array('B', self.map[index_offset + 16 * count:index_offset + 17 * count])
+        return True
+
+    def _scan(self, size):
+        # No index: still being written, or the recorder did not shut down cleanly
+        self.timestamps = array('d')
+        self.offsets = array('Q')
+        self.keyframes = array('B')
+        offset = self.data_offset
+        while offset + RECORD.size <= size:
+            length, timestamp, keyframe = RECORD.unpack_from(self.map, offset)
+            if offset + RECORD.size + length > size:
+                break
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+            self.keyframes.append(keyframe)
+            offset += RECORD.size + length
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def start(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    @property
+    def end(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def frame_at(self, timestamp):
+        # The last frame at or before `timestamp`
+        return max(bisect_right(self.timestamps, timestamp) - 1, 0)
+
+    def _apply(self, frame):
+        offset = self.offsets[frame]
+        length = RECORD.unpack_from(self.map, offset)[0]
+        start = offset + RECORD.size
+        self.decoder.apply(unpack_body(self.map[start:start + length]))
+
+    def read(self, frame):
+        # The snapshot as it was at `frame`
+        keyframe = self.keyframe_frames[bisect_right(self.keyframe_frames, frame) - 1]
+        position = self.position
+        if position is None or position > frame or position < keyframe:
+            first = keyframe
+        else:
+            first = position + 1
+        for index in range(first, frame + 1):
+            self._apply(index)
+        self.position = frame
+        return self.decoder.snapshot()
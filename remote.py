@@ -0,0 +1,554 @@
+import json
+import time
+import zlib
+import socket
+import struct
+import argparse
+import selectors
+import threading
+import psutil
+from monitor import SystemMonitor, SCALAR_KEYS
+from proc_scanner import ProcessTable, NO_UID
+from scheduler import TickScheduler
+from debugger import debugger
+
+DEFAULT_PORT = 9185
+# Every frame starts with: body length, frame kind, length of the host name that follows
+HEADER = struct.Struct('<IBB')
+MAX_FRAME = 64 * 1024**2
+# A body may not inflate past this, so a small frame cannot expand into gigabytes of JSON
+MAX_PAYLOAD = 64 * 1024**2
+
+HELLO = 1       # agent -> aggregator: {'host', 'cores'}
+SNAPSHOT = 2    # agent -> aggregator, and forwarded unchanged to viewers with the host name attached
+SUBSCRIBE = 3   # viewer -> aggregator: {'hosts': [...]}
+HOSTS = 4       # aggregator -> viewer: one summary row per host
+
+# A full snapshot every this many frames, so a dropped or late reader resynchronizes
+KEYFRAME_INTERVAL = 60
+# A viewer that falls this far behind is disconnected instead of buffering without bound
+MAX_PENDING = 4 * 1024**2
+SUMMARY_INTERVAL = 1.0
+RECONNECT_DELAY = 5.0
+
+# Preset compression dictionary: the key names repeat in every frame, so even a single small frame compresses well
+ZDICT = json.dumps([list(SCALAR_KEYS), 'CPU Core Usage', 'RAM Details', 'Disk Devices', 'Network Interfaces',
+                    'total', 'available', 'used', 'free', 'percent', 'cached', 'buffers', 'shared',
+                    'keyframe', 'values', 'probes', 'processes', 'changed', 'removed']).encode()
+
+
+def pack_payload(payload):
+    compressor = zlib.compressobj(6, zdict=ZDICT)
+    return compressor.compress(json.dumps(payload, separators=(',', ':')).encode()) + compressor.flush()
+
+
+def pack_frame(kind, payload, host=''):
+    return pack_body(kind, pack_payload(payload), host)
+
+
+def pack_body(kind, body, host=''):
+    name = host.encode()
+    return HEADER.pack(len(body), kind, len(name)) + name + body
+
+
+def unpack_body(body):
+    decompressor = zlib.decompressobj(zdict=ZDICT)
+    data = decompressor.decompress(body, MAX_PAYLOAD)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Frame inflates past {MAX_PAYLOAD} bytes")
+    data += decompressor.flush()
+    if len(data) > MAX_PAYLOAD:
+        raise ValueError(f"Frame inflates past {MAX_PAYLOAD} bytes")
+    return json.loads(data)
+
+
+class FrameReader:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        # Yields (kind, host, compressed body) for every complete frame received so far
+        buffer = self.buffer
+        buffer += data
+        offset = 0
+        while len(buffer) - offset >= HEADER.size:
+            length, kind, name_length = HEADER.unpack_from(buffer, offset)
+            if length > MAX_FRAME:
+                raise ValueError(f"Frame of {length} bytes exceeds the limit")
+            end = offset + HEADER.size + name_length + length
+            if len(buffer) < end:
+                break
+            name_start = offset + HEADER.size
+            host = bytes(buffer[name_start:name_start + name_length]).decode()
+            yield kind, host, bytes(buffer[name_start + name_length:end])
+            offset = end
+        del buffer[:offset]
+
+
+class DeltaEncoder:
+    # Each frame carries only the values that changed since the previous one, and for processes
+    # only the rows that changed plus the PIDs that exited
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.reset()
+
+    def reset(self):
+        self.values = {}
+        self.rows = {}
+        self.frames = 0
+
+    def encode(self, stats):
+        keyframe = self.frames % self.keyframe_interval == 0
+        if keyframe:
+            self.values = {}
+            self.rows = {}
+        self.frames += 1
+        updated = stats.get('updated_probes', ())
+        frame = {'t': stats.get('timestamp') or time.time(), 'probes': list(updated)}
+        if keyframe:
+            frame['keyframe'] = True
+
+        changed = {}
+        previous = self.values
+        for key, value in stats.items():
+            if key in ('timestamp', 'updated_probes', 'processes'):
+                continue
+            if key not in previous or previous[key] != value:
+                changed[key] = previous[key] = value
+        frame['values'] = changed
+
+        processes = stats.get('processes')
+        if processes is not None and (keyframe or 'processes' in updated):
+            frame['processes'] = self.encode_processes(processes)
+        return frame
+
+    def encode_processes(self, processes):
+        if hasattr(processes, 'pids'):
+            rows = zip(processes.pids, processes.ppids, processes.names, processes.cpu, processes.memory,
+                       processes.rss, processes.threads, processes.io, processes.uids)
+        else:
+            rows = ((p['pid'], p['ppid'], p['name'], p['cpu_percent'], p['memory_percent'], p['rss'],
+                     p['num_threads'], p.get('io_bytes', 0), p.get('uid', NO_UID)) for p in processes)
+        previous = self.rows
+        current = {}
+        changed = []
+        for pid, ppid, name, cpu, memory, rss, threads, io, uid in rows:
+            # Rounded to what the views show, so noise in the last digits does not count as a change
+            row = (ppid, name, round(cpu, 1), round(memory, 2), rss, threads, io, uid)
+            current[pid] = row
+            if previous.get(pid) != row:
+                changed.append((pid,) + row)
+        removed = [pid for pid in previous if pid not in current]
+        self.rows = current
+        return {'changed': changed, 'removed': removed}
+
+
+class DeltaDecoder:
+    def __init__(self):
+        self.values = {}
+        self.rows = {}
+        self.timestamp = None
+        self.updated_probes = ()
+        self.synced = False
+        self.table = None
+
+    def apply(self, frame):
+        if frame.get('keyframe'):
+            self.values = {}
+            self.rows = {}
+            self.synced = True
+        elif not self.synced:
+            # Deltas are meaningless until the first keyframe arrives
+            return False
+        self.values.update(frame['values'])
+        self.timestamp = frame['t']
+        self.updated_probes = tuple(frame['probes'])
+        processes = frame.get('processes')
+        if processes is not None:
+            rows = self.rows
+            for pid in processes['removed']:
+                rows.pop(pid, None)
+            for pid, *row in processes['changed']:
+                rows[pid] = row
+            self.table = None
+        return True
+
+    def keyframe(self):
+        return {'t': self.timestamp, 'probes': list(self.updated_probes), 'keyframe': True,
+                'values': self.values, 'processes': {'changed': [(pid,) + tuple(row) for pid, row in self.rows.items()],
+                                                     'removed': []}}
+
+    def processes(self):
+        # Rebuilt only after a process delta, so views can skip an unchanged table by identity
+        if self.table is None:
+            table = ProcessTable()
+            for pid, row in self.rows.items():
+                table.append(pid, *row)
+            self.table = table
+        return self.table
+
+    def snapshot(self):
+        stats = dict(self.values)
+        stats['timestamp'] = self.timestamp
+        stats['updated_probes'] = self.updated_probes
+        stats['processes'] = self.processes()
+        return stats
+
+
+class RemoteAgent:
+    # Collector sink that streams snapshots to the aggregator, reconnecting when it goes away. The
+    # sampling thread only hands a snapshot over; encoding and the blocking sends run on a thread of
+    # their own, which holds at most one snapshot in waiting. A newer one replaces it, keeping the
+    # probes either of them updated, so a slow link sends fewer frames instead of holding up sampling.
+    def __init__(self, address, name=None):
+        self.address = address
+        self.name = name or socket.gethostname()
+        self.encoder = DeltaEncoder()
+        self.sock = None
+        self.next_attempt = 0.0
+        self.pending = None
+        self.merged = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='remote-agent', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, timeout=5)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(pack_frame(HELLO, {'host': self.name, 'cores': psutil.cpu_count()}))
+        self.encoder.reset()
+        debugger.log(f"Agent {self.name} connected to {self.address[0]}:{self.address[1]}", level='info')
+
+    def send(self, stats):
+        with self.condition:
+            pending = self.pending
+            if pending is not None:
+                # The later snapshot holds every value; only the probes the earlier one updated carry over
+                stats = dict(stats)
+                stats['updated_probes'] = tuple(dict.fromkeys(pending.get('updated_probes', ()) +
+                                                              tuple(stats.get('updated_probes', ()))))
+                self.merged += 1
+                if self.merged == 1:
+                    debugger.log("Agent link is slower than sampling; merging snapshots", level='warning')
+            self.pending = stats
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                stats, self.pending = self.pending, None
+            self.transmit(stats)
+
+    def transmit(self, stats):
+        if self.sock is None:
+            if time.monotonic() < self.next_attempt:
+                return
+            try:
+                self.connect()
+            except OSError as e:
+                self.next_attempt = time.monotonic() + RECONNECT_DELAY
+                debugger.log(f"Agent could not connect: {str(e)}", level='warning')
+                return
+        try:
+            self.sock.sendall(pack_frame(SNAPSHOT, self.encoder.encode(stats)))
+        except OSError as e:
+            debugger.log(f"Agent connection lost: {str(e)}", level='warning')
+            self.disconnect()
+
+    def disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread.is_alive():
+            # A send in progress gives up within the socket timeout
+            self.thread.join(timeout=6)
+        self.disconnect()
+
+
+class Connection:
+    __slots__ = ('sock', 'address', 'reader', 'outbox', 'writing', 'role', 'host', 'subscriptions')
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.reader = FrameReader()
+        self.outbox = bytearray()
+        self.writing = False
+        self.role = None
+        self.host = None
+        self.subscriptions = set()
+
+
+class HostState:
+    __slots__ = ('name', 'address', 'cores', 'decoder', 'connection', 'last_seen')
+
+    def __init__(self, name, address, cores):
+        self.name = name
+        self.address = address
+        self.cores = cores
+        self.decoder = DeltaDecoder()
+        self.connection = None
+        self.last_seen = None
+
+    def summary(self):
+        values = self.decoder.values
+        return {'host': self.name, 'address': self.address, 'cores': self.cores,
+                'connected': self.connection is not None, 'last_seen': self.last_seen,
+                'cpu': values.get('CPU Usage (%)'), 'ram': values.get('RAM Usage (%)')}
+
+
+class Aggregator:
+    # Single-threaded, non-blocking fan-in from agents and fan-out to viewers. Agent frames are
+    # decompressed once to track host state, but forwarded to viewers as the original compressed bytes.
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.selector = selectors.DefaultSelector()
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.hosts = {}
+        self.viewers = set()
+        self.stopped = threading.Event()
+
+    @property
+    def port(self):
+        return self.listener.getsockname()[1]
+
+    def serve(self):
+        next_summary = time.monotonic() + SUMMARY_INTERVAL
+        while not self.stopped.is_set():
+            for key, events in self.selector.select(timeout=min(SUMMARY_INTERVAL, 0.5)):
+                if key.data is None:
+                    self.accept()
+                    continue
+                connection = key.data
+                if events & selectors.EVENT_READ:
+                    self.read(connection)
+                if events & selectors.EVENT_WRITE and connection.sock.fileno() >= 0:
+                    self.flush(connection)
+            now = time.monotonic()
+            if now >= next_summary:
+                next_summary = now + SUMMARY_INTERVAL
+                self.send_summary()
+        self.close()
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+    def accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.selector.register(sock, selectors.EVENT_READ, Connection(sock, f"{address[0]}:{address[1]}"))
+
+    def read(self, connection):
+        try:
+            data = connection.sock.recv(256 * 1024)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.drop(connection)
+            return
+        try:
+            for kind, _, body in connection.reader.feed(data):
+                self.handle(connection, kind, body)
+        except (ValueError, KeyError, TypeError, zlib.error) as e:
+            debugger.log(f"Dropping {connection.address}: {str(e)}", level='warning')
+            self.drop(connection)
+
+    def handle(self, connection, kind, body):
+        if kind == SNAPSHOT and connection.role == 'agent':
+            state = self.hosts[connection.host]
+            if state.decoder.apply(unpack_body(body)):
+                state.last_seen = time.time()
+                frame = None
+                for viewer in list(self.viewers):
+                    if state.name in viewer.subscriptions:
+                        if frame is None:
+                            frame = pack_body(SNAPSHOT, body, state.name)
+                        self.queue(viewer, frame)
+        elif kind == HELLO:
+            hello = unpack_body(body)
+            connection.role = 'agent'
+            connection.host = hello['host']
+            state = self.hosts.get(connection.host)
+            if state is None:
+                state = self.hosts[connection.host] = HostState(connection.host, connection.address, hello.get('cores'))
+            elif state.connection is not None and state.connection is not connection:
+                self.drop(state.connection)
+            state.connection = connection
+            state.address = connection.address
+            state.decoder = DeltaDecoder()
+            debugger.log(f"Agent {connection.host} connected from {connection.address}", level='info')
+        elif kind == SUBSCRIBE:
+            hosts = set(unpack_body(body)['hosts'])
+            connection.role = 'viewer'
+            self.viewers.add(connection)
+            # Newly subscribed hosts start from a keyframe built from the current state
+            for name in hosts - connection.subscriptions:
+                state = self.hosts.get(name)
+                if state is not None and state.decoder.synced:
+                    self.queue(connection, pack_frame(SNAPSHOT, state.decoder.keyframe(), name))
+            connection.subscriptions = hosts
+            self.queue(connection, self.summary_frame())
+
+    def summary_frame(self):
+        return pack_frame(HOSTS, {'hosts': [state.summary() for state in self.hosts.values()]})
+
+    def send_summary(self):
+        if self.viewers:
+            frame = self.summary_frame()
+            for viewer in list(self.viewers):
+                self.queue(viewer, frame)
+
+    def queue(self, connection, frame):
+        if len(connection.outbox) > MAX_PENDING:
+            debugger.log(f"Viewer {connection.address} is too slow, disconnecting", level='warning')
+            self.drop(connection)
+            return
+        connection.outbox += frame
+        if not connection.writing:
+            self.flush(connection)
+
+    def flush(self, connection):
+        try:
+            sent = connection.sock.send(connection.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(connection)
+            return
+        del connection.outbox[:sent]
+        writing = bool(connection.outbox)
+        if writing != connection.writing:
+            connection.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(connection.sock, events, connection)
+
+    def drop(self, connection):
+        if connection.sock.fileno() < 0:
+            return
+        self.selector.unregister(connection.sock)
+        connection.sock.close()
+        self.viewers.discard(connection)
+        if connection.role == 'agent':
+            state = self.hosts.get(connection.host)
+            if state is not None and state.connection is connection:
+                state.connection = None
+                debugger.log(f"Agent {connection.host} disconnected", level='info')
+
+
+class RemoteViewer:
+    # Blocking client for the GUI: yields ('hosts', rows) and ('stats', host, snapshot) events
+    def __init__(self, address):
+        self.address = address
+        self.sock = socket.create_connection(address, timeout=5)
+        self.sock.settimeout(1.0)
+        self.reader = FrameReader()
+        self.decoders = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, hosts):
+        with self.lock:
+            self.sock.sendall(pack_frame(SUBSCRIBE, {'hosts': list(hosts)}))
+
+    def events(self):
+        try:
+            data = self.sock.recv(256 * 1024)
+        except socket.timeout:
+            return
+        if not data:
+            raise ConnectionError("Aggregator closed the connection")
+        for kind, host, body in self.reader.feed(data):
+            payload = unpack_body(body)
+            if kind == HOSTS:
+                yield 'hosts', payload['hosts']
+            elif kind == SNAPSHOT:
+                decoder = self.decoders.get(host)
+                if decoder is None:
+                    decoder = self.decoders[host] = DeltaDecoder()
+                if decoder.apply(payload):
+                    yield 'stats', host, decoder.snapshot()
+
+    def close(self):
+        self.sock.close()
+
+
+def parse_address(text, default_port=DEFAULT_PORT):
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, default_port
+    return host, int(port)
+
+
+def run_agent(address, interval=1.0, name=None, duration=None):
+    collector = SystemMonitor.create_collector()
+    agent = RemoteAgent(address, name).start()
+    collector.add_sink(agent.send)
+    scheduler = TickScheduler(interval)
+    started = time.monotonic()
+    try:
+        while scheduler.wait() and (not duration or time.monotonic() - started < duration):
+            collector.sample()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.close()
+
+
+def run_aggregator(host='127.0.0.1', port=DEFAULT_PORT):
+    aggregator = Aggregator(host, port)
+    debugger.log(f"Aggregator listening on {host}:{aggregator.port}", level='info')
+    if host in ('', '0.0.0.0', '::'):
+        debugger.log("The aggregator accepts agents and viewers from any host, without authentication",
+                     level='warning')
+    try:
+        aggregator.serve()
+    except KeyboardInterrupt:
+        aggregator.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-host system monitoring")
+    commands = parser.add_subparsers(dest='command', required=True)
+    agent = commands.add_parser('agent', help="stream this host's snapshots to an aggregator")
+    agent.add_argument('--server', default=f'127.0.0.1:{DEFAULT_PORT}', help="aggregator host:port")
+    agent.add_argument('--interval', type=float, default=1.0, help="sampling interval in seconds")
+    agent.add_argument('--name', default=None, help="host name to report (default: this host's name)")
+    agent.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    aggregator = commands.add_parser('aggregator', help="collect snapshots from agents and serve viewers")
+    aggregator.add_argument('--host', default='127.0.0.1',
+                            help="address to listen on; 0.0.0.0 accepts agents and viewers from any host, "
+                                 "without authentication")
+    aggregator.add_argument('--port', type=int, default=DEFAULT_PORT, help="port to listen on")
+    args = parser.parse_args()
+    if args.command == 'agent':
+        run_agent(parse_address(args.server), args.interval, args.name, args.duration)
+    else:
+        run_aggregator(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import time
+from array import array
+from bisect import bisect_left
+from history import zeros
+
+# (bucket size in seconds, number of buckets): 10s for a day, 1min for a week, 15min for a month
+ROLLUP_TIERS = ((10, 8640), (60, 10080), (900, 2880))
+STATS = ('min', 'max', 'avg', 'last')
+
+
+class RollupTier:
+    def __init__(self, resolution, capacity, keys):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.keys = tuple(keys)
+        self.starts = zeros('d', capacity)
+        self.counts = zeros('I', capacity)
+        self.columns = {stat: {key: zeros('d', capacity) for key in self.keys} for stat in STATS}
+        self._items = tuple(
+            (key, self.columns['min'][key], self.columns['max'][key],
+             self.columns['avg'][key], self.columns['last'][key])
+            for key in self.keys
+        )
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, timestamp, values):
+        bucket_start = timestamp - timestamp % self.resolution
+        current = (self._head - 1) % self.capacity
+        if self._size and self.starts[current] == bucket_start:
+            count = self.counts[current] + 1
+            self.counts[current] = count
+            for key, minimum, maximum, average, last in self._items:
+                value = values[key]
+                if value < minimum[current]:
+                    minimum[current] = value
+                if value > maximum[current]:
+                    maximum[current] = value
+                average[current] += (value - average[current]) / count
+                last[current] = value
+            return
+
+        slot = self._head
+        self.starts[slot] = bucket_start
+        self.counts[slot] = 1
+        for key, minimum, maximum, average, last in self._items:
+            value = values[key]
+            minimum[slot] = maximum[slot] = average[slot] = last[slot] = value
+        self._head = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def oldest(self):
+        return self.starts[(self._head - self._size) % self.capacity] if self._size else None
+
+    def _position(self, timestamp):
+        # Binary search over the ring in chronological order
+        first = self._head - self._size
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self.starts[(first + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, key, start, end, stat='avg'):
+        column = self.columns[stat][key]
+        first = self._head - self._size
+        timestamps = array('d')
+        values = array('d')
+        for offset in range(self._position(start), self._position(end)):
+            slot = (first + offset) % self.capacity
+            timestamps.append(self.starts[slot])
+            values.append(column[slot])
+        return timestamps, values
+
+
+class Rollup:
+    # The raw HistoryStore acts as the 1s tier; coarser tiers are updated on every sample
+    def __init__(self, history, tiers=ROLLUP_TIERS, raw_resolution=1):
+        self.history = history
+        self.keys = history.keys
+        self.raw_resolution = raw_resolution
+        self.tiers = [RollupTier(resolution, capacity, self.keys) for resolution, capacity in tiers]
+
+    def append(self, stats):
+        self.history.append(stats)
+        timestamp = self.history.latest('timestamp')
+        values = {key: self.history.latest(key) for key in self.keys}
+        for tier in self.tiers:
+            tier.add(timestamp, values)
+
+    def select_tier(self, span, points, end=None):
+        # None stands for the raw history
+        end = time.time() if end is None else end
+        start = end - span
+        wanted = span / max(points, 1)
+        candidates = [(self.raw_resolution, self.history.oldest('timestamp'),
+                       len(self.history) == self.history.capacity, None)]
+        candidates += [(tier.resolution, tier.oldest(), len(tier) == tier.capacity, tier) for tier in self.tiers]
+        candidates = [candidate for candidate in candidates if candidate[1] is not None]
+        if not candidates:
+            return None
+
+        # A tier that has not wrapped yet still holds everything ever recorded
+        reaching = [candidate for candidate in candidates if not candidate[2] or candidate[1] <= start]
+        if not reaching:
+            return candidates[-1][3]
+        fine_enough = [candidate for candidate in reaching if candidate[0] <= wanted]
+        return fine_enough[-1][3] if fine_enough else reaching[0][3]
+
+    def query(self, key, span, points, stat='avg', end=None):
+        end = time.time() if end is None else end
+        tier = self.select_tier(span, points, end)
+        if tier is not None:
+            return tier.query(key, end - span, end + tier.resolution, stat)
+        timestamps = self.history.tail('timestamp')
+        first = bisect_left(timestamps, end - span)
+        return timestamps[first:], self.history.tail(key)[first:]
+
+    def columns(self, span, points, end=None):
+        # Copies of the selected tier's columns, keyed like the history ('timestamp' plus metric keys)
+        end = time.time() if end is None else end
+        tier = self.select_tier(span, points, end)
+        columns = {}
+        if tier is None:
+            timestamps = self.history.tail('timestamp')
+            first = bisect_left(timestamps, end - span)
+            columns['timestamp'] = timestamps[first:]
+            for key in self.keys:
+                columns[key] = self.history.tail(key)[first:]
+            return columns
+        for key in self.keys:
+            columns['timestamp'], columns[key] = tier.query(key, end - span, end + tier.resolution)
+        return columns
+
+    def rows(self, span, points, end=None):
+        columns = self.columns(span, points, end)
+        for index, timestamp in enumerate(columns['timestamp']):
+            row = {'timestamp': timestamp}
+            for key in self.keys:
+                row[key] = columns[key][index]
+            yield row
@@ -0,0 +1,119 @@
+import time
+import threading
+from instrumentation import instruments
+
+# Adaptive mode: CPU usage above SPIKE_PERCENT, or a jump of SPIKE_DELTA points between samples,
+# drops to the fastest interval; IDLE_TICKS quiet samples below IDLE_PERCENT double it again
+SPIKE_PERCENT = 70.0
+SPIKE_DELTA = 20.0
+IDLE_PERCENT = 10.0
+IDLE_TICKS = 10
+
+
+class TickScheduler:
+    # Ticks land on fixed monotonic deadlines (start + n * interval), so the time spent sampling
+    # does not shift later ticks. Ticks that could not run on time are counted and skipped rather
+    # than fired in a burst. All setters may be called from any thread and wake a waiting tick.
+    def __init__(self, interval=1.0, adaptive=False, min_interval=None, max_interval=None):
+        self.condition = threading.Condition()
+        self.interval = interval
+        self.adaptive = adaptive
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.current = interval
+        self.hidden = False
+        self.stopped = False
+        self.deadline = None
+        self.missed = 0
+        self.ticks = 0
+        self._quiet = 0
+        self._last_cpu = None
+
+    def bounds(self):
+        low = self.min_interval if self.min_interval is not None else max(self.interval / 4, 0.25)
+        high = self.max_interval if self.max_interval is not None else self.interval * 8
+        return low, high
+
+    def set_interval(self, seconds):
+        with self.condition:
+            self.interval = seconds
+            self.current = seconds
+            self._reschedule()
+
+    def set_adaptive(self, enabled):
+        with self.condition:
+            self.adaptive = enabled
+            if not enabled:
+                self.current = self.interval
+            self._reschedule()
+
+    def set_hidden(self, hidden):
+        # A hidden window needs no fast updates; adaptive mode falls back to the slowest interval
+        with self.condition:
+            if hidden == self.hidden:
+                return
+            self.hidden = hidden
+            if self.adaptive:
+                self.current = self.bounds()[1] if hidden else self.interval
+                self._reschedule()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def _reschedule(self):
+        if self.deadline is not None:
+            self.deadline = min(self.deadline, time.monotonic() + self.current)
+        self.condition.notify_all()
+
+    def wait(self):
+        # Blocks until the next tick is due; False once stopped
+        with self.condition:
+            now = time.monotonic()
+            if self.deadline is None:
+                self.deadline = now
+            while not self.stopped:
+                delay = self.deadline - time.monotonic()
+                if delay <= 0:
+                    break
+                self.condition.wait(delay)
+            if self.stopped:
+                return False
+            now = time.monotonic()
+            late = now - self.deadline
+            if late >= self.current:
+                missed = int(late // self.current)
+                self.missed += missed
+                self.deadline += missed * self.current
+                if __debug__:
+                    if instruments.enabled:
+                        instruments.count('missed_ticks', missed)
+            self.deadline += self.current
+            self.ticks += 1
+            return True
+
+    def observe(self, stats):
+        # Adaptive mode: tighten on spikes, stretch when the machine is idle
+        if not self.adaptive or self.hidden:
+            return
+        cpu = stats.get('CPU Usage (%)')
+        if cpu is None:
+            return
+        low, high = self.bounds()
+        jump = self._last_cpu is not None and abs(cpu - self._last_cpu) >= SPIKE_DELTA
+        self._last_cpu = cpu
+        with self.condition:
+            if cpu >= SPIKE_PERCENT or jump:
+                self._quiet = 0
+                if self.current != low:
+                    self.current = low
+                    self._reschedule()
+            elif cpu < IDLE_PERCENT:
+                self._quiet += 1
+                if self._quiet >= IDLE_TICKS and self.current < high:
+                    self._quiet = 0
+                    self.current = min(max(self.current, self.interval) * 2, high)
+            else:
+                self._quiet = 0
+                self.current = self.interval
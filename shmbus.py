@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import time
+import struct
+from array import array
+from monitor import SCALAR_KEYS
+from proc_scanner import ProcessTable, NO_UID
+from debugger import debugger
+
+DEFAULT_NAME = os.environ.get('SYSTEM_MONITOR_BUS', 'xmonitor')
+MAGIC = b'XMSB'
+VERSION = 3
+# magic, version, slot count, slot size, core count, scalar count, process area size, samples published
+HEADER = struct.Struct('<4sIIIIIIxxxxQ')
+HEADER_SIZE = 4096
+PUBLISHED_OFFSET = HEADER.size - 8
+# sequence, length of the JSON part; the doubles start right after
+SLOT_HEADER = struct.Struct('<QIxxxx')
+# sequence, sample number of the scan, row count, name bytes
+PROCESS_HEADER = struct.Struct('<QQII')
+# Smallest JSON area per slot; SnapshotBus.create sizes it from a real snapshot with extras_size
+EXTRA_BYTES = 16 * 1024
+PROCESS_BYTES = 8 * 1024**2
+# A segment already under the bus name is only taken over when no sample was published to it for
+# this many seconds; a running collector publishes one every interval
+STALE_AFTER = float(os.environ.get('SYSTEM_MONITOR_BUS_STALE_AFTER', 3.0))
+PROCESS_COLUMNS = (('pids', 'i'), ('ppids', 'i'), ('cpu', 'f'), ('memory', 'f'), ('rss', 'Q'), ('threads', 'I'),
+                   ('io', 'Q'), ('uids', 'I'))
+PROCESS_ROW_BYTES = sum(array(typecode).itemsize for _, typecode in PROCESS_COLUMNS)
+# Non-scalar values that travel as JSON next to the doubles
+EXTRA_KEYS = ('RAM Details', 'Disk Devices', 'Network Interfaces', 'Disk Device Rates', 'Network Interface Rates',
+              'Cgroups')
+# What goes, in this order, when a snapshot's extras still do not fit: the per-device and
+# per-interface maps, then the cgroups' pid lists, then the cgroups. RAM Details always stays.
+OVERFLOW_ORDER = ('Disk Devices', 'Network Interfaces', 'Disk Device Rates', 'Network Interface Rates', 'pids',
+                  'Cgroups')
+
+
+def encode_extras(stats):
+    extras = {key: stats[key] for key in EXTRA_KEYS if key in stats}
+    extras['updated_probes'] = list(stats.get('updated_probes', ()))
+    return extras, json.dumps(extras, separators=(',', ':')).encode()
+
+
+def extras_size(stats):
+    # JSON area for snapshots like `stats`, with room for the rate maps (empty in a first sample)
+    # and for devices, interfaces and cgroups that appear later
+    return max(EXTRA_BYTES, (4 * len(encode_extras(stats)[1]) + 4095) & ~4095)
+
+
+class SnapshotBus:
+    # Single-writer ring of snapshots in shared memory. Every slot (and the process area) is guarded
+    # by a seqlock: the writer makes the sequence odd, writes, then makes it even again, and readers
+    # retry whenever the sequence was odd or changed while they copied.
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.buffer = shm.buf
+        magic, version, self.slots, self.slot_size, self.core_count, scalar_count, self.process_bytes, _ = \
+            HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} is not a snapshot bus")
+        layout_length, = struct.unpack_from('<I', self.buffer, HEADER.size)
+        self.keys = tuple(json.loads(bytes(self.buffer[HEADER.size + 4:HEADER.size + 4 + layout_length])))
+        if len(self.keys) != scalar_count:
+            raise ValueError(f"{shm.name} has a corrupt layout")
+        self.value_count = 1 + scalar_count + self.core_count
+        self.extra_bytes = self.slot_size - SLOT_HEADER.size - 8 * self.value_count
+        self._overflowed = False
+        self.slots_offset = HEADER_SIZE
+        self.process_offset = HEADER_SIZE + self.slots * self.slot_size
+        self.last_read = 0
+        self._process_sample = None
+        self._process_table = None
+
+    @classmethod
+    def create(cls, name=DEFAULT_NAME, core_count=0, slots=600, keys=SCALAR_KEYS, process_bytes=PROCESS_BYTES,
+               extra_bytes=EXTRA_BYTES):
+        value_count = 1 + len(keys) + core_count
+        from multiprocessing import shared_memory
+        slot_size = (SLOT_HEADER.size + 8 * value_count + max(extra_bytes, EXTRA_BYTES) + 63) & ~63
+        size = HEADER_SIZE + slots * slot_size + PROCESS_HEADER.size + process_bytes
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            cls._reclaim(name)
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        layout = json.dumps(list(keys)).encode()
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, slot_size, core_count, len(keys), process_bytes, 0)
+        struct.pack_into(f'<I{len(layout)}s', shm.buf, HEADER.size, len(layout), layout)
+        debugger.log(f"Snapshot bus {name} created ({size // 1024} KB)", level='info')
+        return cls(shm, owner=True)
+
+    @classmethod
+    def _reclaim(cls, name):
+        # Removes a segment left behind by a collector that did not shut down cleanly; one that is
+        # still being published to, or that is not a snapshot bus at all, is left alone
+        from multiprocessing import shared_memory, resource_tracker
+        existing = shared_memory.SharedMemory(name)
+        try:
+            bus = cls(existing, owner=False)
+        except ValueError:
+            bus = None
+        live = False
+        if bus is not None:
+            published = bus.published()
+            deadline = time.monotonic() + STALE_AFTER
+            while not live and time.monotonic() < deadline:
+                time.sleep(0.1)
+                live = bus.published() != published
+            bus.close()
+        else:
+            existing.close()
+        if bus is None or live:
+            # Not ours to remove, and the resource tracker must not remove it when this process exits
+            resource_tracker.unregister(existing._name, 'shared_memory')
+            reason = "a running collector is publishing to it" if live else "it is not a snapshot bus"
+            raise FileExistsError(f"Shared memory {name} is in use ({reason}); pick another name with --bus")
+        debugger.log(f"Removing the stale snapshot bus {name}", level='warning')
+        existing.unlink()
+
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME):
+        from multiprocessing import shared_memory, resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        # Readers must not unlink the segment when they exit (the resource tracker would on Python < 3.13)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        try:
+            return cls(shm, owner=False)
+        except ValueError:
+            shm.close()
+            raise
+
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def published(self):
+        return struct.unpack_from('<Q', self.buffer, PUBLISHED_OFFSET)[0]
+
+    def _slot_offset(self, sample):
+        return self.slots_offset + (sample - 1) % self.slots * self.slot_size
+
+    # Writer
+
+    def publish(self, stats):
+        buffer = self.buffer
+        sample = self.published() + 1
+        offset = self._slot_offset(sample)
+        values = [stats.get('timestamp') or time.time()]
+        values.extend(stats.get(key, float('nan')) for key in self.keys)
+        cores = list(stats.get('CPU Core Usage') or ())[:self.core_count]
+        values.extend(cores + [float('nan')] * (self.core_count - len(cores)))
+        extras, encoded = encode_extras(stats)
+        for step in OVERFLOW_ORDER:
+            if len(encoded) <= self.extra_bytes:
+                break
+            if step == 'pids':
+                if 'Cgroups' in extras:
+                    extras['Cgroups'] = {path: {key: value for key, value in cgroup.items() if key != 'pids'}
+                                         for path, cgroup in extras['Cgroups'].items()}
+            elif extras.pop(step, None) is None:
+                continue
+            encoded = json.dumps(extras, separators=(',', ':')).encode()
+            if not self._overflowed:
+                self._overflowed = True
+                debugger.log(f"Snapshot extras exceed the bus slot ({self.extra_bytes} bytes); dropping {step}",
+                             level='warning')
+
+        struct.pack_into('<Q', buffer, offset, 2 * sample - 1)
+        values_offset = offset + SLOT_HEADER.size
+        struct.pack_into('<I', buffer, offset + 8, len(encoded))
+        struct.pack_into(f'<{self.value_count}d', buffer, values_offset, *values)
+        extra_offset = values_offset + 8 * self.value_count
+        buffer[extra_offset:extra_offset + len(encoded)] = encoded
+        struct.pack_into('<Q', buffer, offset, 2 * sample)
+
+        processes = stats.get('processes')
+        if processes is not None and 'processes' in stats.get('updated_probes', ('processes',)):
+            self._publish_processes(sample, processes)
+        struct.pack_into('<Q', buffer, PUBLISHED_OFFSET, sample)
+
+    def _publish_processes(self, sample, processes):
+        if not hasattr(processes, 'pids'):
+            table = ProcessTable()
+            for p in processes:
+                table.append(p['pid'], p['ppid'] or 0, p['name'] or '', p['cpu_percent'] or 0.0,
+                             p['memory_percent'] or 0.0, p['rss'] or 0, p['num_threads'] or 0, p.get('io_bytes', 0),
+                             p.get('uid', NO_UID))
+            processes = table
+        names = '\0'.join(processes.names).encode('utf-8', 'replace')
+        rows = len(processes)
+        if rows * PROCESS_ROW_BYTES + len(names) > self.process_bytes:
+            debugger.log(f"Process table of {rows} rows does not fit the snapshot bus", level='warning')
+            return
+        buffer = self.buffer
+        offset = self.process_offset
+        sequence = struct.unpack_from('<Q', buffer, offset)[0]
+        struct.pack_into('<Q', buffer, offset, sequence + 1)
+        position = offset + PROCESS_HEADER.size
+        for attribute, _ in PROCESS_COLUMNS:
+            column = getattr(processes, attribute).tobytes()
+            buffer[position:position + len(column)] = column
+            position += len(column)
+        buffer[position:position + len(names)] = names
+        struct.pack_into('<QII', buffer, offset + 8, sample, rows, len(names))
+        struct.pack_into('<Q', buffer, offset, sequence + 2)
+
+    # Readers
+
+    def read(self, sample):
+        # Copy of one sample, or None once the writer has reused its slot
+        buffer = self.buffer
+        offset = self._slot_offset(sample)
+        values_offset = offset + SLOT_HEADER.size
+        for _ in range(100):
+            sequence = struct.unpack_from('<Q', buffer, offset)[0]
+            if sequence > 2 * sample:
+                return None
+            if sequence != 2 * sample:
+                time.sleep(0)
+                continue
+            extra_length = struct.unpack_from('<I', buffer, offset + 8)[0]
+            values = struct.unpack_from(f'<{self.value_count}d', buffer, values_offset)
+            extra_offset = values_offset + 8 * self.value_count
+            encoded = bytes(buffer[extra_offset:extra_offset + min(extra_length, self.extra_bytes)])
+            if struct.unpack_from('<Q', buffer, offset)[0] == sequence:
+                break
+        else:
+            return None
+        stats = dict(zip(self.keys, values[1:]))
+        stats['timestamp'] = values[0]
+        stats['CPU Core Usage'] = list(values[1 + len(self.keys):])
+        extras = json.loads(encoded)
+        stats['updated_probes'] = tuple(extras.pop('updated_probes'))
+        stats.update(extras)
+        return stats
+
+    def values(self, sample):
+        # Zero-copy view of a slot's doubles (timestamp, scalars, cores); check `read_valid` after use
+        offset = self._slot_offset(sample) + SLOT_HEADER.size
+        return self.buffer[offset:offset + 8 * self.value_count].cast('d')
+
+    def read_valid(self, sample):
+        return struct.unpack_from('<Q', self.buffer, self._slot_offset(sample))[0] == 2 * sample
+
+    def processes(self):
+        # The table object is reused until the writer publishes a newer scan
+        buffer = self.buffer
+        offset = self.process_offset
+        for _ in range(100):
+            sequence, sample, rows, name_bytes = PROCESS_HEADER.unpack_from(buffer, offset)
+            if sequence & 1:
+                time.sleep(0)
+                continue
+            if sample == self._process_sample:
+                return self._process_table
+            table = ProcessTable()
+            position = offset + PROCESS_HEADER.size
+            for attribute, typecode in PROCESS_COLUMNS:
+                column = array(typecode)
+                column.frombytes(buffer[position:position + rows * column.itemsize])
+                setattr(table, attribute, column)
+                position += rows * column.itemsize
+            names = bytes(buffer[position:position + name_bytes])
+            if struct.unpack_from('<Q', buffer, offset)[0] != sequence:
+                continue
+            table.names = names.decode('utf-8', 'replace').split('\0') if rows else []
+            self._process_sample = sample
+            self._process_table = table
+            return table
+        return self._process_table
+
+    def latest(self):
+        while True:
+            sample = self.published()
+            if not sample:
+                return None
+            stats = self.read(sample)
+            if stats is not None:
+                self.last_read = sample
+                stats['processes'] = self.processes()
+                return stats
+
+    def recent(self, count):
+        newest = self.published()
+        samples = (self.read(sample) for sample in range(max(1, newest - count + 1), newest + 1))
+        return [stats for stats in samples if stats is not None]
+
+
+class BusSource:
+    # Stands in for a Collector when a collector process already publishes to the bus
+    def __init__(self, bus, timeout=5.0):
+        self.bus = bus
+        self.timeout = timeout
+        self.sinks = ()
+
+    def add_sink(self, sink):
+        self.sinks = self.sinks + (sink,)
+
+    def remove_sink(self, sink):
+        self.sinks = tuple(s for s in self.sinks if s != sink)
+
+    def sample(self, force=False):
+        # Blocks until a sample newer than the last one returned; None when the collector published
+        # nothing within `timeout`, so a stalled collector does not hand the same snapshot out twice
+        deadline = time.monotonic() + self.timeout
+        while self.bus.published() <= self.bus.last_read:
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.02)
+        snapshot = self.bus.latest()
+        if snapshot is None:
+            return None
+        for sink in self.sinks:
+            try:
+                sink(snapshot)
+            except Exception as e:
+                debugger.log(f"Snapshot sink failed: {str(e)}", level='error')
+        return snapshot
+
+
+def attach_source(name=DEFAULT_NAME):
+    # A BusSource when a collector publishes under `name`, otherwise None
+    if sys.platform.startswith('linux') and not os.path.exists(f'/dev/shm/{name}'):
+        # Cheap check first, so readers without a collector never import multiprocessing
+        return None
+    try:
+        bus = SnapshotBus.attach(name)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not bus.published():
+        bus.close()
+        return None
+    debugger.log(f"Reading snapshots from bus {name}", level='info')
+    return BusSource(bus)
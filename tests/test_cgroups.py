@@ -0,0 +1,118 @@
+import cgroups
+from cgroups import CgroupScanner, find_root, short_name, render_metrics
+
+DOCKER_ID = '0123456789abcdef' * 4
+CONTAINER = f'system.slice/docker-{DOCKER_ID}.scope'
+
+
+def write_cgroup(root, path, usage_usec, pids, memory=None, anon=0, file=0, io=None):
+    directory = root / path
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / 'cpu.stat').write_text(f'usage_usec {usage_usec}\nuser_usec 0\nsystem_usec 0\n')
+    (directory / 'cgroup.procs').write_text(''.join(f'{pid}\n' for pid in pids))
+    if memory is not None:
+        (directory / 'memory.current').write_text(f'{memory}\n')
+        (directory / 'memory.stat').write_text(f'anon {anon}\nfile {file}\nkernel 0\n')
+    if io is not None:
+        (directory / 'io.stat').write_text(''.join(
+            f'{device} rbytes={read} wbytes={written} rios=1 wios=1 dbytes=0 dios=0\n'
+            for device, (read, written) in io.items()))
+
+
+def fake_tree(root, container_usage=2_000_000, container_io=((100, 200), (1000, 2000))):
+    (root / 'cgroup.controllers').write_text('cpu io memory pids\n')
+    write_cgroup(root, 'system.slice', 5_000_000, [1], memory=4096, anon=1024, file=2048)
+    write_cgroup(root, CONTAINER, container_usage, [100, 101], memory=8192, anon=4096, file=4096,
+                 io={'8:0': container_io[0], '8:16': container_io[1]})
+    # No memory or io controller enabled here
+    write_cgroup(root, 'user.slice', 1_000_000, [])
+
+
+def test_find_root(tmp_path):
+    assert find_root(str(tmp_path)) is None
+    fake_tree(tmp_path)
+    assert find_root(str(tmp_path)) == str(tmp_path)
+
+
+def test_short_name():
+    assert short_name(CONTAINER) == 'docker-0123456789ab'
+    assert short_name('user.slice/user-1000.slice') == 'user-1000.slice'
+
+
+def test_nested_paths_parents_first(tmp_path):
+    fake_tree(tmp_path)
+    paths = CgroupScanner(str(tmp_path)).list_cgroups()
+    assert sorted(paths) == sorted(['system.slice', CONTAINER, 'user.slice'])
+    assert paths.index('system.slice') < paths.index(CONTAINER)
+
+
+def test_scan_totals(tmp_path):
+    fake_tree(tmp_path)
+    stats = CgroupScanner(str(tmp_path)).scan()
+    container = stats[CONTAINER]
+    assert container['cpu_seconds'] == 2.0
+    assert container['memory'] == 8192
+    assert (container['anon'], container['file']) == (4096, 4096)
+    # io.stat is summed over devices
+    assert (container['read_bytes'], container['write_bytes']) == (1100, 2200)
+    assert container['pids'] == [100, 101]
+    assert container['processes'] == 2
+    # Without the controllers the values are zero rather than missing
+    user = stats['user.slice']
+    assert (user['memory'], user['read_bytes'], user['processes']) == (0, 0, 0)
+    # The first scan has nothing to compare against
+    assert container['cpu_percent'] == 0.0 and container['read_rate'] == 0.0
+
+
+def test_scan_rates(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cgroups.time, 'monotonic', lambda: now[0])
+    fake_tree(tmp_path)
+    scanner = CgroupScanner(str(tmp_path))
+    scanner.scan()
+    # Two seconds later: one more CPU second and 4000 more bytes read, 2000 more written
+    now[0] += 2.0
+    fake_tree(tmp_path, container_usage=3_000_000, container_io=((2100, 1200), (3000, 3000)))
+    container = scanner.scan()[CONTAINER]
+    assert container['cpu_percent'] == 50.0
+    assert container['read_rate'] == 2000.0
+    assert container['write_rate'] == 1000.0
+
+
+def test_counter_reset_is_not_negative(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cgroups.time, 'monotonic', lambda: now[0])
+    fake_tree(tmp_path)
+    scanner = CgroupScanner(str(tmp_path))
+    scanner.scan()
+    now[0] += 1.0
+    # Recreated under the same name: the counters start again
+    fake_tree(tmp_path, container_usage=10, container_io=((0, 0), (0, 0)))
+    container = scanner.scan()[CONTAINER]
+    assert container['cpu_percent'] == 0.0
+    assert container['read_rate'] == 0.0 and container['write_rate'] == 0.0
+
+
+def test_vanished_cgroup_forces_relist(tmp_path):
+    fake_tree(tmp_path)
+    scanner = CgroupScanner(str(tmp_path), rescan_interval=3600)
+    assert CONTAINER in scanner.scan()
+    for name in ('cpu.stat', 'cgroup.procs', 'memory.current', 'memory.stat', 'io.stat'):
+        (tmp_path / CONTAINER / name).unlink()
+    (tmp_path / CONTAINER).rmdir()
+    assert CONTAINER not in scanner.scan()
+    assert scanner.listed_at is None
+    scanner.scan()
+    assert CONTAINER not in scanner.paths
+
+
+def test_render_metrics(tmp_path):
+    fake_tree(tmp_path)
+    lines = []
+    render_metrics(lines, {'Cgroups': CgroupScanner(str(tmp_path)).scan()})
+    assert f'xmonitor_cgroup_memory_bytes{{cgroup="{CONTAINER}"}} 8192' in lines
+    assert f'xmonitor_cgroup_cpu_seconds_total{{cgroup="{CONTAINER}"}} 2.0' in lines
+    assert f'xmonitor_cgroup_processes{{cgroup="{CONTAINER}"}} 2' in lines
+    empty = []
+    render_metrics(empty, {})
+    assert empty == []
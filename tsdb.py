@@ -0,0 +1,225 @@
+import os
+import glob
+import json
+import mmap
+import struct
+from array import array
+
+MAGIC = b'XMTS'
+VERSION = 1
+HEADER_SIZE = 4096
+# magic, version, record size, core count, header JSON length
+HEADER_PREFIX = struct.Struct('<4sIIII')
+SEGMENT_PATTERN = 'samples-*.tsdb'
+
+
+def _segment_name(directory, timestamp):
+    return os.path.join(directory, f'samples-{int(timestamp * 1000):015d}.tsdb')
+
+
+class TimeSeriesWriter:
+    # Append-only segments of fixed-size records: timestamp, scalar keys, then one value per core
+    def __init__(self, directory, keys, core_count=0, segment_bytes=64 * 1024**2, max_bytes=1024**3):
+        self.directory = directory
+        self.keys = tuple(keys)
+        self.core_count = core_count
+        self.record = struct.Struct('<' + 'd' * (1 + len(self.keys) + core_count))
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self._file = None
+        self._segment_size = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _header(self):
+        layout = json.dumps({'keys': self.keys, 'core_count': self.core_count}).encode('utf-8')
+        header = HEADER_PREFIX.pack(MAGIC, VERSION, self.record.size, self.core_count, len(layout)) + layout
+        if len(header) > HEADER_SIZE:
+            raise ValueError('too many metrics for the file header')
+        return header.ljust(HEADER_SIZE, b'\0')
+
+    def _open_segment(self, timestamp):
+        self.close()
+        self._enforce_cap()
+        self._file = open(_segment_name(self.directory, timestamp), 'wb')
+        self._file.write(self._header())
+        self._segment_size = HEADER_SIZE
+
+    def _enforce_cap(self):
+        # Make room for one more full segment by deleting the oldest ones
+        segments = sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+        sizes = [os.path.getsize(segment) for segment in segments]
+        total = sum(sizes)
+        for segment, size in zip(segments, sizes):
+            if total + self.segment_bytes <= self.max_bytes:
+                break
+            os.remove(segment)
+            total -= size
+
+    def append(self, stats):
+        timestamp = stats['timestamp']
+        if self._file is None or self._segment_size + self.record.size > self.segment_bytes:
+            self._open_segment(timestamp)
+        values = [timestamp]
+        values.extend(float('nan') if stats.get(key) is None else stats[key] for key in self.keys)
+        if self.core_count:
+            cores = list(stats.get('CPU Core Usage') or ())[:self.core_count]
+            values.extend(cores + [float('nan')] * (self.core_count - len(cores)))
+        self._file.write(self.record.pack(*values))
+        self._file.flush()
+        self._segment_size += self.record.size
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TimeSeriesSegment:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        magic, version, record_size, core_count, layout_size = HEADER_PREFIX.unpack_from(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a time-series file')
+        layout = json.loads(header[HEADER_PREFIX.size:HEADER_PREFIX.size + layout_size])
+        self.keys = tuple(layout['keys'])
+        self.core_count = core_count
+        self.record = struct.Struct('<' + 'd' * (1 + len(self.keys) + core_count))
+        if self.record.size != record_size:
+            raise ValueError(f'{path} has an inconsistent record layout')
+        self._file = None
+        self._map = None
+        self.size = None
+        self.count = 0
+        self.refresh()
+
+    def refresh(self):
+        # Re-map to pick up records appended by a running writer
+        size = os.path.getsize(self.path)
+        if size == self.size:
+            return
+        self.close()
+        self.size = size
+        self.count = (size - HEADER_SIZE) // self.record.size
+        if self.count:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def timestamp(self, index):
+        return struct.unpack_from('<d', self._map, HEADER_SIZE + index * self.record.size)[0]
+
+    def values(self, index):
+        return self.record.unpack_from(self._map, HEADER_SIZE + index * self.record.size)
+
+    def find(self, timestamp):
+        # Index of the first record at or after `timestamp`
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+
+class TimeSeriesReader:
+    def __init__(self, path):
+        self.directory = path if os.path.isdir(path) else None
+        if self.directory:
+            paths = sorted(glob.glob(os.path.join(path, SEGMENT_PATTERN)))
+        else:
+            paths = [path]
+        self.segments = [TimeSeriesSegment(segment_path) for segment_path in paths]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    @property
+    def keys(self):
+        return self.segments[-1].keys if self.segments else ()
+
+    @property
+    def core_count(self):
+        return self.segments[-1].core_count if self.segments else 0
+
+    def refresh(self):
+        if self.directory:
+            for segment in self.segments:
+                if not os.path.exists(segment.path):
+                    segment.close()
+            self.segments = [segment for segment in self.segments if os.path.exists(segment.path)]
+            known = {segment.path for segment in self.segments}
+            for path in sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN))):
+                if path not in known:
+                    self.segments.append(TimeSeriesSegment(path))
+        for segment in self.segments:
+            segment.refresh()
+
+    def first_timestamp(self):
+        for segment in self.segments:
+            if len(segment):
+                return segment.timestamp(0)
+        return None
+
+    def last_timestamp(self):
+        for segment in reversed(self.segments):
+            if len(segment):
+                return segment.timestamp(len(segment) - 1)
+        return None
+
+    def records(self, start=None, end=None):
+        for segment in self.segments:
+            if not len(segment):
+                continue
+            if end is not None and segment.timestamp(0) > end:
+                break
+            index = segment.find(start) if start is not None else 0
+            keys = segment.keys
+            key_count = len(keys)
+            while index < len(segment):
+                values = segment.values(index)
+                if end is not None and values[0] > end:
+                    return
+                record = {'timestamp': values[0]}
+                record.update(zip(keys, values[1:key_count + 1]))
+                if segment.core_count:
+                    record['CPU Core Usage'] = list(values[key_count + 1:])
+                yield record
+                index += 1
+
+    def query(self, key, span, points, stat='avg', end=None):
+        # Same interface as Rollup.query: evenly strided raw records, at most about 2 * points of them
+        end = self.last_timestamp() if end is None else end
+        ranges = []
+        for segment in self.segments:
+            if key in segment.keys and len(segment):
+                first, last = segment.find(end - span), segment.find(end + 1e-6)
+                if first < last:
+                    ranges.append((segment, first, last))
+        total = sum(last - first for _, first, last in ranges)
+        stride = max(1, total // max(2 * points, 1))
+        timestamps = array('d')
+        values = array('d')
+        for segment, first, last in ranges:
+            column = segment.keys.index(key) + 1
+            for index in range(first, last, stride):
+                record = segment.values(index)
+                timestamps.append(record[0])
+                values.append(record[column])
+        return timestamps, values
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
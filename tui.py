@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import heapq
+import select
+import argparse
+
+# Only the standard library is imported up front; psutil and the collector are loaded in main(),
+# and PyQt5 never is
+
+BLOCKS = ' ▁▂▃▄▅▆▇█'
+# key -> (ProcessTable column, label)
+SORT_KEYS = {
+    'c': ('cpu', 'CPU%'),
+    'm': ('memory', 'MEM%'),
+    'r': ('rss', 'RSS'),
+    't': ('threads', 'THR'),
+    'p': ('pids', 'PID'),
+    'n': ('names', 'NAME'),
+}
+
+
+class TerminalScreen:
+    # Keeps the last frame and rewrites only the changed part of each changed row
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.rows = []
+        self.size = None
+        self.bytes_written = 0
+
+    def __enter__(self):
+        # Alternate screen, hidden cursor
+        self.out.write('\033[?1049h\033[?25l')
+        return self
+
+    def __exit__(self, *exc):
+        self.out.write('\033[?25h\033[?1049l')
+        self.out.flush()
+
+    def draw(self, lines):
+        size = terminal_size()
+        parts = []
+        if size != self.size:
+            self.size = size
+            self.rows = []
+            parts.append('\033[2J')
+        width, height = size
+        rows = [line[:width] for line in lines[:height]]
+        previous = self.rows
+        for number, row in enumerate(rows):
+            old = previous[number] if number < len(previous) else ''
+            if row == old:
+                continue
+            column = 0
+            limit = min(len(row), len(old))
+            while column < limit and row[column] == old[column]:
+                column += 1
+            parts.append(f'\033[{number + 1};{column + 1}H{row[column:]}')
+            if len(row) < len(old):
+                parts.append('\033[K')
+        for number in range(len(rows), len(previous)):
+            parts.append(f'\033[{number + 1};1H\033[K')
+        self.rows = rows
+        if parts:
+            frame = ''.join(parts)
+            self.bytes_written += len(frame)
+            self.out.write(frame)
+            self.out.flush()
+
+
+class KeyReader:
+    # Single key presses without echo; a no-op when stdin is not a terminal
+    def __init__(self, stream=sys.stdin):
+        self.stream = stream
+        self.saved = None
+
+    def __enter__(self):
+        try:
+            import termios
+            import tty
+            self.fd = self.stream.fileno()
+            self.saved = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+        except (ImportError, OSError, ValueError, AttributeError):
+            self.saved = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.saved is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+
+    def wait(self, timeout):
+        # Keys pressed within `timeout` seconds
+        if self.saved is None:
+            time.sleep(max(timeout, 0))
+            return ''
+        ready, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        return os.read(self.fd, 32).decode(errors='ignore') if ready else ''
+
+
+def terminal_size():
+    try:
+        return os.get_terminal_size(sys.stdout.fileno())
+    except (OSError, ValueError):
+        return os.terminal_size((80, 24))
+
+
+def bar(percent, width):
+    filled = int(round(min(max(percent, 0), 100) / 100 * width))
+    return '[' + '|' * filled + ' ' * (width - filled) + ']'
+
+
+def human_bytes(value):
+    for unit in ('B', 'K', 'M', 'G', 'T'):
+        if value < 1024 or unit == 'T':
+            return f"{value:.0f}{unit}" if unit == 'B' else f"{value:.1f}{unit}"
+        value /= 1024
+
+
+class TopView:
+    def __init__(self, top=20, sort='c', interval=1.0, source_name='local'):
+        self.top = top
+        self.sort = sort
+        self.descending = True
+        self.interval = interval
+        self.source_name = source_name
+
+    def handle_key(self, key):
+        # True to quit
+        if key in ('q', '\x03'):
+            return True
+        if key in SORT_KEYS:
+            if key == self.sort:
+                self.descending = not self.descending
+            else:
+                self.sort = key
+                self.descending = key not in ('p', 'n')
+        elif key == 'i':
+            self.descending = not self.descending
+        elif key in ('+', '='):
+            self.top += 5
+        elif key == '-':
+            self.top = max(5, self.top - 5)
+        return False
+
+    def process_rows(self, processes, count):
+        if processes is None or not len(processes):
+            return []
+        column_name = SORT_KEYS[self.sort][0]
+        column = getattr(processes, column_name)
+        pick = heapq.nlargest if self.descending else heapq.nsmallest
+        order = pick(count, range(len(processes)), key=column.__getitem__)
+        names = processes.names
+        return [f"{processes.pids[i]:>7} {processes.cpu[i]:>6.1f} {processes.memory[i]:>6.1f} "
+                f"{human_bytes(processes.rss[i]):>7} {processes.threads[i]:>4}  {names[i]}" for i in order]
+
+    def render(self, stats, width, height):
+        bar_width = max(10, min(50, width - 30))
+        lines = [
+            f"X-Monitor  {time.strftime('%H:%M:%S')}  every {self.interval:g}s  source: {self.source_name}",
+            f"CPU {bar(stats['CPU Usage (%)'], bar_width)} {stats['CPU Usage (%)']:5.1f}%",
+        ]
+        cores = stats.get('CPU Core Usage') or ()
+        if cores:
+            cells = ''.join(BLOCKS[min(8, int(usage / 100 * 8 + 0.5))] for usage in cores)
+            per_row = max(width - 6, 8)
+            for start in range(0, len(cells), per_row):
+                lines.append(f"{'CORE' if not start else '':4}  {cells[start:start + per_row]}")
+        lines.append(f"MEM {bar(stats['RAM Usage (%)'], bar_width)} {stats['RAM Usage (%)']:5.1f}%  "
+                     f"{stats['RAM Used (GB)']:.1f}/{stats['RAM Total (GB)']:.1f} GB")
+        if 'Disk Usage (%)' in stats:
+            lines.append(f"DSK {bar(stats['Disk Usage (%)'], bar_width)} {stats['Disk Usage (%)']:5.1f}%  "
+                         f"read {stats.get('Disk Read (MB/s)', 0):.2f} MB/s  "
+                         f"write {stats.get('Disk Write (MB/s)', 0):.2f} MB/s")
+        lines.append(f"NET sent {stats.get('Network Sent (MB/s)', 0):.2f} MB/s  "
+                     f"received {stats.get('Network Received (MB/s)', 0):.2f} MB/s")
+        lines.append('')
+
+        labels = {key: label + ('v' if self.descending else '^') if key == self.sort else label
+                  for key, (_, label) in SORT_KEYS.items()}
+        lines.append(f"{labels['p']:>7} {labels['c']:>6} {labels['m']:>6} {labels['r']:>7} {labels['t']:>4}  "
+                     f"{labels['n']}")
+        footer = "sort: c cpu  m mem  r rss  t threads  p pid  n name  i invert  +/- rows  q quit"
+        room = max(height - len(lines) - 1, 0)
+        lines.extend(self.process_rows(stats.get('processes'), min(self.top, room)))
+        lines.extend([''] * (height - len(lines) - 1))
+        lines.append(footer)
+        return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Terminal system monitor")
+    parser.add_argument('--interval', type=float, default=1.0, help="refresh interval in seconds")
+    parser.add_argument('--top', type=int, default=20, help="number of processes to show")
+    parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='c', help="initial sort key")
+    parser.add_argument('--once', action='store_true', help="print one frame and exit")
+    args = parser.parse_args(argv)
+
+    from shmbus import attach_source
+    source = attach_source()
+    source_name = 'bus'
+    if source is None:
+        from monitor import SystemMonitor
+        source = SystemMonitor.create_collector()
+        source_name = 'local'
+    view = TopView(args.top, args.sort, args.interval, source_name)
+
+    if args.once:
+        stats = source.sample()
+        if stats is None:
+            # The collector on the bus stalled; show the last snapshot it published
+            stats = source.bus.latest()
+        width, height = terminal_size()
+        print('\n'.join(view.render(stats, width, height)))
+        return 0
+
+    screen = TerminalScreen()
+    stats = None
+    # Same deadline arithmetic as TickScheduler, but the wait also watches the keyboard
+    deadline = time.monotonic()
+    try:
+        with screen, KeyReader() as keys:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    stats = source.sample() if source_name == 'local' else source.bus.latest()
+                    deadline += args.interval * max(1, int((now - deadline) // args.interval) + 1)
+                    width, height = terminal_size()
+                    screen.draw(view.render(stats, width, height))
+                pressed = keys.wait(deadline - time.monotonic())
+                if pressed:
+                    if any(view.handle_key(key) for key in pressed):
+                        break
+                    width, height = terminal_size()
+                    screen.draw(view.render(stats, width, height))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())